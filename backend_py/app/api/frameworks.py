@@ -6,16 +6,22 @@ from fastapi import (
     BackgroundTasks,
     Depends,
     Form,
+    Header,
     Query,
+    Request,
 )
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List
-from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Optional, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 import json
-import tempfile
 import os
+import asyncio
 import random
+import shutil
 from pathlib import Path
 from datetime import datetime
 from nanoid import generate
@@ -23,9 +29,15 @@ from pydantic import BaseModel
 from typing import List
 
 # Database
-from ..db import get_db
+from ..db import get_async_db
 from ..models import Framework, FRAMEWORK_GROUPS
 from ..auth import get_current_user_id
+from ..services.jobs import job_queue, new_job_id, spool_dir
+from ..services.pagination import after_cursor, encode_cursor
+from ..services.json_stream import IncrementalJSONParser
+from ..services.sse import SSE_HEADERS, SSE_KEEPALIVE, format_ndjson, format_sse
+from ..services.structure import default_extractor, pick_keywords, select_sections
+from ..services.uploads import UploadTooLarge, spool_upload
 
 # LLM
 import sys
@@ -33,12 +45,23 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from llm_local import extract_seed
+    from llm_local import (
+        aextract_seed,
+        aextract_seed_batch,
+        merge_maps,
+    )
     from llm_global import (
         build_mock_framework,
         call_openai_framework,
+        acreate_chat_completion,
+        agenerate_framework,
+        openai_limiter,
+        request_tokens,
         resolve_api_settings,
     )
+    from llm_clients import get_async_openai_client
+    from llm_json import lenient_loads
+    from text_extraction import extract_document
 except ImportError as e:
     print(f"Warning: Could not import LLM modules: {e}")
     print("Make sure llm_local.py and llm_global.py are in the correct location")
@@ -46,6 +69,9 @@ except ImportError as e:
 
 router = APIRouter(prefix="/api/frameworks", tags=["frameworks"])
 
+# progress(stage, info)，见 llm_local.ProgressFn / app/services/jobs.py
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
 
 # ============= Request/Response Models =============
 
@@ -55,6 +81,7 @@ class TextGenerateRequest(BaseModel):
     use_global_llm: bool = True
     model: str = "gpt-4o"
     user_id: Optional[str] = None
+    use_cache: bool = True  # False: bypass seed / framework caches
 
 
 class GenerateResponse(BaseModel):
@@ -108,6 +135,12 @@ class FrameworkDetailResponse(BaseModel):
 # ============= Helper Functions =============
 
 
+def report_progress(progress: Optional[ProgressCallback], stage: str, **info):
+    """调用可选的进度回调（同步接口不传 progress）"""
+    if progress is not None:
+        progress(stage, info)
+
+
 def calculate_mock_confidence() -> float:
     """
     生成 mock confidence 分数 (60-95)
@@ -115,42 +148,19 @@ def calculate_mock_confidence() -> float:
     """
     return round(random.uniform(60, 95), 1)
 
+
 def read_file_content(file_path: str, filename: str) -> str:
-    """智能读取文件内容，根据文件类型使用不同的方法"""
-    file_ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    
-    # 处理 .docx 文件
-    if file_ext == 'docx':
-        try:
-            from docx import Document
-            doc = Document(file_path)
-            paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-            content = '\n'.join(paragraphs)
-            
-            if not content.strip():
-                tables_text = []
-                for table in doc.tables:
-                    for row in table.rows:
-                        row_text = ' | '.join(cell.text for cell in row.cells)
-                        if row_text.strip():
-                            tables_text.append(row_text)
-                content = '\n'.join(tables_text)
-            
-            return content
-        except Exception as e:
-            print(f"Warning: Failed to read .docx file {filename}: {e}")
-    
-    # 处理文本文件
-    for encoding in ["utf-8", "gbk", "gb2312", "latin-1", "cp1252"]:
-        try:
-            with open(file_path, "r", encoding=encoding) as f:
-                content = f.read()
-                if content and not content.startswith('PK'):
-                    return content
-        except (UnicodeDecodeError, UnicodeError):
-            continue
-    
-    return f"[Unable to read file: {filename}]"
+    """智能读取文件内容，根据文件类型使用不同的方法（解析在进程池中执行，见 text_extraction.py）"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    result = extract_document(data, filename=filename)
+    if result["error"] or not result["text"].strip():
+        if result["error"]:
+            print(f"Warning: Failed to read {filename}: {result['error']}")
+        return f"[Unable to read file: {filename}]"
+    return result["text"]
+
 
 def ensure_family_in_framework(framework: dict) -> str:
     family = framework.get("family") or framework.get("category")
@@ -422,7 +432,292 @@ def ensure_family_in_framework(framework: dict) -> str:
         return "Other"
 
 
-def process_with_local_llm(input_data: str, is_file: bool = False) -> dict:
+def build_fast_text_metadata(text: str) -> dict:
+    """
+    Lock OFF（快速模式）：不经过 Local LLM，直接从文本提取标题 / 关键词 / 章节结构
+    只保留结构化信息，不包含完整原文
+    """
+    #  1. 提取标题（第一行或前150字符）
+    stripped = text.strip()
+    first_line = stripped[: stripped.find("\n")] if "\n" in stripped else stripped
+    potential_title = first_line[:150].strip() or "User Content"
+
+    #  2. 提取章节结构（扫描全文，见 app/services/structure.py）
+    # 不传完整内容，只传标题和前200字预览
+    all_sections = default_extractor.sections(text)
+    sections = select_sections(all_sections, 10)  # 最多10个sections，覆盖全文
+
+    #  3. 关键词：标题中的词，不足时补充章节标题中的高频词
+    simple_keywords = pick_keywords(potential_title, all_sections)
+
+    # 如果没有提取到sections，使用简单的分段
+    if not sections:
+        # 简单分段：每500字一个section
+        text_parts = [
+            text[i : i + 500]
+            for i in range(0, min(len(text), 2500), 500)
+        ]
+        sections = [
+            {
+                "title": f"Section {i+1}",
+                "content": part[:200] + "...",  #  每个section只保留前200字
+                "level": 1,
+            }
+            for i, part in enumerate(text_parts)
+        ]
+
+    #  4. 创建优化的 metadata（参考Lock ON的结构）
+    metadata = {
+        "doc_id": f"doc-{generate(size=12)}",
+        "title": potential_title,  #  真实标题
+        "subject": potential_title,
+        "language": "en",
+        "bypass_local_llm": True,
+        #  关键字段
+        "keywords": simple_keywords,  #  5-10个关键词
+        #  sections：只包含章节标题和前200字预览
+        "sections": sections,
+        #  facets：简单的主题分类
+        "facets": {
+            "main_topic": {
+                "summary": potential_title,
+                "items": [
+                    {
+                        "value": kw,
+                        "evidence": "",
+                        "location": "",
+                        "confidence": 0.8,
+                    }
+                    for kw in simple_keywords
+                ],
+            }
+        },
+        #  key_values：关键信息键值对
+        "key_values": [
+            {"key": "document_title", "value": potential_title},
+            {"key": "processing_mode", "value": "direct"},
+            {"key": "section_count", "value": str(len(all_sections) or len(sections))},
+        ],
+        #  tags：使用关键词
+        "tags": simple_keywords,
+        # 其他必需字段（保持为空）
+        "triples": [],
+        "questions": [],
+        "risks": [],
+        "actions_todo": [],
+        "metrics": [],
+        "tables": [],
+        "figures": [],
+        "extra": {
+            "processing_mode": "direct",
+            "note": "Extracted structure without full text to reduce prompt size",
+            "original_length": len(text),
+            "truncated": True,
+        },
+    }
+
+    # 不添加 raw_text 或 full_content！
+    # ChatGPT不需要完整原文，只需要结构化信息
+
+    return metadata
+
+
+def build_fast_files_metadata(file_contents: List[str], file_names: List[str]) -> dict:
+    """
+    Lock OFF（快速模式）：多文件版本，每个 section 只保留前200字并标注来源文件
+    """
+    #  1. 智能提取标题
+    if len(file_contents) == 1:
+        # 单文件：使用第一行或文件名
+        lines = file_contents[0].strip().split("\n")
+        potential_title = (
+            lines[0][:150].strip()
+            if lines and len(lines[0].strip()) > 10
+            else file_names[0]
+        )
+    else:
+        # 多文件：使用组合描述
+        lines = file_contents[0].strip().split("\n") if file_contents else []
+        if lines and len(lines[0].strip()) > 10:
+            potential_title = lines[0][:150].strip()
+        else:
+            potential_title = f"Framework from {len(file_names)} files"
+
+    #  2. 提取sections（扫描每个文件全文，每个section只保留前200字）
+    per_file = max(2, 15 // max(len(file_contents), 1))
+    found_sections = []
+    all_sections = []
+
+    for idx, content in enumerate(file_contents):
+        file_name = (
+            file_names[idx] if idx < len(file_names) else f"File {idx+1}"
+        )
+        file_sections = default_extractor.sections(content)
+        found_sections.extend(file_sections)
+        # 每个文件的章节均匀取样，保证所有文件都有代表
+        for section in select_sections(file_sections, per_file):
+            all_sections.append(
+                {
+                    **section,
+                    "title": f"{file_name}: {section['title'][:100]}",
+                    "source_file": file_name,
+                }
+            )
+    all_sections = select_sections(all_sections, 15)  # 最多15个sections
+
+    #  3. 关键词：标题中的词，不足时补充章节标题中的高频词
+    simple_keywords = pick_keywords(potential_title, found_sections)
+
+    # 如果没有提取到sections，为每个文件创建一个简单section
+    if not all_sections:
+        all_sections = [
+            {
+                "title": file_names[i]
+                if i < len(file_names)
+                else f"File {i+1}",
+                "content": content[:200] + "...",  #  只保留前200字
+                "level": 1,
+                "source_file": file_names[i]
+                if i < len(file_names)
+                else f"File {i+1}",
+            }
+            for i, content in enumerate(file_contents)
+        ]
+
+    #  4. 创建优化的 metadata
+    merged_metadata = {
+        "doc_id": f"doc-{generate(size=12)}",
+        "title": potential_title,  #  真实标题
+        "subject": potential_title,
+        "language": "en",
+        "bypass_local_llm": True,
+        #  关键字段
+        "keywords": simple_keywords,
+        #  sections：只包含章节标题和前200字预览
+        "sections": all_sections,
+        #  facets
+        "facets": {
+            "main_topic": {
+                "summary": potential_title,
+                "items": [
+                    {
+                        "value": kw,
+                        "evidence": "",
+                        "location": "",
+                        "confidence": 0.8,
+                    }
+                    for kw in simple_keywords
+                ],
+            },
+            "source_files": {
+                "summary": f"Content from {len(file_contents)} file(s)",
+                "items": [
+                    {
+                        "value": name,
+                        "evidence": "",
+                        "location": "",
+                        "confidence": 1.0,
+                    }
+                    for name in file_names
+                ],
+            },
+        },
+        #  key_values
+        "key_values": [
+            {"key": "document_title", "value": potential_title},
+            {"key": "file_count", "value": str(len(file_contents))},
+            {"key": "processing_mode", "value": "direct"},
+            {"key": "source_files", "value": ", ".join(file_names[:3])},
+        ],
+        #  tags
+        "tags": simple_keywords,
+        # 其他必需字段
+        "source_count": len(file_contents),
+        "source_files": file_names,
+        "triples": [],
+        "questions": [],
+        "risks": [],
+        "actions_todo": [],
+        "metrics": [],
+        "tables": [],
+        "figures": [],
+        "extra": {
+            "processing_mode": "direct",
+            "note": "Extracted structure without full text to reduce prompt size",
+            "file_names": file_names,
+            "total_length": sum(len(c) for c in file_contents),
+            "truncated": True,
+        },
+    }
+
+    #  关键：不添加 raw_text、full_content 或完整的 combined_text！
+
+    return merged_metadata
+
+
+ALLOWED_UPLOAD_EXTENSIONS = {".txt", ".pdf", ".doc", ".docx", ".md"}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+MAX_UPLOAD_FILES = 10
+
+
+async def save_uploaded_files(
+    files: List[UploadFile], directory: Optional[str] = None
+) -> List[dict]:
+    """
+    保存多个上传文件到临时目录（跳过不支持的类型）
+
+    分块流式写入磁盘并同时计算 sha256，超过 10MB 立即中止，不在内存中缓存整个文件
+
+    Args:
+        files: 上传的文件
+        directory: 保存目录（默认系统临时目录；后台任务使用 job spool 目录）
+
+    Returns:
+        [{"path", "name", "size", "sha256"}]，出错时已保存的文件会被删除
+    """
+    if not files or len(files) == 0:
+        raise HTTPException(status_code=400, detail="No files provided")
+
+    if len(files) > MAX_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail="Too many files (max 10)")
+
+    saved = []
+    try:
+        for file in files:
+            if not file.filename:
+                continue
+
+            file_ext = Path(file.filename).suffix.lower()
+            if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
+                continue
+
+            try:
+                upload = await spool_upload(
+                    file, MAX_UPLOAD_BYTES, suffix=file_ext, directory=directory
+                )
+            except UploadTooLarge:
+                raise HTTPException(
+                    status_code=400, detail=f"File {file.filename} too large"
+                )
+            saved.append(upload.as_dict())
+    except Exception:
+        for upload in saved:
+            if os.path.exists(upload["path"]):
+                os.unlink(upload["path"])
+        raise
+
+    if not saved:
+        raise HTTPException(status_code=400, detail="No valid files")
+    return saved
+
+
+async def process_with_local_llm(
+    input_data: str,
+    is_file: bool = False,
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None,
+    doc_hash: Optional[str] = None,
+) -> dict:
     """
     步骤 1: 使用 Local LLM (Cloud or Ollama) 提取元数据
 
@@ -433,6 +728,9 @@ def process_with_local_llm(input_data: str, is_file: bool = False) -> dict:
     Args:
         input_data: 文件路径或文本内容
         is_file: 是否为文件路径
+        use_cache: 是否使用 seed cache（相同文档直接返回缓存结果）
+        progress: 可选的进度回调 progress(stage, info)（后台任务用）
+        doc_hash: 上传时已计算的 sha256（seed cache 命中时无需再读文件）
 
     Returns:
         metadata: 提取的结构化元数据
@@ -444,7 +742,12 @@ def process_with_local_llm(input_data: str, is_file: bool = False) -> dict:
             f" Step 1: Processing {'file' if is_file else 'text'} with Local LLM (Privacy Protection)..."
         )
 
-        metadata = extract_seed(input_data=input_data)
+        metadata = await aextract_seed(
+            input_data=input_data,
+            use_cache=use_cache,
+            progress=progress,
+            doc_hash=doc_hash,
+        )
 
         return metadata
 
@@ -454,8 +757,11 @@ def process_with_local_llm(input_data: str, is_file: bool = False) -> dict:
         )
 
 
-def process_with_global_llm(
-    metadata: dict, model: str = "gpt-4o", use_mock: bool = False
+async def process_with_global_llm(
+    metadata: dict,
+    model: str = "gpt-4o",
+    use_mock: bool = False,
+    use_cache: bool = True,
 ) -> dict:
     """
     步骤 2: 使用 Global LLM (OpenAI) 生成框架
@@ -475,15 +781,17 @@ def process_with_global_llm(
             # 注意：这需要修改 llm_global.py 中的 prompt
             # 或者在这里添加额外的 API 调用来分类
 
-            framework = call_openai_framework(
+            # OpenAI 不可用（熔断 / 过载 / 5xx）时回退到 mock（见 llm_health.py）
+            framework = await agenerate_framework(
                 md=metadata,
                 model=model,
                 timeout=180,
                 api_key=api_key,
                 base_url=base_url,
                 verbose=True,
+                use_cache=use_cache,
             )
-            print(" OpenAI API call successful")
+            print(" Global LLM step done")
 
         # 确保 family 字段存在
         # framework['family'] = ensure_family_in_framework(framework)
@@ -501,8 +809,185 @@ def process_with_global_llm(
         )
 
 
-def save_framework_to_db(
-    framework_data: dict, metadata_dict: dict, creator_id: str, db: Session
+async def run_text_pipeline(
+    text: str,
+    use_global_llm: bool = True,
+    model: str = "gpt-4o",
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[List[dict], dict]:
+    """
+    文本 → (Local LLM | 快速模式) → Global LLM
+
+    generate-from-text 与后台任务共用
+
+    Returns:
+        (frameworks, metadata)
+    """
+    if not use_global_llm:
+        #  Lock ON: 隐私保护模式
+        print(" Step 1: Processing with Local LLM (Privacy Protection)...")
+        metadata = await process_with_local_llm(
+            text, is_file=False, use_cache=use_cache, progress=progress
+        )
+        print(f" Local LLM completed. Extracted {len(metadata)} metadata fields")
+    else:
+        #  Lock OFF: 快速模式
+        print(" Processing with Global LLM (Fast Mode - No Local Processing)...")
+        report_progress(progress, "preprocess", status="started")
+        metadata = build_fast_text_metadata(text)
+        report_progress(progress, "preprocess", status="done")
+
+    print(" Step 2: Processing with Global LLM...")
+    report_progress(progress, "global_llm", status="started", model=model)
+    framework_result = await process_with_global_llm(
+        metadata=metadata,
+        model=model,
+        use_mock=False,
+        use_cache=use_cache,
+    )
+    report_progress(progress, "global_llm", status="done")
+    print(" Global LLM completed")
+
+    # 🔧 修改：支持多 POV / 多 framework 结果
+    frameworks = framework_result.get("frameworks", [framework_result])
+    return frameworks, metadata
+
+
+def merge_file_metadata(all_metadata: List[dict], file_names: List[str]) -> dict:
+    """
+    合并多个文件的 Local LLM metadata（merge_maps 去重合并，不再只保留第一个文件）
+    每个 section 标注来源文件
+    """
+    if len(all_metadata) == 1:
+        return all_metadata[0]
+    if not all_metadata:
+        return {}
+
+    # merge_maps 只合并 schema 字段，每个文件的 _cache / _preprocessing 单独保留
+    per_file = {"_cache": [], "_preprocessing": []}
+    for metadata, name in zip(all_metadata, file_names):
+        for section in metadata.get("sections") or []:
+            if isinstance(section, dict):
+                section.setdefault("source_file", name)
+        for field, items in per_file.items():
+            info = metadata.get(field)
+            if isinstance(info, dict):
+                items.append({"file": name, **info})
+
+    merged_metadata = merge_maps(all_metadata)
+    merged_metadata.update({k: v for k, v in per_file.items() if v})
+    merged_metadata["source_count"] = len(all_metadata)
+    merged_metadata["source_files"] = file_names
+    merged_metadata["merged_from_multiple_files"] = True
+    return merged_metadata
+
+
+async def run_files_pipeline(
+    files: List[dict],
+    use_global_llm: bool = True,
+    model: str = "gpt-4o",
+    use_cache: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> Tuple[List[dict], dict]:
+    """
+    多文件 → (Local LLM | 快速模式) → Global LLM
+
+    generate-from-files 与后台任务共用
+
+    Args:
+        files: [{"path": 临时文件路径, "name": 原始文件名, "sha256": 可选}]
+
+    Returns:
+        (frameworks, merged_metadata)
+    """
+    if not use_global_llm:
+        #  Lock ON: 隐私保护模式
+        #  多个文件并发处理（LLM 并发仍由 LLM_MAX_INFLIGHT_* 限制）
+        concurrency = max(1, int(os.getenv("LOCAL_LLM_FILE_CONCURRENCY", "4")))
+        print(
+            f" Step 1: Processing {len(files)} files with Local LLM "
+            f"(Privacy Protection, {min(concurrency, len(files))} at a time)..."
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def process_file(index: int, upload: dict) -> dict:
+            def file_progress(stage, info):
+                progress(stage, {"file": upload["name"], "index": index, **info})
+
+            async with semaphore:
+                return await process_with_local_llm(
+                    upload["path"],
+                    is_file=True,
+                    use_cache=use_cache,
+                    progress=file_progress if progress is not None else None,
+                    doc_hash=upload.get("sha256"),
+                )
+
+        # gather() 保持文件顺序；一个文件失败时取消其余文件，不再继续占用 LLM
+        tasks = [
+            asyncio.create_task(process_file(i, upload))
+            for i, upload in enumerate(files)
+        ]
+        try:
+            all_metadata = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        merged_metadata = merge_file_metadata(
+            list(all_metadata), [upload["name"] for upload in files]
+        )
+
+        print(f" Local LLM completed. Processed {len(files)} files")
+    else:
+        #  Lock OFF: 快速模式
+        print(" Processing with Global LLM (Fast Mode - No Local Processing)...")
+
+        # 读取所有文件内容
+        file_contents = []
+        file_names = []
+        for index, upload in enumerate(files):
+            temp_path, name = upload["path"], upload["name"]
+            report_progress(
+                progress, "extract_text", status="started", file=name, index=index
+            )
+            try:
+                file_names.append(name)
+
+                # 使用智能读取函数 ✅ 修复.docx乱码问题
+                content = await run_in_threadpool(read_file_content, temp_path, name)
+                if content and not content.startswith("[Unable to read"):
+                    file_contents.append(content)
+                else:
+                    print(f"Warning: {content}")
+
+            except Exception as e:
+                print(f"Warning: Could not read file {temp_path}: {e}")
+
+        report_progress(progress, "preprocess", status="started")
+        merged_metadata = build_fast_files_metadata(file_contents, file_names)
+        report_progress(progress, "preprocess", status="done")
+
+    print(" Step 2: Processing with Global LLM...")
+    report_progress(progress, "global_llm", status="started", model=model)
+    framework_result = await process_with_global_llm(
+        metadata=merged_metadata,
+        model=model,
+        use_mock=False,
+        use_cache=use_cache,
+    )
+    report_progress(progress, "global_llm", status="done")
+    print(" Global LLM completed")
+
+    #  MODIFIED: 支持多 POV 输出
+    frameworks = framework_result.get("frameworks", [framework_result])
+    return frameworks, merged_metadata
+
+
+async def save_framework_to_db(
+    framework_data: dict, metadata_dict: dict, creator_id: str, db: AsyncSession
 ) -> Framework:
     """
     将生成的 framework 保存到数据库
@@ -562,8 +1047,8 @@ def save_framework_to_db(
     )
 
     db.add(db_framework)
-    db.commit()
-    db.refresh(db_framework)
+    await db.commit()
+    await db.refresh(db_framework)
 
     return db_framework
 
@@ -574,7 +1059,7 @@ def save_framework_to_db(
 @router.post("/generate-from-text", response_model=GenerateResponse)
 async def generate_from_text(
     request: TextGenerateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = getattr(request, "user_id", None)
     """
@@ -591,158 +1076,12 @@ async def generate_from_text(
                 status_code=400, detail="Text too long (max 50,000 characters)"
             )
 
-        #  根据 use_global_llm 决定是否使用 Local LLM
-        if not request.use_global_llm:
-            #  Lock ON: 隐私保护模式
-            print(" Step 1: Processing with Local LLM (Privacy Protection)...")
-            metadata = process_with_local_llm(request.text, is_file=False)
-            print(f" Local LLM completed. Extracted {len(metadata)} metadata fields")
-
-            print(" Step 2: Processing with Global LLM...")
-            framework_result = process_with_global_llm(
-                metadata=metadata, model=request.model, use_mock=False
-            )
-            print(" Global LLM completed")
-        else:
-            #  Lock OFF: 快速模式
-            print(" Processing with Global LLM (Fast Mode - No Local Processing)...")
-
-            #  1. 提取标题（第一行或前150字符）
-            lines = request.text.strip().split("\n")
-            potential_title = lines[0][:150].strip() if lines else "User Content"
-
-            #  2. 简单关键词提取（从标题中提取）
-            # 取长度>3的单词，最多5个
-            simple_keywords = [
-                word.strip()
-                for word in potential_title.lower().split()
-                if len(word.strip()) > 3
-            ][:5]
-
-            #  3. 提取章节结构（前5个段落或章节）
-            # 不传完整内容，只传标题
-            sections = []
-            current_section_lines = []
-
-            for line in lines[:100]:  # 只看前100行
-                line_stripped = line.strip()
-                if not line_stripped:
-                    continue
-
-                # 判断是否是章节标题（简单规则：较短的行，或包含数字）
-                if len(line_stripped) < 100 and (
-                    line_stripped[0].isdigit()
-                    or line_stripped.isupper()
-                    or any(
-                        marker in line_stripped.lower()
-                        for marker in ["step", "phase", "stage", "chapter"]
-                    )
-                ):
-                    if current_section_lines:
-                        # 保存前一个section（只保留前200字作为摘要）
-                        content_preview = " ".join(current_section_lines)[:200]
-                        sections.append(
-                            {
-                                "title": current_section_lines[0][:150],
-                                "content": content_preview,  #  只保留前200字
-                                "level": 1,
-                            }
-                        )
-                        current_section_lines = [line_stripped]
-                    else:
-                        current_section_lines = [line_stripped]
-                else:
-                    if len(current_section_lines) < 3:  # 每个section最多保留3行预览
-                        current_section_lines.append(line_stripped)
-
-            # 保存最后一个section
-            if current_section_lines:
-                content_preview = " ".join(current_section_lines)[:200]
-                sections.append(
-                    {
-                        "title": current_section_lines[0][:150],
-                        "content": content_preview,
-                        "level": 1,
-                    }
-                )
-
-            # 如果没有提取到sections，使用简单的分段
-            if not sections:
-                # 简单分段：每500字一个section
-                text_parts = [
-                    request.text[i : i + 500]
-                    for i in range(0, min(len(request.text), 2500), 500)
-                ]
-                sections = [
-                    {
-                        "title": f"Section {i+1}",
-                        "content": part[:200] + "...",  #  每个section只保留前200字
-                        "level": 1,
-                    }
-                    for i, part in enumerate(text_parts)
-                ]
-
-            #  4. 创建优化的 metadata（参考Lock ON的结构）
-            metadata = {
-                "doc_id": f"doc-{generate(size=12)}",
-                "title": potential_title,  #  真实标题
-                "subject": potential_title,
-                "language": "en",
-                "bypass_local_llm": True,
-                #  关键字段
-                "keywords": simple_keywords,  #  5-10个关键词
-                #  sections：只包含章节标题和前200字预览
-                "sections": sections[:10],  # 最多10个sections
-                #  facets：简单的主题分类
-                "facets": {
-                    "main_topic": {
-                        "summary": potential_title,
-                        "items": [
-                            {
-                                "value": kw,
-                                "evidence": "",
-                                "location": "",
-                                "confidence": 0.8,
-                            }
-                            for kw in simple_keywords
-                        ],
-                    }
-                },
-                #  key_values：关键信息键值对
-                "key_values": [
-                    {"key": "document_title", "value": potential_title},
-                    {"key": "processing_mode", "value": "direct"},
-                    {"key": "section_count", "value": str(len(sections))},
-                ],
-                #  tags：使用关键词
-                "tags": simple_keywords,
-                # 其他必需字段（保持为空）
-                "triples": [],
-                "questions": [],
-                "risks": [],
-                "actions_todo": [],
-                "metrics": [],
-                "tables": [],
-                "figures": [],
-                "extra": {
-                    "processing_mode": "direct",
-                    "note": "Extracted structure without full text to reduce prompt size",
-                    "original_length": len(request.text),
-                    "truncated": True,
-                },
-            }
-
-            # 不添加 raw_text 或 full_content！
-            # ChatGPT不需要完整原文，只需要结构化信息
-
-            framework_result = process_with_global_llm(
-                metadata=metadata, model=request.model, use_mock=False
-            )
-            print(" Global LLM completed")
-
-        # 🔧 修改：支持多 POV / 多 framework 结果
-        #  支持多 POV / 多 framework 结果
-        frameworks = framework_result.get("frameworks", [framework_result])
+        frameworks, metadata = await run_text_pipeline(
+            request.text,
+            use_global_llm=request.use_global_llm,
+            model=request.model,
+            use_cache=request.use_cache,
+        )
 
         print(f" Framework generation completed: {len(frameworks)} framework(s)")
 
@@ -770,8 +1109,9 @@ async def generate_from_file(
     file: UploadFile = File(...),
     use_global_llm: bool = True,
     model: str = "gpt-4o",
+    use_cache: bool = True,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     从上传文件生成框架（需要登录）
@@ -795,27 +1135,29 @@ async def generate_from_file(
                 detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}",
             )
 
-        # 检查文件大小 (10MB)
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:
+        # 检查文件大小 (10MB)，分块写入临时文件，超限立即中止
+        try:
+            upload = await spool_upload(file, MAX_UPLOAD_BYTES, suffix=file_ext)
+        except UploadTooLarge:
             raise HTTPException(status_code=400, detail="File too large (max 10MB)")
+        temp_path = upload.path
 
-        # 保存到临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            tmp.write(content)
-            temp_path = tmp.name
-
-        print(f" File saved to: {temp_path}")
+        print(f" File saved to: {temp_path} ({upload.size} bytes)")
 
         # 步骤 1: 本地 LLM 提取元数据
         print(" Step 1: Processing with Local LLM (Ollama)...")
-        metadata = process_with_local_llm(temp_path, is_file=True)
+        metadata = await process_with_local_llm(
+            temp_path, is_file=True, use_cache=use_cache, doc_hash=upload.sha256
+        )
         print(f" Local LLM completed. Extracted {len(metadata)} metadata fields")
 
         # 步骤 2: Global LLM 生成框架
         print(" Step 2: Processing with Global LLM (OpenAI)...")
-        framework_result = process_with_global_llm(  #  MODIFIED
-            metadata=metadata, model=model, use_mock=not use_global_llm
+        framework_result = await process_with_global_llm(  #  MODIFIED
+            metadata=metadata,
+            model=model,
+            use_mock=not use_global_llm,
+            use_cache=use_cache,
         )
         print(" Global LLM completed. Framework generated")
 
@@ -826,7 +1168,7 @@ async def generate_from_file(
         print("💾 Step 3: Saving framework(s) to database...")
         saved_ids = []  #  MODIFIED
         for fw_data in frameworks:  #  MODIFIED
-            db_framework = save_framework_to_db(  #  MODIFIED
+            db_framework = await save_framework_to_db(  #  MODIFIED
                 framework_data=fw_data,  #  MODIFIED
                 metadata_dict=metadata,
                 creator_id=user_id,
@@ -866,366 +1208,479 @@ async def generate_from_files(
     files: List[UploadFile] = File(...),
     use_global_llm: bool = True,
     model: str = "gpt-4o",
+    use_cache: bool = True,
     # No need for this anymore, change to firebase
     ## user_id: str = Depends(get_current_user_id),
     user_id: str = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     从多个文件生成框架（需要登录）
 
     多个文件会被合并处理
     """
-    temp_paths = []
+    temp_files = []
 
     try:
-        if not files or len(files) == 0:
-            raise HTTPException(status_code=400, detail="No files provided")
+        # 保存所有文件到临时目录
+        temp_files = await save_uploaded_files(files)
+        print(f" Saved {len(temp_files)} files")
+
+        frameworks, merged_metadata = await run_files_pipeline(
+            temp_files,
+            use_global_llm=use_global_llm,
+            model=model,
+            use_cache=use_cache,
+        )
 
-        if len(files) > 10:
-            raise HTTPException(status_code=400, detail="Too many files (max 10)")
+        #  步骤 3: 生成 framework IDs(前端会保存到 Firebase)
+        print(
+            "💾 Step 3: Generating framework IDs (data will be saved to Firebase by frontend)..."
+        )
 
-        # 保存所有文件到临时目录
-        for file in files:
-            if not file.filename:
-                continue
+        saved_ids = []
+        for fw_data in frameworks:
+            # 为每个 framework 生成唯一 ID
+            fw_id = f"fw_{generate(size=12)}"
+            fw_data["id"] = fw_id  # 添加 ID 到 framework 数据中
+            saved_ids.append(fw_id)
 
-            file_ext = Path(file.filename).suffix.lower()
-            allowed_extensions = {".txt", ".pdf", ".doc", ".docx", ".md"}
+        print(f" Generated {len(saved_ids)} framework IDs: {saved_ids}")
 
-            if file_ext not in allowed_extensions:
-                continue
+        #  MODIFIED: 同时返回单个与多个
+        return GenerateResponse(
+            success=True,
+            framework_id=saved_ids[0] if saved_ids else None,
+            framework=frameworks[0] if frameworks else None,
+            frameworks=frameworks,
+            metadata=merged_metadata,
+        )
 
-            content = await file.read()
-            if len(content) > 10 * 1024 * 1024:
-                raise HTTPException(
-                    status_code=400, detail=f"File {file.filename} too large"
-                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f" Error: {str(e)}")
+        import traceback
 
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-                tmp.write(content)
-                temp_paths.append(tmp.name)
+        traceback.print_exc()
+        return GenerateResponse(success=False, error=str(e))
+    finally:
+        # 清理所有临时文件
+        for upload in temp_files:
+            temp_path = upload["path"]
+            if os.path.exists(temp_path):
+                try:
+                    os.unlink(temp_path)
+                except:
+                    pass
 
-        if not temp_paths:
-            raise HTTPException(status_code=400, detail="No valid files")
 
-        print(f" Saved {len(temp_paths)} files")
+# ============= Background Jobs =============
+# POST 立即返回 job_id，由后台 worker 执行 Local → Global 流程
+# 客户端轮询 /jobs/{id} 或通过 SSE 订阅 /jobs/{id}/events 获取进度
 
-        #  根据 use_global_llm 决定是否使用 Local LLM
-        if not use_global_llm:
-            #  Lock ON: 隐私保护模式
-            print(" Step 1: Processing files with Local LLM (Privacy Protection)...")
-            all_metadata = []
 
-            for temp_path in temp_paths:
-                metadata = process_with_local_llm(temp_path, is_file=True)
-                all_metadata.append(metadata)
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
 
-            merged_metadata = all_metadata[0] if all_metadata else {}
-            if len(all_metadata) > 1:
-                merged_metadata["source_count"] = len(all_metadata)
-                merged_metadata["merged_from_multiple_files"] = True
 
-            print(f" Local LLM completed. Processed {len(temp_paths)} files")
+def _job_submit_response(job_id: str) -> JobSubmitResponse:
+    return JobSubmitResponse(
+        job_id=job_id,
+        status="queued",
+        status_url=f"{router.prefix}/jobs/{job_id}",
+        events_url=f"{router.prefix}/jobs/{job_id}/events",
+    )
 
-            print(" Step 2: Processing with Global LLM...")
-            framework_result = process_with_global_llm(
-                metadata=merged_metadata, model=model, use_mock=False
-            )
-            print(" Global LLM completed")
-        else:
-            #  Lock OFF: 快速模式
-            print(" Processing with Global LLM (Fast Mode - No Local Processing)...")
-
-            # 读取所有文件内容
-            # 读取所有文件内容
-            file_contents = []
-            file_names = []
-            for i, temp_path in enumerate(temp_paths):
-                try:
-                    # 获取文件名
-                    original_filename = (
-                        files[i].filename if i < len(files) else f"file_{i+1}"
-                    )
-                    file_names.append(original_filename)
-                    
-                    # 使用智能读取函数 ✅ 修复.docx乱码问题
-                    content = read_file_content(temp_path, original_filename)
-                    if content and not content.startswith('[Unable to read'):
-                        file_contents.append(content)
-                    else:
-                        print(f"Warning: {content}")
-                        
-                except Exception as e:
-                    print(f"Warning: Could not read file {temp_path}: {e}")
-
-
-            #  1. 智能提取标题
-            if len(file_contents) == 1:
-                # 单文件：使用第一行或文件名
-                lines = file_contents[0].strip().split("\n")
-                potential_title = (
-                    lines[0][:150].strip()
-                    if lines and len(lines[0].strip()) > 10
-                    else file_names[0]
-                )
-            else:
-                # 多文件：使用组合描述
-                lines = file_contents[0].strip().split("\n") if file_contents else []
-                if lines and len(lines[0].strip()) > 10:
-                    potential_title = lines[0][:150].strip()
-                else:
-                    potential_title = f"Framework from {len(file_names)} files"
 
-            #  2. 简单关键词提取
-            simple_keywords = [
-                word.strip()
-                for word in potential_title.lower().split()
-                if len(word.strip()) > 3
-            ][:5]
+def _job_result(frameworks: List[dict], metadata: dict) -> dict:
+    """与 GenerateResponse 相同的结构，为每个 framework 生成 ID"""
+    for fw_data in frameworks:
+        fw_data["id"] = f"fw_{generate(size=12)}"
+    return {
+        "framework_id": frameworks[0]["id"] if frameworks else None,
+        "framework": frameworks[0] if frameworks else None,
+        "frameworks": frameworks,
+        "metadata": metadata,
+    }
 
-            #  3. 提取sections（从所有文件中提取，但每个section只保留前200字）
-            all_sections = []
 
-            for idx, content in enumerate(file_contents):
-                file_name = (
-                    file_names[idx] if idx < len(file_names) else f"File {idx+1}"
-                )
-                lines = content.strip().split("\n")
-
-                # 为每个文件创建sections
-                current_section_lines = []
-
-                for line in lines[:50]:  # 每个文件只看前50行
-                    line_stripped = line.strip()
-                    if not line_stripped:
-                        continue
-
-                    # 判断是否是章节标题
-                    if len(line_stripped) < 100 and (
-                        line_stripped[0].isdigit()
-                        or line_stripped.isupper()
-                        or any(
-                            marker in line_stripped.lower()
-                            for marker in ["step", "phase", "stage", "chapter"]
-                        )
-                    ):
-                        if current_section_lines:
-                            content_preview = " ".join(current_section_lines)[:200]
-                            all_sections.append(
-                                {
-                                    "title": f"{file_name}: {current_section_lines[0][:100]}",
-                                    "content": content_preview,  #  只保留前200字
-                                    "level": 1,
-                                    "source_file": file_name,
-                                }
-                            )
-                            current_section_lines = [line_stripped]
-                        else:
-                            current_section_lines = [line_stripped]
-                    else:
-                        if len(current_section_lines) < 3:
-                            current_section_lines.append(line_stripped)
-
-                # 保存最后一个section
-                if current_section_lines:
-                    content_preview = " ".join(current_section_lines)[:200]
-                    all_sections.append(
-                        {
-                            "title": f"{file_name}: {current_section_lines[0][:100]}",
-                            "content": content_preview,
-                            "level": 1,
-                            "source_file": file_name,
-                        }
-                    )
+async def run_text_job(params: dict, progress: ProgressCallback) -> dict:
+    frameworks, metadata = await run_text_pipeline(
+        params["text"],
+        use_global_llm=params.get("use_global_llm", True),
+        model=params.get("model", "gpt-4o"),
+        use_cache=params.get("use_cache", True),
+        progress=progress,
+    )
+    report_progress(progress, "save", status="started")
+    result = _job_result(frameworks, metadata)
+    report_progress(progress, "save", status="done", frameworks=len(frameworks))
+    return result
 
-            # 如果没有提取到sections，为每个文件创建一个简单section
-            if not all_sections:
-                all_sections = [
-                    {
-                        "title": file_names[i]
-                        if i < len(file_names)
-                        else f"File {i+1}",
-                        "content": content[:200] + "...",  #  只保留前200字
-                        "level": 1,
-                        "source_file": file_names[i]
-                        if i < len(file_names)
-                        else f"File {i+1}",
-                    }
-                    for i, content in enumerate(file_contents)
-                ]
-
-            #  4. 创建优化的 metadata
-            merged_metadata = {
-                "doc_id": f"doc-{generate(size=12)}",
-                "title": potential_title,  #  真实标题
-                "subject": potential_title,
-                "language": "en",
-                "bypass_local_llm": True,
-                #  关键字段
-                "keywords": simple_keywords,
-                #  sections：只包含章节标题和前200字预览
-                "sections": all_sections[:15],  # 最多15个sections
-                #  facets
-                "facets": {
-                    "main_topic": {
-                        "summary": potential_title,
-                        "items": [
-                            {
-                                "value": kw,
-                                "evidence": "",
-                                "location": "",
-                                "confidence": 0.8,
-                            }
-                            for kw in simple_keywords
-                        ],
-                    },
-                    "source_files": {
-                        "summary": f"Content from {len(file_contents)} file(s)",
-                        "items": [
-                            {
-                                "value": name,
-                                "evidence": "",
-                                "location": "",
-                                "confidence": 1.0,
-                            }
-                            for name in file_names
-                        ],
-                    },
-                },
-                #  key_values
-                "key_values": [
-                    {"key": "document_title", "value": potential_title},
-                    {"key": "file_count", "value": str(len(file_contents))},
-                    {"key": "processing_mode", "value": "direct"},
-                    {"key": "source_files", "value": ", ".join(file_names[:3])},
-                ],
-                #  tags
-                "tags": simple_keywords,
-                # 其他必需字段
-                "source_count": len(file_contents),
-                "source_files": file_names,
-                "triples": [],
-                "questions": [],
-                "risks": [],
-                "actions_todo": [],
-                "metrics": [],
-                "tables": [],
-                "figures": [],
-                "extra": {
-                    "processing_mode": "direct",
-                    "note": "Extracted structure without full text to reduce prompt size",
-                    "file_names": file_names,
-                    "total_length": sum(len(c) for c in file_contents),
-                    "truncated": True,
-                },
-            }
 
-            #  关键：不添加 raw_text、full_content 或完整的 combined_text！
+async def run_files_job(params: dict, progress: ProgressCallback) -> dict:
+    files = params["files"]
+    missing = [f["name"] for f in files if not os.path.exists(f["path"])]
+    if missing:
+        raise RuntimeError(f"Uploaded files no longer available: {missing}")
+
+    frameworks, metadata = await run_files_pipeline(
+        files,
+        use_global_llm=params.get("use_global_llm", True),
+        model=params.get("model", "gpt-4o"),
+        use_cache=params.get("use_cache", True),
+        progress=progress,
+    )
+    report_progress(progress, "save", status="started")
+    result = _job_result(frameworks, metadata)
+    report_progress(progress, "save", status="done", frameworks=len(frameworks))
+    return result
+
+
+job_queue.register("text", run_text_job)
+job_queue.register("files", run_files_job)
+
+
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "200"))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_MB", "200")) * 1024 * 1024
+
+
+async def _batch_stream(
+    fmt: str, uploads: List[dict], rejected: List[dict], use_cache: bool
+):
+    """每个文档完成后立即推送 document 事件，最后推送 done 汇总"""
+    counts = {"done": 0, "error": 0, "duplicates": 0}
+    try:
+        for result in rejected:
+            counts["error"] += 1
+            yield _stream_frame(fmt, "document", result)
+
+        inputs = [
+            {"input": u["path"], "name": u["name"], "doc_hash": u["sha256"]}
+            for u in uploads
+        ]
+        results = aextract_seed_batch(inputs, use_cache=use_cache)
+        try:
+            async for result in results:
+                # 结果中的 index 对应上传顺序（含被拒绝的文件）
+                result["index"] = uploads[result["index"]]["index"]
+                if result["duplicate_of"] is not None:
+                    result["duplicate_of"] = uploads[result["duplicate_of"]]["index"]
+                    counts["duplicates"] += 1
+                counts[result["status"]] += 1
+                yield _stream_frame(fmt, "document", result)
+        finally:
+            await results.aclose()
+
+        yield _stream_frame(
+            fmt,
+            "done",
+            {"success": True, "total": len(uploads) + len(rejected), **counts},
+        )
+    except Exception as e:
+        print(f" Error in extract_batch: {e}")
+        yield _stream_frame(fmt, "error", {"success": False, "error": str(e)})
+    finally:
+        for upload in uploads:
+            if os.path.exists(upload["path"]):
+                os.unlink(upload["path"])
+
+
+@router.post("/extract-batch")
+async def extract_metadata_batch(
+    files: List[UploadFile] = File(...),
+    use_cache: bool = True,
+    stream_format: str = Query("ndjson", alias="format"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    批量提取元数据（需要登录，仅元数据，不生成框架）
+
+    相同内容（sha256）的文件只处理一次；文本提取并行进行，小文档的摘要合并到同一次
+    LLM 调用中（llm_local.aextract_seed_batch）。每个文档完成后立即推送：
+        document: {"index", "name", "doc_hash", "status", "duplicate_of", "metadata" | "error"}
+        done: {"success", "total", "done", "error", "duplicates"}
+    """
+    fmt = _check_stream_format(stream_format)
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"Too many files (max {MAX_BATCH_FILES})"
+        )
 
-            framework_result = process_with_global_llm(
-                metadata=merged_metadata, model=model, use_mock=False
+    uploads, rejected = [], []
+    try:
+        for index, file in enumerate(files):
+            name = file.filename or f"file-{index}"
+            file_ext = Path(name).suffix.lower()
+            if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
+                error = f"Unsupported file type: {file_ext or 'none'}"
+            else:
+                try:
+                    upload = await spool_upload(file, MAX_UPLOAD_BYTES, suffix=file_ext)
+                    uploads.append({**upload.as_dict(), "name": name, "index": index})
+                    continue
+                except UploadTooLarge:
+                    error = "File too large (max 10MB)"
+            rejected.append(
+                {
+                    "index": index,
+                    "name": name,
+                    "doc_hash": None,
+                    "status": "error",
+                    "duplicate_of": None,
+                    "error": error,
+                }
             )
-            print(" Global LLM completed")
+    except Exception:
+        for upload in uploads:
+            if os.path.exists(upload["path"]):
+                os.unlink(upload["path"])
+        raise
 
-        #  MODIFIED: 支持多 POV 输出
-        frameworks = framework_result.get("frameworks", [framework_result])
+    print(
+        f" Batch extraction: {len(uploads)} file(s) accepted, {len(rejected)} rejected"
+    )
+    return _streaming_response(_batch_stream(fmt, uploads, rejected, use_cache), fmt)
 
-        #  步骤 3: 生成 framework IDs(前端会保存到 Firebase)
-        print(
-            "💾 Step 3: Generating framework IDs (data will be saved to Firebase by frontend)..."
+
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_text_job(
+    request: TextGenerateRequest, user_id: str = Depends(get_current_user_id)
+):
+    """
+    后台生成（文本）：立即返回 job_id，不受 HTTP 超时限制
+
+    任务归属（以及 LLM 公平排队的租户）取自登录用户，忽略 body 里的 user_id
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text content is empty")
+
+    if len(request.text) > 50000:
+        raise HTTPException(
+            status_code=400, detail="Text too long (max 50,000 characters)"
         )
 
-        saved_ids = []
-        for fw_data in frameworks:
-            # 为每个 framework 生成唯一 ID
-            fw_id = f"fw_{generate(size=12)}"
-            fw_data["id"] = fw_id  # 添加 ID 到 framework 数据中
-            saved_ids.append(fw_id)
+    job_id = await job_queue.submit(
+        "text",
+        {
+            "text": request.text,
+            "use_global_llm": request.use_global_llm,
+            "model": request.model,
+            "use_cache": request.use_cache,
+        },
+        user_id=user_id,
+    )
+    return _job_submit_response(job_id)
 
-        print(f" Generated {len(saved_ids)} framework IDs: {saved_ids}")
 
-        #  MODIFIED: 同时返回单个与多个
-        return GenerateResponse(
-            success=True,
-            framework_id=saved_ids[0] if saved_ids else None,
-            framework=frameworks[0] if frameworks else None,
-            frameworks=frameworks,
-            metadata=merged_metadata,
+@router.post("/jobs/files", response_model=JobSubmitResponse, status_code=202)
+async def submit_files_job(
+    files: List[UploadFile] = File(...),
+    use_global_llm: bool = True,
+    model: str = "gpt-4o",
+    use_cache: bool = True,
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    后台生成（多文件）：文件保存到 job spool 目录，重启后仍可继续处理
+    """
+    job_id = new_job_id()
+    directory = spool_dir(job_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        saved = await save_uploaded_files(files, directory=str(directory))
+        await job_queue.submit(
+            "files",
+            {
+                "files": saved,
+                "use_global_llm": use_global_llm,
+                "model": model,
+                "use_cache": use_cache,
+            },
+            user_id=user_id,
+            job_id=job_id,
         )
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return _job_submit_response(job_id)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """轮询任务状态；完成后 result 与 GenerateResponse 结构相同（仅任务创建者可见）"""
+    job = await run_in_threadpool(job_queue.get, job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Server-Sent Events 进度流
+
+    event: progress  data: {"stage": "llm_chunk", "done": 3, "total": 8, "progress": 0.39, ...}
+    event: succeeded / failed  data: 最终任务状态（同 GET /jobs/{id}）
+
+    断线重连时浏览器会带上 Last-Event-ID，只补发之后的事件
+    需要 Authorization（EventSource 不能带 header，前端用 fetch 读取流）
+    """
+    if not await run_in_threadpool(job_queue.get, job_id, user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    after_id = int(last_event_id) if (last_event_id or "").isdigit() else 0
+
+    async def event_stream():
+        async for ev in job_queue.stream(job_id, after_id):
+            if await request.is_disconnected():
+                break
+            if not ev:
+                yield SSE_KEEPALIVE
+                continue
+            if ev["stage"] in ("succeeded", "failed"):
+                job = await run_in_threadpool(job_queue.get, job_id, user_id)
+                yield format_sse(job, event=ev["stage"], event_id=ev["id"])
+            else:
+                data = {"stage": ev["stage"], **ev["data"], "at": ev["created_at"]}
+                yield format_sse(data, event="progress", event_id=ev["id"])
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+# 列表页只需要这些列；raw_framework_json / steps_json 等大字段不加载
+LIST_COLUMNS = (
+    Framework.id,
+    Framework.title,
+    Framework.version,
+    Framework.family,
+    Framework.confidence,
+    Framework.created_at,
+    Framework.updated_at,
+    Framework.artefacts_json,
+)
+MAX_PAGE_SIZE = 200
+
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f" Error: {str(e)}")
-        import traceback
+def preview_artefacts(artefacts_json: Optional[str]) -> List[dict]:
+    """最多3个 artefact（name + 截断的 description），用于卡片显示"""
+    try:
+        artefacts = json.loads(artefacts_json or "{}")
+    except ValueError:
+        return []
+    additional = artefacts.get("additional", []) if isinstance(artefacts, dict) else []
+    return [
+        {
+            "name": art.get("name", ""),
+            "description": (art.get("description") or "")[:100],
+        }
+        for art in additional[:3]
+        if isinstance(art, dict)
+    ]
+
+
+async def list_user_frameworks(
+    db: AsyncSession,
+    user_id: str,
+    family: Optional[str],
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[List[Framework], Optional[str]]:
+    """
+    当前用户的 frameworks（created_at, id 倒序），family 过滤在 SQL 里完成
 
-        traceback.print_exc()
-        return GenerateResponse(success=False, error=str(e))
-    finally:
-        # 清理所有临时文件
-        for temp_path in temp_paths:
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+    limit 为空时返回全部（兼容旧前端）；否则按 keyset 游标分页，返回
+    (rows, next_cursor)，最后一页 next_cursor 为 None
+    """
+    stmt = (
+        select(Framework)
+        .options(load_only(*LIST_COLUMNS, raiseload=True))
+        .where(Framework.creator_id == user_id)
+        .order_by(Framework.created_at.desc(), Framework.id.desc())
+    )
+    if family:
+        stmt = stmt.where(Framework.family == family)
+    try:
+        after = after_cursor(Framework.created_at, Framework.id, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after is not None:
+        stmt = stmt.where(after)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)  # 多取一行判断是否还有下一页
+
+    frameworks = list((await db.scalars(stmt)).all())
+    next_cursor = None
+    if limit is not None and len(frameworks) > limit:
+        frameworks = frameworks[:limit]
+        last = frameworks[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return frameworks, next_cursor
 
 
 # 新增：获取当前用户的所有 frameworks
 @router.get("/my-frameworks", response_model=List[FrameworkListResponse])
-def get_my_frameworks(user_id: str = Query(None), db: Session = Depends(get_db)):
+async def get_my_frameworks(
+    response: Response,
+    user_id: str = Query(None),
+    family: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     获取当前用户创建的所有 frameworks
 
     按创建时间倒序排列
     用于 "Your Frameworks" 列表页
+
+    分页: 传 limit 后只返回一页，下一页的游标在 X-Next-Cursor 响应头里，
+    作为 cursor 参数传回即可（没有该响应头 = 最后一页）
     """
 
-    frameworks = (
-        db.query(Framework)
-        .filter(Framework.creator_id == user_id)
-        .order_by(Framework.created_at.desc())
-        .all()
+    frameworks, next_cursor = await list_user_frameworks(
+        db, user_id, family, cursor, limit
     )
-
-    result = []
-    for fw in frameworks:
-        # 解析 artefacts 用于预览
-        artefacts = json.loads(fw.artefacts_json)
-        additional = artefacts.get("additional", [])
-
-        # 只取前3个 artefact 用于卡片显示
-        preview_artefacts = []
-        if additional:
-            for art in additional[:3]:
-                preview_artefacts.append(
-                    {
-                        "name": art.get("name", ""),
-                        "description": art.get("description", "")[:100],  # 截断描述
-                    }
-                )
-
-        result.append(
-            FrameworkListResponse(
-                id=fw.id,
-                title=fw.title,
-                version=fw.version,
-                family=fw.family,
-                confidence=fw.confidence,
-                created_at=fw.created_at,
-                updated_at=fw.updated_at,
-                preview_artefacts=preview_artefacts,
-            )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return [
+        FrameworkListResponse(
+            id=fw.id,
+            title=fw.title,
+            version=fw.version,
+            family=fw.family,
+            confidence=fw.confidence,
+            created_at=fw.created_at,
+            updated_at=fw.updated_at,
+            preview_artefacts=preview_artefacts(fw.artefacts_json),
         )
-
-    return result
+        for fw in frameworks
+    ]
 
 
 # 新增：按 family 分组获取 frameworks
 @router.get("/my-frameworks/by-family")
-def get_my_frameworks_by_family(
-    user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)
+async def get_my_frameworks_by_family(
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    family: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     获取当前用户的 frameworks，按 family 分组
@@ -1236,38 +1691,21 @@ def get_my_frameworks_by_family(
         "Healthcare": [...],
         ...
     }
+
+    family / cursor / limit 同 /my-frameworks（分页按整体时间顺序，
+    一页里的 frameworks 再分组）
     """
 
-    frameworks = (
-        db.query(Framework)
-        .filter(Framework.creator_id == user_id)
-        .order_by(Framework.created_at.desc())
-        .all()
+    frameworks, next_cursor = await list_user_frameworks(
+        db, user_id, family, cursor, limit
     )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     # 按 family 分组
     grouped = {}
     for fw in frameworks:
-        family = fw.family or "Other"
-
-        if family not in grouped:
-            grouped[family] = []
-
-        # 解析 artefacts
-        artefacts = json.loads(fw.artefacts_json)
-        additional = artefacts.get("additional", [])
-
-        preview_artefacts = []
-        if additional:
-            for art in additional[:3]:
-                preview_artefacts.append(
-                    {
-                        "name": art.get("name", ""),
-                        "description": art.get("description", "")[:100],
-                    }
-                )
-
-        grouped[family].append(
+        grouped.setdefault(fw.family or "Other", []).append(
             {
                 "id": fw.id,
                 "title": fw.title,
@@ -1276,7 +1714,7 @@ def get_my_frameworks_by_family(
                 "confidence": fw.confidence,
                 "created_at": fw.created_at.isoformat(),
                 "updated_at": fw.updated_at.isoformat(),
-                "preview_artefacts": preview_artefacts,
+                "preview_artefacts": preview_artefacts(fw.artefacts_json),
             }
         )
 
@@ -1285,10 +1723,10 @@ def get_my_frameworks_by_family(
 
 # 新增：获取单个 framework 的详细信息
 @router.get("/{framework_id}", response_model=FrameworkDetailResponse)
-def get_framework_detail(
+async def get_framework_detail(
     framework_id: str,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     获取 framework 的完整信息
@@ -1296,12 +1734,10 @@ def get_framework_detail(
     只能访问自己创建的 framework
     """
 
-    framework = (
-        db.query(Framework)
-        .filter(
+    framework = await db.scalar(
+        select(Framework).where(
             Framework.id == framework_id, Framework.creator_id == user_id  # 确保只能访问自己的
         )
-        .first()
     )
 
     if not framework:
@@ -1329,20 +1765,20 @@ def get_framework_detail(
 
 # 新增：绑定信息接口 (/api/frameworks/{id}/binding)
 @router.get("/{framework_id}/binding")
-def get_framework_binding(
+async def get_framework_binding(
     framework_id: str,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     获取 framework 的 POV、family、confidence 绑定信息
     （用于前端在框架卡片或详情页中同时显示 POV 与信心度）
     """
     # 🔍 查询当前用户的 framework
-    fw = (
-        db.query(Framework)
-        .filter(Framework.id == framework_id, Framework.creator_id == user_id)
-        .first()
+    fw = await db.scalar(
+        select(Framework).where(
+            Framework.id == framework_id, Framework.creator_id == user_id
+        )
     )
 
     if not fw:
@@ -1373,11 +1809,11 @@ def get_framework_binding(
 
 # 新增：更新 framework
 @router.put("/{framework_id}")
-def update_framework(
+async def update_framework(
     framework_id: str,
     framework_data: dict,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     更新 framework（从 Editor 保存）
@@ -1385,10 +1821,10 @@ def update_framework(
     只能更新自己创建的 framework
     """
 
-    framework = (
-        db.query(Framework)
-        .filter(Framework.id == framework_id, Framework.creator_id == user_id)
-        .first()
+    framework = await db.scalar(
+        select(Framework).where(
+            Framework.id == framework_id, Framework.creator_id == user_id
+        )
     )
 
     if not framework:
@@ -1418,8 +1854,8 @@ def update_framework(
 
     framework.updated_at = datetime.utcnow()
 
-    db.commit()
-    db.refresh(framework)
+    await db.commit()
+    await db.refresh(framework)
 
     return {
         "success": True,
@@ -1430,10 +1866,10 @@ def update_framework(
 
 # 新增：删除 framework
 @router.delete("/{framework_id}")
-def delete_framework(
+async def delete_framework(
     framework_id: str,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     删除 framework
@@ -1441,10 +1877,10 @@ def delete_framework(
     只能删除自己创建的 framework
     """
 
-    framework = (
-        db.query(Framework)
-        .filter(Framework.id == framework_id, Framework.creator_id == user_id)
-        .first()
+    framework = await db.scalar(
+        select(Framework).where(
+            Framework.id == framework_id, Framework.creator_id == user_id
+        )
     )
 
     if not framework:
@@ -1452,8 +1888,8 @@ def delete_framework(
             status_code=404, detail="Framework not found or you don't have permission"
         )
 
-    db.delete(framework)
-    db.commit()
+    await db.delete(framework)
+    await db.commit()
 
     return {"success": True, "message": "Framework deleted successfully"}
 
@@ -1884,6 +2320,37 @@ async def export_docx_from_data(framework_data: dict):
         )
 
 
+def build_regenerate_messages(framework: dict) -> List[dict]:
+    """/regenerate 云端模式的 prompt（普通与流式接口共用）"""
+    system_prompt = (
+        "You are a framework improvement assistant. "
+        "The user has edited a framework and wants you to review and improve it. "
+        "CRITICAL: Keep ALL user modifications intact. Only fill in missing parts and suggest improvements. "
+        "Return the improved framework as valid JSON matching the original structure."
+    )
+
+    user_prompt = (
+        "Here is a framework that the user has edited:\n\n"
+        f"{json.dumps(framework, indent=2)}\n\n"
+        "Please:\n"
+        "1. **Keep all user modifications intact** (especially steps, risks, escalation)\n"
+        "2. Fill in missing sections if any:\n"
+        "   - Add 'trigger_context' or 'pov' if missing\n"
+        "   - Add 'inputs_required' if missing\n"
+        "   - Add 'research_required' if missing\n"
+        "   - Add 'attribution' if appropriate\n"
+        "   - Add 'quadrant' (QI/QII/QIII/QIV) if appropriate\n"
+        "3. Ensure consistency across all sections\n"
+        "4. Improve descriptions to be more specific and actionable\n"
+        "5. Return the complete improved framework as JSON\n\n"
+        "IMPORTANT: Do NOT remove or significantly change user's content. Only enhance and complete."
+    )
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
 
 @router.post("/regenerate")
 async def regenerate_framework(request: RegenerateRequest):
@@ -1899,12 +2366,10 @@ async def regenerate_framework(request: RegenerateRequest):
             # ========== 本地处理模式 ==========
             print(" Using Local Processing (Ollama)")
 
-            # 检查 Ollama 是否运行
-            import requests
+            # 检查 Ollama 是否运行（结果缓存 LLM_HEALTH_TTL_SECONDS，不再每次请求都探测）
+            from llm_health import aprobe_http
 
-            try:
-                requests.get("http://127.0.0.1:11434", timeout=2)
-            except requests.exceptions.RequestException:
+            if not await aprobe_http("http://127.0.0.1:11434"):
                 raise HTTPException(
                     status_code=503,
                     detail="Ollama is not running. Please start Ollama: 'ollama serve'",
@@ -1914,28 +2379,21 @@ async def regenerate_framework(request: RegenerateRequest):
             framework_text = convert_framework_to_text(request.framework)
 
             # 步骤 2: Local LLM 重新提取 metadata
-            from llm_local import extract_seed_from_text, OllamaClient
+            from llm_local import aextract_seed_from_text, OllamaClient
 
             llm = OllamaClient(model="llama3.1:8b", host="http://127.0.0.1:11434")
-            metadata = extract_seed_from_text(framework_text, llm=llm)
+            metadata = await aextract_seed_from_text(framework_text, llm=llm)
 
             # 步骤 3: Global LLM 生成新框架（或使用 mock）
             api_key, base_url = resolve_api_settings(None, None)
-            if api_key:
-                from llm_global import call_openai_framework
-
-                improved_framework = call_openai_framework(
-                    md=metadata,
-                    model="gpt-4o",
-                    timeout=180,
-                    api_key=api_key,
-                    base_url=base_url,
-                    verbose=True,
-                )
-            else:
-                from llm_global import build_mock_framework
-
-                improved_framework = build_mock_framework(metadata)
+            improved_framework = await agenerate_framework(
+                md=metadata,
+                model="gpt-4o",
+                timeout=180,
+                api_key=api_key,
+                base_url=base_url,
+                verbose=True,
+            )
 
             return {
                 "success": True,
@@ -1956,101 +2414,35 @@ async def regenerate_framework(request: RegenerateRequest):
                     detail="OpenAI API key not configured. Please use local processing instead.",
                 )
 
-            # 直接发送完整框架给 OpenAI 进行改进
-            from openai import OpenAI
-            import httpx
-            import os
-
-            # 清除代理环境变量
-            original_proxies = {}
-            proxy_keys = [
-                "HTTP_PROXY",
-                "HTTPS_PROXY",
-                "http_proxy",
-                "https_proxy",
-                "ALL_PROXY",
-                "all_proxy",
-                "NO_PROXY",
-                "no_proxy",
-            ]
-
-            for key in proxy_keys:
-                if key in os.environ:
-                    original_proxies[key] = os.environ[key]
-                    del os.environ[key]
-            try:
-                timeout = 180.0
-                if base_url:
-                    client = OpenAI(
-                        api_key=api_key,
-                        base_url=base_url,
-                        timeout=timeout,
-                        max_retries=2,
-                    )
-                else:
-                    client = OpenAI(api_key=api_key, timeout=timeout, max_retries=2)
-
-                # 构建 prompt
-                system_prompt = (
-                    "You are a framework improvement assistant. "
-                    "The user has edited a framework and wants you to review and improve it. "
-                    "CRITICAL: Keep ALL user modifications intact. Only fill in missing parts and suggest improvements. "
-                    "Return the improved framework as valid JSON matching the original structure."
-                )
-
-                user_prompt = (
-                    "Here is a framework that the user has edited:\n\n"
-                    f"{json.dumps(request.framework, indent=2)}\n\n"
-                    "Please:\n"
-                    "1. **Keep all user modifications intact** (especially steps, risks, escalation)\n"
-                    "2. Fill in missing sections if any:\n"
-                    "   - Add 'trigger_context' or 'pov' if missing\n"
-                    "   - Add 'inputs_required' if missing\n"
-                    "   - Add 'research_required' if missing\n"
-                    "   - Add 'attribution' if appropriate\n"
-                    "   - Add 'quadrant' (QI/QII/QIII/QIV) if appropriate\n"
-                    "3. Ensure consistency across all sections\n"
-                    "4. Improve descriptions to be more specific and actionable\n"
-                    "5. Return the complete improved framework as JSON\n\n"
-                    "IMPORTANT: Do NOT remove or significantly change user's content. Only enhance and complete."
-                )
-
-                print(" Sending request to OpenAI...")
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    temperature=0.3,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                )
-
-                result_text = response.choices[0].message.content.strip()
-                print(" Received response from OpenAI")
+            # 直接发送完整框架给 OpenAI 进行改进 (proxy bypass via trust_env=False)
+            client = get_async_openai_client(
+                api_key=api_key, base_url=base_url, timeout=180.0, max_retries=0
+            )
 
-                # 解析 JSON
-                from llm_global import robust_json_loads
+            # 构建 prompt
+            messages = build_regenerate_messages(request.framework)
 
-                improved_framework = robust_json_loads(result_text)
+            print(" Sending request to OpenAI...")
+            response = await acreate_chat_completion(
+                client,
+                base_url,
+                model="gpt-4o",
+                temperature=0.3,
+                messages=messages,
+            )
 
-                return {
-                    "success": True,
-                    "framework": improved_framework,
-                    "method": "cloud",
-                    "message": "Framework regenerated using cloud processing",
-                }
+            result_text = response.choices[0].message.content.strip()
+            print(" Received response from OpenAI")
 
-            finally:
-                # 恢复代理设置
-                for key, value in original_proxies.items():
-                    os.environ[key] = value
+            # 解析 JSON
+            improved_framework = lenient_loads(result_text)
 
-                # 关闭 HTTP client
-                if "http_client" in locals():
-                    try:
-                        http_client.close()
-                    except:
-                        pass
+            return {
+                "success": True,
+                "framework": improved_framework,
+                "method": "cloud",
+                "message": "Framework regenerated using cloud processing",
+            }
 
     except HTTPException:
         raise
@@ -2117,6 +2509,93 @@ class AIMergeRequest(BaseModel):
     frameworks: List[dict]  # 用户选中的多个 frameworks
 
 
+def build_merge_messages(frameworks: List[dict]) -> List[dict]:
+    """/ai-merge 的 prompt（普通与流式接口共用）"""
+    # 准备合并 prompt
+    frameworks_text = []
+    for i, fw in enumerate(frameworks, 1):
+        frameworks_text.append(f"\n{'='*60}")
+        frameworks_text.append(f"FRAMEWORK {i}: {fw.get('name', 'Unnamed')}")
+        frameworks_text.append(f"{'='*60}\n")
+
+        # Description
+        if fw.get("description"):
+            frameworks_text.append(f"Description:\n{fw['description']}\n")
+
+        # Sub-steps
+        if fw.get("subSteps"):
+            frameworks_text.append("Sub-steps:")
+            for j, step in enumerate(fw["subSteps"], 1):
+                frameworks_text.append(f"  {j}. {step}")
+            frameworks_text.append("")
+
+    combined_text = "\n".join(frameworks_text)
+
+    system_prompt = (
+        "You are a framework merging assistant. "
+        "Your task is to intelligently combine multiple frameworks into one cohesive framework. "
+        "You should:\n"
+        "1. Identify common themes and consolidate similar content\n"
+        "2. Remove redundancy while preserving unique insights from each framework\n"
+        "3. Organize the merged content logically\n"
+        "4. Create a clear, comprehensive description that captures all key aspects\n"
+        "5. Combine sub-steps in a logical order\n"
+        "6. Generate an appropriate name for the merged framework\n\n"
+        "Return ONLY a valid JSON object with this structure:\n"
+        "{\n"
+        '  "name": "Merged Framework Name",\n'
+        '  "description": "Comprehensive description...",\n'
+        '  "subSteps": ["Step 1", "Step 2", ...]\n'
+        "}"
+    )
+
+    user_prompt = (
+        f"Please merge these {len(frameworks)} frameworks into one:\n\n"
+        f"{combined_text}\n\n"
+        "Create a new framework that:\n"
+        "- Captures the essence of all input frameworks\n"
+        "- Eliminates redundancy and contradictions\n"
+        "- Provides a clear, actionable structure\n"
+        "- Has a descriptive name that reflects the merged content\n\n"
+        "Return the merged framework as JSON."
+    )
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def finalize_merged_framework(merged_framework: dict) -> dict:
+    """确保必需字段存在"""
+    if not merged_framework.get("name"):
+        merged_framework["name"] = "AI Merged Framework"
+
+    if not merged_framework.get("description"):
+        merged_framework["description"] = ""
+
+    if not merged_framework.get("subSteps"):
+        merged_framework["subSteps"] = []
+
+    return merged_framework
+
+
+def mock_merge_result(count: int) -> dict:
+    """没有 API key 时返回的简单合并结果"""
+    return {
+        "success": True,
+        "merged_framework": {
+            "name": "Merged Framework (Mock)",
+            "description": "This is a test merge of " + str(count) + " frameworks.",
+            "subSteps": [
+                "Combined step 1",
+                "Combined step 2",
+                "Combined step 3",
+            ],
+        },
+    }
+
+
 @router.post("/ai-merge")
 async def ai_merge_frameworks(request: AIMergeRequest):
     """
@@ -2143,149 +2622,38 @@ async def ai_merge_frameworks(request: AIMergeRequest):
         if not api_key:
             # 如果没有 API key，返回一个简单的合并结果
             print("⚠️ No API key, returning mock merge")
-            return {
-                "success": True,
-                "merged_framework": {
-                    "name": "Merged Framework (Mock)",
-                    "description": "This is a test merge of "
-                    + str(len(request.frameworks))
-                    + " frameworks.",
-                    "subSteps": [
-                        "Combined step 1",
-                        "Combined step 2",
-                        "Combined step 3",
-                    ],
-                },
-            }
-
-        # 准备合并 prompt
-        frameworks_text = []
-        for i, fw in enumerate(request.frameworks, 1):
-            frameworks_text.append(f"\n{'='*60}")
-            frameworks_text.append(f"FRAMEWORK {i}: {fw.get('name', 'Unnamed')}")
-            frameworks_text.append(f"{'='*60}\n")
-
-            # Description
-            if fw.get("description"):
-                frameworks_text.append(f"Description:\n{fw['description']}\n")
-
-            # Sub-steps
-            if fw.get("subSteps"):
-                frameworks_text.append("Sub-steps:")
-                for j, step in enumerate(fw["subSteps"], 1):
-                    frameworks_text.append(f"  {j}. {step}")
-                frameworks_text.append("")
-
-        combined_text = "\n".join(frameworks_text)
+            return mock_merge_result(len(request.frameworks))
 
         # 调用 OpenAI
-        from openai import OpenAI
-        import httpx
-        import os
-
-        # 清除代理环境变量
-        original_proxies = {}
-        proxy_keys = [
-            "HTTP_PROXY",
-            "HTTPS_PROXY",
-            "http_proxy",
-            "https_proxy",
-            "ALL_PROXY",
-            "all_proxy",
-            "NO_PROXY",
-            "no_proxy",
-        ]
-
-        for key in proxy_keys:
-            if key in os.environ:
-                original_proxies[key] = os.environ[key]
-                del os.environ[key]
-
-        try:
-            # OpenAI 2.6.1 自动处理重试和超时
-            if base_url:
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url=base_url,
-                    timeout=300.0,  # 5分钟超时
-                    max_retries=2,
-                )
-            else:
-                client = OpenAI(api_key=api_key, timeout=300.0, max_retries=2)
-
-            # 构建 prompt
-            system_prompt = (
-                "You are a framework merging assistant. "
-                "Your task is to intelligently combine multiple frameworks into one cohesive framework. "
-                "You should:\n"
-                "1. Identify common themes and consolidate similar content\n"
-                "2. Remove redundancy while preserving unique insights from each framework\n"
-                "3. Organize the merged content logically\n"
-                "4. Create a clear, comprehensive description that captures all key aspects\n"
-                "5. Combine sub-steps in a logical order\n"
-                "6. Generate an appropriate name for the merged framework\n\n"
-                "Return ONLY a valid JSON object with this structure:\n"
-                "{\n"
-                '  "name": "Merged Framework Name",\n'
-                '  "description": "Comprehensive description...",\n'
-                '  "subSteps": ["Step 1", "Step 2", ...]\n'
-                "}"
-            )
-
-            user_prompt = (
-                f"Please merge these {len(request.frameworks)} frameworks into one:\n\n"
-                f"{combined_text}\n\n"
-                "Create a new framework that:\n"
-                "- Captures the essence of all input frameworks\n"
-                "- Eliminates redundancy and contradictions\n"
-                "- Provides a clear, actionable structure\n"
-                "- Has a descriptive name that reflects the merged content\n\n"
-                "Return the merged framework as JSON."
-            )
-
-            print(" Sending merge request to OpenAI...")
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                temperature=0.4,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            )
-
-            result_text = response.choices[0].message.content.strip()
-            print(" Received response from OpenAI")
-
-            # 解析 JSON
-            from llm_global import robust_json_loads
-
-            merged_framework = robust_json_loads(result_text)
-
-            # 确保必需字段存在
-            if not merged_framework.get("name"):
-                merged_framework["name"] = "AI Merged Framework"
+        # OpenAI 2.6.1 自动处理重试和超时 (pooled client)
+        client = get_async_openai_client(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=300.0,  # 5分钟超时
+            max_retries=0,
+        )
 
-            if not merged_framework.get("description"):
-                merged_framework["description"] = ""
+        # 构建 prompt
+        messages = build_merge_messages(request.frameworks)
 
-            if not merged_framework.get("subSteps"):
-                merged_framework["subSteps"] = []
+        print(" Sending merge request to OpenAI...")
+        response = await acreate_chat_completion(
+            client,
+            base_url,
+            model="gpt-4o",
+            temperature=0.4,
+            messages=messages,
+        )
 
-            print(f" Successfully merged into: {merged_framework['name']}")
+        result_text = response.choices[0].message.content.strip()
+        print(" Received response from OpenAI")
 
-            return {"success": True, "merged_framework": merged_framework}
+        # 解析 JSON
+        merged_framework = finalize_merged_framework(lenient_loads(result_text))
 
-        finally:
-            # 恢复代理设置
-            for key, value in original_proxies.items():
-                os.environ[key] = value
+        print(f" Successfully merged into: {merged_framework['name']}")
 
-            # 关闭 HTTP client
-            if "http_client" in locals():
-                try:
-                    http_client.close()
-                except:
-                    pass
+        return {"success": True, "merged_framework": merged_framework}
 
     except HTTPException:
         raise
@@ -2310,31 +2678,88 @@ class AIFillRequest(BaseModel):
 
 def parse_ai_json_response(text):
     """
-    Parse JSON from AI response, handling common issues like markdown code blocks
+    Parse the JSON array of filled sections from an AI response
+    (code fences / prose / trailing commas / truncation tolerated, see llm_json)
     """
-    import json
-    import re
-    
-    # Remove markdown code blocks if present
-    text = text.strip()
-    
-    # Remove ```json ... ``` or ``` ... ```
-    text = re.sub(r'^```(?:json)?\s*', '', text)
-    text = re.sub(r'\s*```$', '', text)
-    text = text.strip()
+    return lenient_loads(text, list)
+
+
+def mock_fill_sections(sections_to_fill: List[str]) -> List[dict]:
+    """Placeholder content when no API key is configured"""
+    filled = []
+    for section_name in sections_to_fill:
+        filled.append({
+            "heading": section_name,
+            "body": f"[Mock content for {section_name}] This is placeholder content. Configure your OpenAI API key for real AI-generated content."
+        })
+    return filled
+
+
+def build_fill_messages(request: AIFillRequest) -> List[dict]:
+    """Prompt for /ai-fill (shared by the normal and streaming endpoints)"""
+    # Build context from existing sections
+    existing_context = ""
+    if request.existing_sections:
+        existing_context = "\n\nExisting sections for context:\n"
+        for sec in request.existing_sections:
+            existing_context += f"- {sec.get('heading', 'Section')}: {sec.get('body', '')}\n"
+
+    system_prompt = (
+        "You are an expert document writer. Your task is to fill in content for document sections. "
+        "If section names are numbers or very short, infer logical section topics based on the document context. "
+        "You MUST return ONLY a valid JSON array with no additional text, markdown, or explanation. "
+        "Do not wrap the response in code blocks. Just output the raw JSON array."
+    )
+
+    sections_list = ", ".join([f'"{s}"' for s in request.sections_to_fill])
     
-    # Try to find JSON array in the text
-    # Look for [ ... ] pattern
-    match = re.search(r'\[[\s\S]*\]', text)
-    if match:
-        text = match.group(0)
+    # Check if sections are just numbers - provide extra context
+    has_number_sections = any(s.strip().isdigit() for s in request.sections_to_fill)
+    extra_instruction = ""
+    if has_number_sections:
+        extra_instruction = """
+IMPORTANT: Some sections are numbered (e.g., "3", "4"). Based on the document type and existing sections,
+infer what these numbered sections should logically contain. For example:
+- For compliance documents: risk analysis, mitigation steps, monitoring procedures
+- For technical documents: implementation details, testing procedures, maintenance
+- Follow the pattern of existing numbered sections if present."""
     
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError as e:
-        print(f"JSON parse error: {e}")
-        print(f"Attempted to parse: {text[:500]}...")
-        raise
+    user_prompt = f"""Document: {request.artefact_name}
+Summary: {request.artefact_summary or 'A professional document'}
+{existing_context}
+{extra_instruction}
+
+Write professional content for these sections: {sections_list}
+
+Output format (return ONLY this JSON array, nothing else):
+[{{"heading": "Section Name", "body": "Professional content here..."}}]
+
+Requirements:
+- Each body should be 2-3 sentences of relevant, professional content
+- Infer appropriate content based on document type and context
+- Be specific and actionable, not generic"""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def complete_filled_sections(filled_sections, sections_to_fill: List[str]) -> List[dict]:
+    """Validate response format and make sure every requested section exists"""
+    if not isinstance(filled_sections, list):
+        filled_sections = [filled_sections]
+
+    # Ensure all requested sections are filled
+    filled_headings = {s.get('heading') for s in filled_sections}
+    for section_name in sections_to_fill:
+        if section_name not in filled_headings:
+            filled_sections.append({
+                "heading": section_name,
+                "body": f"Content for {section_name} section."
+            })
+
+    return filled_sections
 
 
 @router.post("/ai-fill")
@@ -2353,114 +2778,302 @@ async def ai_fill_sections(request: AIFillRequest):
         if not api_key:
             # Mock response if no API key
             print("⚠️ No API key, returning mock fill")
-            filled = []
-            for section_name in request.sections_to_fill:
-                filled.append({
-                    "heading": section_name,
-                    "body": f"[Mock content for {section_name}] This is placeholder content. Configure your OpenAI API key for real AI-generated content."
-                })
-            return {"success": True, "filled_sections": filled}
-
-        # Build context from existing sections
-        existing_context = ""
-        if request.existing_sections:
-            existing_context = "\n\nExisting sections for context:\n"
-            for sec in request.existing_sections:
-                existing_context += f"- {sec.get('heading', 'Section')}: {sec.get('body', '')}\n"
+            return {
+                "success": True,
+                "filled_sections": mock_fill_sections(request.sections_to_fill),
+            }
 
         # Prepare OpenAI call
-        from openai import OpenAI
-        import os
+        client = get_async_openai_client(
+            api_key=api_key, base_url=base_url, timeout=120.0, max_retries=0
+        )
+
+        # Build prompt
+        messages = build_fill_messages(request)
+
+        print("📡 Sending request to OpenAI...")
+        response = await acreate_chat_completion(
+            client,
+            base_url,
+            model="gpt-4o",
+            temperature=0.4,
+            messages=messages,
+        )
+
+        result_text = response.choices[0].message.content.strip()
+        print(f"✅ Received response from OpenAI: {result_text[:200]}...")
+
+        # Parse JSON response with our custom parser
+        filled_sections = parse_ai_json_response(result_text)
+
+        filled_sections = complete_filled_sections(
+            filled_sections, request.sections_to_fill
+        )
 
-        # Clear proxy settings
-        original_proxies = {}
-        proxy_keys = ["HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy", "ALL_PROXY", "all_proxy"]
-        for key in proxy_keys:
-            if key in os.environ:
-                original_proxies[key] = os.environ[key]
-                del os.environ[key]
+        print(f"✅ Successfully filled {len(filled_sections)} sections")
+        return {"success": True, "filled_sections": filled_sections}
 
+    except Exception as e:
+        import traceback
+        print("❌ AI Fill Error:")
+        print(traceback.format_exc())
+        return {"success": False, "error": str(e), "filled_sections": []}
+
+
+# ============= Streaming Endpoints =============
+# /regenerate/stream, /ai-merge/stream, /ai-fill/stream
+# 逐 token 转发模型输出，并在 JSON 中的 step / subStep / section 闭合时立即推送
+#
+# 事件（?format=sse 默认，或 ?format=ndjson 每行 {"event": ..., "data": ...}）:
+#   delta  {"text": "..."}                 模型原始增量输出
+#   item   {"path": [...], "value": ...}   一个完整的 step / section 等
+#   done   与对应非流式接口相同的返回结构
+#   error  {"success": false, "error": "..."}
+
+REGENERATE_STREAM_PATTERNS = [
+    "title",
+    "metadata",
+    "pov.*",
+    "steps.*.subSteps.*",
+    "steps.*",
+    "workflow_layers.*",
+    "risks.*",
+    "risks_watchouts.*",
+    "escalation.*",
+    "artefact_variants.*",
+]
+MERGE_STREAM_PATTERNS = ["name", "description", "subSteps.*"]
+FILL_STREAM_PATTERNS = ["*"]  # 每个 {heading, body}
+
+
+def _stream_frame(fmt: str, event: str, data: Any) -> str:
+    if fmt == "ndjson":
+        return format_ndjson({"event": event, "data": data})
+    return format_sse(data, event=event)
+
+
+def _streaming_response(frames, fmt: str) -> StreamingResponse:
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    return StreamingResponse(frames, media_type=media_type, headers=SSE_HEADERS)
+
+
+def _check_stream_format(fmt: str) -> str:
+    if fmt not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    return fmt
+
+
+async def _single_result_stream(fmt: str, make_result):
+    """没有流式来源时（mock / 本地模式），完成后一次性推送 done"""
+    try:
+        yield _stream_frame(fmt, "done", await make_result())
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        yield _stream_frame(fmt, "error", {"success": False, "error": detail})
+
+
+async def stream_chat_json(
+    messages: List[dict],
+    temperature: float,
+    timeout: float,
+    patterns: List[str],
+    finalize: Callable[[str], dict],
+    fmt: str = "sse",
+    label: str = "stream",
+):
+    """
+    调用 OpenAI (stream=True)，转发增量输出，并增量解析 JSON
+
+    finalize(full_text) 生成最终 done 事件（与非流式接口相同的解析逻辑）
+    """
+    api_key, base_url = resolve_api_settings(None, None)
+    # the SDK retries the initial request
+    client = get_async_openai_client(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=2
+    )
+    parser = IncrementalJSONParser(patterns)
+    parts = []
+    request = {
+        "model": "gpt-4o",
+        "temperature": temperature,
+        "messages": messages,
+    }
+    # 上游读取与向客户端转发解耦：limiter 槽位只在读 OpenAI 时占用（整段最多 timeout 秒），
+    # 客户端读得慢只会让 deltas 排队，不占并发名额。
+    # 代价：慢客户端时已生成的输出缓存在内存里（上限 = 一次回复的长度）
+    deltas: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def read_upstream():
+        stream = None
         try:
-            if base_url:
-                client = OpenAI(api_key=api_key, base_url=base_url, timeout=120.0, max_retries=2)
-            else:
-                client = OpenAI(api_key=api_key, timeout=120.0, max_retries=2)
-
-            # Build prompt
-            system_prompt = (
-                "You are an expert document writer. Your task is to fill in content for document sections. "
-                "If section names are numbers or very short, infer logical section topics based on the document context. "
-                "You MUST return ONLY a valid JSON array with no additional text, markdown, or explanation. "
-                "Do not wrap the response in code blocks. Just output the raw JSON array."
-            )
+            async with openai_limiter(base_url).aslot(request_tokens(request)):
+                async with asyncio.timeout(timeout):
+                    stream = await client.chat.completions.create(
+                        **request, stream=True
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            deltas.put_nowait(chunk.choices[0].delta.content)
+        except TimeoutError:
+            deltas.put_nowait(TimeoutError(f"OpenAI stream exceeded {timeout:g}s"))
+        except Exception as e:
+            deltas.put_nowait(e)
+        else:
+            deltas.put_nowait(finished)
+        finally:
+            if stream is not None:
+                await stream.close()
 
-            sections_list = ", ".join([f'"{s}"' for s in request.sections_to_fill])
-            
-            # Check if sections are just numbers - provide extra context
-            has_number_sections = any(s.strip().isdigit() for s in request.sections_to_fill)
-            extra_instruction = ""
-            if has_number_sections:
-                extra_instruction = """
-IMPORTANT: Some sections are numbered (e.g., "3", "4"). Based on the document type and existing sections,
-infer what these numbered sections should logically contain. For example:
-- For compliance documents: risk analysis, mitigation steps, monitoring procedures
-- For technical documents: implementation details, testing procedures, maintenance
-- Follow the pattern of existing numbered sections if present."""
-            
-            user_prompt = f"""Document: {request.artefact_name}
-Summary: {request.artefact_summary or 'A professional document'}
-{existing_context}
-{extra_instruction}
+    reader = asyncio.create_task(read_upstream())
+    try:
+        print(f"📡 [{label}] Streaming request to OpenAI...")
+        while (delta := await deltas.get()) is not finished:
+            if isinstance(delta, Exception):
+                raise delta
+            parts.append(delta)
+            yield _stream_frame(fmt, "delta", {"text": delta})
+            for path, value in parser.feed(delta):
+                yield _stream_frame(fmt, "item", {"path": list(path), "value": value})
+
+        result = finalize("".join(parts).strip())
+        print(f"✅ [{label}] Stream completed ({sum(len(p) for p in parts)} chars)")
+        yield _stream_frame(fmt, "done", result)
 
-Write professional content for these sections: {sections_list}
+    except Exception as e:
+        import traceback
 
-Output format (return ONLY this JSON array, nothing else):
-[{{"heading": "Section Name", "body": "Professional content here..."}}]
+        print(f"❌ [{label}] Stream Error:")
+        print(traceback.format_exc())
+        yield _stream_frame(fmt, "error", {"success": False, "error": str(e)})
+    finally:
+        reader.cancel()  # 客户端断开 → 停止读取上游并释放槽位
 
-Requirements:
-- Each body should be 2-3 sentences of relevant, professional content
-- Infer appropriate content based on document type and context
-- Be specific and actionable, not generic"""
 
-            print("📡 Sending request to OpenAI...")
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                temperature=0.4,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            )
+@router.post("/regenerate/stream")
+async def regenerate_framework_stream(
+    request: RegenerateRequest, stream_format: str = Query("sse", alias="format")
+):
+    """
+    /regenerate 的流式版本（云端模式逐 token 推送；本地模式完成后推送 done）
+    """
+    fmt = _check_stream_format(stream_format)
 
-            result_text = response.choices[0].message.content.strip()
-            print(f"✅ Received response from OpenAI: {result_text[:200]}...")
+    if request.use_local:
+        return _streaming_response(
+            _single_result_stream(fmt, lambda: regenerate_framework(request)), fmt
+        )
 
-            # Parse JSON response with our custom parser
-            filled_sections = parse_ai_json_response(result_text)
+    api_key, _ = resolve_api_settings(None, None)
+    if not api_key:
+        raise HTTPException(
+            status_code=400,
+            detail="OpenAI API key not configured. Please use local processing instead.",
+        )
 
-            # Validate response format
-            if not isinstance(filled_sections, list):
-                filled_sections = [filled_sections]
+    def finalize(result_text: str) -> dict:
+        return {
+            "success": True,
+            "framework": lenient_loads(result_text),
+            "method": "cloud",
+            "message": "Framework regenerated using cloud processing",
+        }
+
+    return _streaming_response(
+        stream_chat_json(
+            build_regenerate_messages(request.framework),
+            temperature=0.3,
+            timeout=180.0,
+            patterns=REGENERATE_STREAM_PATTERNS,
+            finalize=finalize,
+            fmt=fmt,
+            label="Regenerate",
+        ),
+        fmt,
+    )
 
-            # Ensure all requested sections are filled
-            filled_headings = {s.get('heading') for s in filled_sections}
-            for section_name in request.sections_to_fill:
-                if section_name not in filled_headings:
-                    filled_sections.append({
-                        "heading": section_name,
-                        "body": f"Content for {section_name} section."
-                    })
 
-            print(f"✅ Successfully filled {len(filled_sections)} sections")
-            return {"success": True, "filled_sections": filled_sections}
+@router.post("/ai-merge/stream")
+async def ai_merge_frameworks_stream(
+    request: AIMergeRequest, stream_format: str = Query("sse", alias="format")
+):
+    """
+    /ai-merge 的流式版本：name / description / 每个 subStep 生成后立即推送
+    """
+    fmt = _check_stream_format(stream_format)
 
-        finally:
-            # Restore proxy settings
-            for key, value in original_proxies.items():
-                os.environ[key] = value
+    if not request.frameworks or len(request.frameworks) < 2:
+        raise HTTPException(
+            status_code=400, detail="Please select at least 2 frameworks to merge"
+        )
 
-    except Exception as e:
-        import traceback
-        print("❌ AI Fill Error:")
-        print(traceback.format_exc())
-        return {"success": False, "error": str(e), "filled_sections": []}
\ No newline at end of file
+    if len(request.frameworks) > 10:
+        raise HTTPException(
+            status_code=400, detail="Cannot merge more than 10 frameworks at once"
+        )
+
+    api_key, _ = resolve_api_settings(None, None)
+    if not api_key:
+        print("⚠️ No API key, returning mock merge")
+
+        async def mock():
+            return mock_merge_result(len(request.frameworks))
+
+        return _streaming_response(_single_result_stream(fmt, mock), fmt)
+
+    def finalize(result_text: str) -> dict:
+        merged_framework = finalize_merged_framework(lenient_loads(result_text))
+        return {"success": True, "merged_framework": merged_framework}
+
+    return _streaming_response(
+        stream_chat_json(
+            build_merge_messages(request.frameworks),
+            temperature=0.4,
+            timeout=300.0,
+            patterns=MERGE_STREAM_PATTERNS,
+            finalize=finalize,
+            fmt=fmt,
+            label="AI Merge",
+        ),
+        fmt,
+    )
+
+
+@router.post("/ai-fill/stream")
+async def ai_fill_sections_stream(
+    request: AIFillRequest, stream_format: str = Query("sse", alias="format")
+):
+    """
+    Streaming /ai-fill: each {heading, body} is pushed as soon as it closes
+    """
+    fmt = _check_stream_format(stream_format)
+
+    api_key, _ = resolve_api_settings(None, None)
+    if not request.sections_to_fill or not api_key:
+
+        async def immediate():
+            return {
+                "success": True,
+                "filled_sections": mock_fill_sections(request.sections_to_fill),
+            }
+
+        return _streaming_response(_single_result_stream(fmt, immediate), fmt)
+
+    def finalize(result_text: str) -> dict:
+        filled_sections = complete_filled_sections(
+            parse_ai_json_response(result_text), request.sections_to_fill
+        )
+        return {"success": True, "filled_sections": filled_sections}
+
+    return _streaming_response(
+        stream_chat_json(
+            build_fill_messages(request),
+            temperature=0.4,
+            timeout=120.0,
+            patterns=FILL_STREAM_PATTERNS,
+            finalize=finalize,
+            fmt=fmt,
+            label="AI Fill",
+        ),
+        fmt,
+    )
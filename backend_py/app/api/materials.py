@@ -1,10 +1,12 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from nanoid import generate
 import mimetypes, os, json
 from pydantic import BaseModel
 from ..services.storage import save_bytes
-from ..db import get_db
+from ..services.uploads import UploadTooLarge, read_upload
+from ..db import get_async_db
 from ..models import Material
 from ..services.parser import build_metadata, summary
 from typing import Optional, Tuple  # ← 新增
@@ -55,7 +57,9 @@ def detect_kind_mime(
 
 
 @router.post("/upload-file")
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_file(
+    file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)
+):
     # Basic checks
     if not file.filename:
         raise HTTPException(status_code=400, detail="filename empty ")
@@ -68,20 +72,24 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
             detail=f"Unsupported file type. Allowed: {', '.join(sorted(EXT_WHITELIST))}",
         )
 
-    # Read & size guard
-    payload = await file.read()
-    size = len(payload or b"")
-    if size == 0:
-        raise HTTPException(status_code=400, detail="empty file")
-    if size > MAX_BYTES:
+    # Read & size guard (chunked, stops as soon as MAX_BYTES is exceeded)
+    try:
+        payload, sha256 = await read_upload(file, MAX_BYTES)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=status.HTTP_413_CONTENT_TOO_LARGE,
-            detail=f"File too large ({size} bytes). Max is {MAX_BYTES} bytes.",
+            detail=f"File too large. Max is {MAX_BYTES} bytes.",
         )
+    size = len(payload)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="empty file")
     storage_url = await save_bytes(payload, file.filename)
-    # Build metadata
-    meta = build_metadata(kind=kind, mime=mime, ext=ext, size=size, payload=payload)
+    # Build metadata (PDF / DOCX parsing blocks until the extraction pool is done)
+    meta = await run_in_threadpool(
+        build_metadata, kind=kind, mime=mime, ext=ext, size=size, payload=payload
+    )
     meta["original_filename"] = file.filename
+    meta["sha256"] = sha256
 
     mat = Material(
         id=f"mat_{generate(size=8)}",
@@ -94,14 +102,14 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
         sizebyte=size,
     )
     db.add(mat)
-    db.commit()
-    db.refresh(mat)
+    await db.commit()
+    await db.refresh(mat)
     return mat
 
 
 @router.get("/{material_id}")
-def get_material(material_id: str, db: Session = Depends(get_db)):
-    mat = db.query(Material).filter_by(id=material_id).first()
+async def get_material(material_id: str, db: AsyncSession = Depends(get_async_db)):
+    mat = await db.get(Material, material_id)
     if not mat:
         raise HTTPException(status_code=404, detail="not found")
     return mat
@@ -116,7 +124,7 @@ class TextIn(BaseModel):
 
 
 @router.post("/ingest-text")
-def ingest_text(body: TextIn, db: Session = Depends(get_db)):
+async def ingest_text(body: TextIn, db: AsyncSession = Depends(get_async_db)):
     text = (body.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="empty text")
@@ -140,6 +148,6 @@ def ingest_text(body: TextIn, db: Session = Depends(get_db)):
         sizebyte=meta["chars"],
     )
     db.add(mat)
-    db.commit()
-    db.refresh(mat)
+    await db.commit()
+    await db.refresh(mat)
     return mat
@@ -4,12 +4,13 @@ User Authentication API
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr, validator
 from nanoid import generate
 from datetime import datetime
 
-from ..db import get_db
+from ..db import get_async_db
 from ..models import User
 from ..auth import (
     hash_password,
@@ -78,7 +79,9 @@ class AuthResponse(BaseModel):
 @router.post(
     "/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED
 )
-def register_user(request: UserRegisterRequest, db: Session = Depends(get_db)):
+async def register_user(
+    request: UserRegisterRequest, db: AsyncSession = Depends(get_async_db)
+):
     """
     用户注册
 
@@ -95,15 +98,17 @@ def register_user(request: UserRegisterRequest, db: Session = Depends(get_db)):
     """
 
     # 检查邮箱是否已存在
-    existing_user_by_email = db.query(User).filter(User.email == request.email).first()
+    existing_user_by_email = await db.scalar(
+        select(User).where(User.email == request.email)
+    )
     if existing_user_by_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
     # 检查用户名是否已存在
-    existing_user_by_username = (
-        db.query(User).filter(User.username == request.username).first()
+    existing_user_by_username = await db.scalar(
+        select(User).where(User.username == request.username)
     )
     if existing_user_by_username:
         raise HTTPException(
@@ -123,8 +128,8 @@ def register_user(request: UserRegisterRequest, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # 生成 JWT token
     access_token = create_access_token(
@@ -144,7 +149,9 @@ def register_user(request: UserRegisterRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=AuthResponse)
-def login_user(request: UserLoginRequest, db: Session = Depends(get_db)):
+async def login_user(
+    request: UserLoginRequest, db: AsyncSession = Depends(get_async_db)
+):
     """
     用户登录
 
@@ -160,7 +167,7 @@ def login_user(request: UserLoginRequest, db: Session = Depends(get_db)):
     """
 
     # 查找用户
-    user = db.query(User).filter(User.email == request.email).first()
+    user = await db.scalar(select(User).where(User.email == request.email))
 
     if not user:
         raise HTTPException(
@@ -175,7 +182,7 @@ def login_user(request: UserLoginRequest, db: Session = Depends(get_db)):
 
     # 更新最后登录时间
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
 
     # 生成 JWT token
     access_token = create_access_token(
@@ -191,8 +198,9 @@ def login_user(request: UserLoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(
-    user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)
+async def get_current_user_info(
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     获取当前登录用户的信息
@@ -202,7 +210,7 @@ def get_current_user_info(
     **返回:** 当前用户的基本信息
     """
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -213,7 +221,9 @@ def get_current_user_info(
 
 
 @router.get("/check-email/{email}")
-def check_email_availability(email: str, db: Session = Depends(get_db)):
+async def check_email_availability(
+    email: str, db: AsyncSession = Depends(get_async_db)
+):
     """
     检查邮箱是否可用（用于前端实时验证）
 
@@ -221,13 +231,15 @@ def check_email_availability(email: str, db: Session = Depends(get_db)):
     - available: true/false
     """
 
-    existing = db.query(User).filter(User.email == email).first()
+    existing = await db.scalar(select(User.id).where(User.email == email))
 
     return {"email": email, "available": existing is None}
 
 
 @router.get("/check-username/{username}")
-def check_username_availability(username: str, db: Session = Depends(get_db)):
+async def check_username_availability(
+    username: str, db: AsyncSession = Depends(get_async_db)
+):
     """
     检查用户名是否可用（用于前端实时验证）
 
@@ -235,7 +247,7 @@ def check_username_availability(username: str, db: Session = Depends(get_db)):
     - available: true/false
     """
 
-    existing = db.query(User).filter(User.username == username).first()
+    existing = await db.scalar(select(User.id).where(User.username == username))
 
     return {"username": username, "available": existing is None}
 
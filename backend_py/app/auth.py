@@ -10,9 +10,10 @@ import secrets
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .db import get_db
+from .db import get_async_db
 from .models import User
 
 
@@ -166,8 +167,9 @@ def get_current_user_id(
         )
 
 
-def get_current_user(
-    user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)
+async def get_current_user(
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
 ) -> User:
     """
     获取当前登录用户的完整信息
@@ -184,7 +186,7 @@ def get_current_user(
     Raises:
         HTTPException: 用户不存在
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
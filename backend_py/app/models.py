@@ -86,6 +86,50 @@ class Framework(Base):
         sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    __table_args__ = (
+        # "Your Frameworks" 列表的 keyset 分页（app/services/pagination.py）
+        sa.Index("ix_frameworks_creator_created_id", "creator_id", "created_at", "id"),
+    )
+
+
+# 新增：后台生成任务（job queue，见 app/services/jobs.py）
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = sa.Column(sa.String, primary_key=True, index=True)  # e.g. "job_xxx"
+    kind = sa.Column(sa.String, nullable=False)  # text / files
+    # queued → running → succeeded / failed
+    status = sa.Column(sa.String, nullable=False, default="queued", index=True)
+    user_id = sa.Column(sa.String, nullable=True, index=True)
+
+    # Job input (request options, spooled file paths) and output, as JSON
+    params_json = sa.Column(sa.Text, nullable=False)
+    result_json = sa.Column(sa.Text, nullable=True)
+    error = sa.Column(sa.Text, nullable=True)
+
+    # Latest progress snapshot (full history in generation_job_events)
+    stage = sa.Column(sa.String, nullable=True)
+    progress = sa.Column(sa.Float, default=0.0)  # 0.0 - 1.0
+    attempts = sa.Column(sa.Integer, default=0)
+
+    # Timestamps
+    created_at = sa.Column(sa.DateTime, default=datetime.utcnow, index=True)
+    started_at = sa.Column(sa.DateTime, nullable=True)
+    finished_at = sa.Column(sa.DateTime, nullable=True)
+    heartbeat_at = sa.Column(sa.DateTime, nullable=True)  # stale → requeued
+
+
+class GenerationJobEvent(Base):
+    __tablename__ = "generation_job_events"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)  # SSE event id
+    job_id = sa.Column(
+        sa.String, sa.ForeignKey("generation_jobs.id"), nullable=False, index=True
+    )
+    stage = sa.Column(sa.String, nullable=False)
+    data_json = sa.Column(sa.Text, nullable=True)
+    created_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+
 
 # 预设的 Framework Groups（AI 从中选择）
 FRAMEWORK_GROUPS = [
@@ -0,0 +1,514 @@
+"""
+Background job queue for framework generation
+
+Generation used to run inside the HTTP request, so proxy / browser timeouts
+capped what we could process and a dropped connection threw the work away.
+Jobs are now persisted in the app database (generation_jobs), claimed by
+asyncio workers running inside the API process, and report per-stage
+progress to generation_job_events, which clients poll or stream over SSE.
+
+Handlers are registered per job kind (see app/api/frameworks.py):
+
+    async def run_text_job(params: dict, progress: JobProgress) -> dict: ...
+    job_queue.register("text", run_text_job)
+
+Environment variables:
+- JOB_WORKERS: jobs run concurrently per API process (default 2)
+- JOB_POLL_INTERVAL: seconds between queue polls when idle (default 2)
+- JOB_STALE_SECONDS: a running job without heartbeat for this long is
+  considered lost (worker crashed / restarted) and requeued (default 120)
+- JOB_MAX_ATTEMPTS: a lost job is requeued at most this many times (default 3)
+- JOB_SPOOL_DIR: where uploaded files wait for their job (default ./job_spool)
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import shutil
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from nanoid import generate
+from llm_limits import tenant_scope
+
+from ..db import SessionLocal
+from ..models import GenerationJob, GenerationJobEvent
+
+TERMINAL_STATUSES = {"succeeded", "failed"}
+
+# Coarse overall progress per stage; "llm_chunk" is interpolated by done/total
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "extract_text": 0.05,
+    "preprocess": 0.15,
+    "llm_chunk": 0.2,
+    "global_llm": 0.75,
+    "save": 0.95,
+    "succeeded": 1.0,
+}
+LLM_CHUNK_SPAN = 0.5  # llm_chunk covers 0.2 → 0.7
+
+JobHandler = Callable[[Dict[str, Any], "JobProgress"], Awaitable[Dict[str, Any]]]
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def spool_dir(job_id: str) -> Path:
+    """Per-job directory for uploaded inputs (survives restarts)"""
+    root = Path(os.getenv("JOB_SPOOL_DIR", "./job_spool"))
+    return root / job_id
+
+
+def new_job_id() -> str:
+    return f"job_{generate(size=12)}"
+
+
+def job_to_dict(job: GenerationJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": round(job.progress or 0.0, 3),
+        "attempts": job.attempts or 0,
+        "error": job.error,
+        "result": json.loads(job.result_json) if job.result_json else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobProgress:
+    """
+    progress(stage, info) callback handed to job handlers
+
+    Safe to call from the event loop or from worker threads (the sync LLM
+    path); events are forwarded to the job's writer task in order.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sink: asyncio.Queue):
+        self._loop = loop
+        self._sink = sink
+        self.value = 0.0
+
+    def _estimate(self, stage: str, info: Dict[str, Any]) -> float:
+        base = STAGE_PROGRESS.get(stage)
+        if base is None:
+            return self.value
+        if stage == "llm_chunk" and info.get("total"):
+            base += LLM_CHUNK_SPAN * info.get("done", 0) / info["total"]
+        return base
+
+    def __call__(self, stage: str, info: Optional[Dict[str, Any]] = None):
+        info = dict(info or {})
+        # never move backwards (multi-file jobs repeat the per-file stages)
+        self.value = max(self.value, self._estimate(stage, info))
+        self._loop.call_soon_threadsafe(
+            self._sink.put_nowait, (stage, info, self.value)
+        )
+
+    def bind(self, **extra) -> Callable[[str, Optional[Dict[str, Any]]], None]:
+        """Same callback with extra fields (e.g. file name) on every event"""
+
+        def report(stage: str, info: Optional[Dict[str, Any]] = None):
+            self(stage, {**extra, **(info or {})})
+
+        return report
+
+
+class JobQueue:
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+    # ---------- registration / lifecycle ----------
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    async def start(self, workers: Optional[int] = None):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._recover_stale, True)
+        count = workers or _env_int("JOB_WORKERS", 2)
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(count)
+        ]
+        print(f" Job queue started ({count} workers)")
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    # ---------- public API ----------
+
+    async def submit(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        user_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = job_id or new_job_id()
+        await asyncio.to_thread(self._insert, job_id, kind, params, user_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def get(
+        self, job_id: str, user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """The job as a dict; None if missing or (with user_id) owned by someone else"""
+        with SessionLocal() as db:
+            job = db.get(GenerationJob, job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            return job_to_dict(job)
+
+    def events_since(self, job_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+        with SessionLocal() as db:
+            rows = (
+                db.query(GenerationJobEvent)
+                .filter(
+                    GenerationJobEvent.job_id == job_id,
+                    GenerationJobEvent.id > after_id,
+                )
+                .order_by(GenerationJobEvent.id)
+                .all()
+            )
+            return [
+                {
+                    "id": row.id,
+                    "stage": row.stage,
+                    "data": json.loads(row.data_json) if row.data_json else {},
+                    "created_at": row.created_at.isoformat(),
+                }
+                for row in rows
+            ]
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """
+        Sleep until this process records an event for job_id, or timeout
+        (the timeout covers jobs run by another process)
+        """
+        event = asyncio.Event()
+        self._listeners.setdefault(job_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            listeners = self._listeners.get(job_id)
+            if listeners is not None:
+                listeners.discard(event)
+                if not listeners:
+                    del self._listeners[job_id]
+
+    async def stream(
+        self, job_id: str, after_id: int = 0, keepalive: float = 15.0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield events after after_id until the job finishes; an empty dict is
+        yielded after `keepalive` idle seconds so the caller can ping
+        """
+        poll = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+        loop = asyncio.get_running_loop()
+        last_yield = loop.time()
+        while True:
+            events = await asyncio.to_thread(self.events_since, job_id, after_id)
+            for ev in events:
+                after_id = ev["id"]
+                yield ev
+            if any(ev["stage"] in TERMINAL_STATUSES for ev in events):
+                return
+            if events:
+                last_yield = loop.time()
+            else:
+                job = await asyncio.to_thread(self.get, job_id)
+                # gone, or its terminal event was delivered before after_id
+                if job is None or job["status"] in TERMINAL_STATUSES:
+                    return
+                if loop.time() - last_yield >= keepalive:
+                    last_yield = loop.time()
+                    yield {}
+            await self.wait_for_update(job_id, timeout=poll)
+
+    # ---------- workers ----------
+
+    async def _worker_loop(self, index: int):
+        poll = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim_next)
+            except Exception as e:
+                print(f"⚠️  Job worker {index}: claim failed: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), poll)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._recover_stale, False)
+                self._wakeup.clear()
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        print(f" Job {job_id} ({job['kind']}) started, attempt {job['attempts']}")
+        sink: asyncio.Queue = asyncio.Queue()
+        progress = JobProgress(asyncio.get_running_loop(), sink)
+        writer = asyncio.create_task(self._write_events(job_id, sink))
+
+        status, result, error = "failed", None, None
+        try:
+            handler = self._handlers.get(job["kind"])
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job['kind']!r}")
+            # LLM calls of the job queue under its owner (fair queue)
+            with tenant_scope(f"user:{job['user_id']}" if job["user_id"] else None):
+                result = await handler(job["params"], progress)
+            status = "succeeded"
+        except asyncio.CancelledError:
+            # shutdown: hand the job back to the queue for the next start
+            writer.cancel()
+            try:
+                await asyncio.to_thread(self._requeue, job_id)
+            except Exception as e:  # stale recovery requeues it later
+                print(f"⚠️  Job {job_id}: requeue on shutdown failed: {e}")
+            raise
+        except Exception as e:
+            error = str(getattr(e, "detail", None) or e)
+            print(f" Job {job_id} failed: {error}")
+            traceback.print_exc()
+
+        sink.put_nowait(None)
+        await writer
+        await asyncio.to_thread(self._finish, job_id, status, result, error)
+        self._notify(job_id)
+        shutil.rmtree(spool_dir(job_id), ignore_errors=True)
+        print(f" Job {job_id} {status}")
+
+    async def _write_events(self, job_id: str, sink: asyncio.Queue):
+        """Persist progress events in order; heartbeat while idle"""
+        heartbeat = max(1.0, _env_int("JOB_STALE_SECONDS", 120) / 4)
+        while True:
+            try:
+                item = await asyncio.wait_for(sink.get(), heartbeat)
+            except asyncio.TimeoutError:
+                try:
+                    await asyncio.to_thread(self._record_events, job_id, [])
+                except Exception as e:
+                    print(f"⚠️  Job {job_id}: heartbeat failed: {e}")
+                continue
+
+            batch = [item]
+            while not sink.empty():
+                batch.append(sink.get_nowait())
+            done = None in batch
+            batch = [b for b in batch if b is not None]
+            if batch:
+                try:
+                    await asyncio.to_thread(self._record_events, job_id, batch)
+                except Exception as e:
+                    print(f"⚠️  Job {job_id}: failed to record progress: {e}")
+                self._notify(job_id)
+            if done:
+                return
+
+    def _notify(self, job_id: str):
+        for event in self._listeners.get(job_id, ()):
+            event.set()
+
+    # ---------- database (run in worker threads) ----------
+
+    def _insert(self, job_id, kind, params, user_id):
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            db.add(
+                GenerationJob(
+                    id=job_id,
+                    kind=kind,
+                    status="queued",
+                    user_id=user_id,
+                    params_json=json.dumps(params, ensure_ascii=False),
+                    stage="queued",
+                    progress=0.0,
+                    attempts=0,
+                    created_at=now,
+                )
+            )
+            db.add(GenerationJobEvent(job_id=job_id, stage="queued", created_at=now))
+            db.commit()
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running (queued → running)"""
+        with SessionLocal() as db:
+            candidates = (
+                db.query(GenerationJob.id)
+                .filter(GenerationJob.status == "queued")
+                .order_by(GenerationJob.created_at)
+                .limit(5)
+                .all()
+            )
+            for (job_id,) in candidates:
+                now = datetime.utcnow()
+                # conditional UPDATE: only one worker / process wins the row
+                claimed = (
+                    db.query(GenerationJob)
+                    .filter(
+                        GenerationJob.id == job_id, GenerationJob.status == "queued"
+                    )
+                    .update(
+                        {
+                            GenerationJob.status: "running",
+                            GenerationJob.started_at: now,
+                            GenerationJob.heartbeat_at: now,
+                            GenerationJob.attempts: GenerationJob.attempts + 1,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+                if claimed:
+                    job = db.get(GenerationJob, job_id)
+                    return {
+                        "id": job.id,
+                        "kind": job.kind,
+                        "params": json.loads(job.params_json),
+                        "attempts": job.attempts,
+                        "user_id": job.user_id,
+                    }
+        return None
+
+    def _record_events(self, job_id: str, batch: List[tuple]):
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            values: Dict[Any, Any] = {GenerationJob.heartbeat_at: now}
+            for stage, info, value in batch:
+                db.add(
+                    GenerationJobEvent(
+                        job_id=job_id,
+                        stage=stage,
+                        data_json=json.dumps(
+                            {**info, "progress": round(value, 3)},
+                            ensure_ascii=False,
+                            default=str,
+                        ),
+                        created_at=now,
+                    )
+                )
+                values[GenerationJob.stage] = stage
+                values[GenerationJob.progress] = value
+            db.query(GenerationJob).filter(
+                GenerationJob.id == job_id, GenerationJob.status == "running"
+            ).update(values, synchronize_session=False)
+            db.commit()
+
+    def _finish(self, job_id, status, result, error):
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            values = {
+                GenerationJob.status: status,
+                GenerationJob.stage: status,
+                GenerationJob.finished_at: now,
+                GenerationJob.error: error,
+            }
+            if status == "succeeded":
+                values[GenerationJob.progress] = 1.0
+                values[GenerationJob.result_json] = json.dumps(
+                    result, ensure_ascii=False, default=str
+                )
+            db.query(GenerationJob).filter(GenerationJob.id == job_id).update(
+                values, synchronize_session=False
+            )
+            db.add(
+                GenerationJobEvent(
+                    job_id=job_id,
+                    stage=status,
+                    data_json=json.dumps({"error": error} if error else {}),
+                    created_at=now,
+                )
+            )
+            db.commit()
+
+    def _requeue(self, job_id: str):
+        with SessionLocal() as db:
+            db.query(GenerationJob).filter(
+                GenerationJob.id == job_id, GenerationJob.status == "running"
+            ).update(
+                {GenerationJob.status: "queued", GenerationJob.heartbeat_at: None},
+                synchronize_session=False,
+            )
+            db.commit()
+
+    def _recover_stale(self, startup: bool):
+        """
+        Requeue running jobs whose worker stopped heartbeating (crash or
+        restart); after JOB_MAX_ATTEMPTS claims they are failed instead.
+        """
+        stale = timedelta(seconds=_env_int("JOB_STALE_SECONDS", 120))
+        max_attempts = _env_int("JOB_MAX_ATTEMPTS", 3)
+        cutoff = datetime.utcnow() - stale
+        with SessionLocal() as db:
+            lost = (
+                db.query(GenerationJob)
+                .filter(
+                    GenerationJob.status == "running",
+                    (GenerationJob.heartbeat_at == None)  # noqa: E711
+                    | (GenerationJob.heartbeat_at < cutoff),
+                )
+                .all()
+            )
+            for job in lost:
+                if (job.attempts or 0) >= max_attempts:
+                    job.status = "failed"
+                    job.stage = "failed"
+                    job.error = f"Worker lost after {job.attempts} attempts"
+                    job.finished_at = datetime.utcnow()
+                    db.add(
+                        GenerationJobEvent(
+                            job_id=job.id,
+                            stage="failed",
+                            data_json=json.dumps({"error": job.error}),
+                        )
+                    )
+                else:
+                    job.status = "queued"
+                    job.heartbeat_at = None
+            db.commit()
+        if lost:
+            print(
+                f" Job queue: recovered {len(lost)} stale job(s)"
+                + (" at startup" if startup else "")
+            )
+
+
+# process-wide queue used by the API and main.py startup/shutdown hooks
+job_queue = JobQueue()
+
+
+__all__ = [
+    "JobProgress",
+    "JobQueue",
+    "STAGE_PROGRESS",
+    "TERMINAL_STATUSES",
+    "job_queue",
+    "job_to_dict",
+    "new_job_id",
+    "spool_dir",
+]
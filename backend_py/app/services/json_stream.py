@@ -0,0 +1,144 @@
+"""
+Incremental JSON parser for streamed LLM output
+
+Feed model deltas as they arrive; every value whose path matches one of the
+watched patterns is returned as soon as it closes, e.g. with
+patterns=["steps.*", "steps.*.subSteps.*"] each sub-step string and then
+the whole step object are emitted while the rest of the document is still
+being generated.
+
+Pattern syntax: dot-separated keys, "*" matches any key or array index,
+"" matches the root value. Text before the first "{" / "[" (```json fences,
+chatter) and after the root value closes is ignored.
+"""
+
+from __future__ import annotations
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, path: Path, start: int):
+        self.kind = kind  # "obj" or "arr"
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = kind == "obj"
+
+    def child_path(self) -> Path:
+        if self.kind == "obj":
+            return self.path + (self.key,)
+        return self.path + (self.index,)
+
+
+class IncrementalJSONParser:
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = [tuple(p.split(".")) if p else () for p in patterns]
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        # open string: (start offset, path or None when it is an object key)
+        self._string: Optional[Tuple[int, Optional[Path]]] = None
+        self._escape = False
+        # open number / true / false / null: (start offset, path)
+        self._scalar: Optional[Tuple[int, Path]] = None
+
+    def matches(self, path: Path) -> bool:
+        for pattern in self.patterns:
+            if len(pattern) == len(path) and all(
+                p == "*" or p == str(k) for p, k in zip(pattern, path)
+            ):
+                return True
+        return False
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Consume a delta, return [(path, value)] for values completed by it"""
+        self.text += chunk
+        out: List[Tuple[Path, Any]] = []
+        text, i, n = self.text, self._pos, len(self.text)
+
+        while i < n and not self.done:
+            c = text[i]
+
+            if self._string is not None:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    start, path = self._string
+                    self._string = None
+                    if path is None:
+                        self._set_key(text[start : i + 1])
+                    else:
+                        self._emit(path, start, i + 1, out)
+                i += 1
+                continue
+
+            if self._scalar is not None:
+                if not (c in ",]}" or c.isspace()):
+                    i += 1
+                    continue
+                start, path = self._scalar
+                self._scalar = None
+                self._emit(path, start, i, out)
+                # fall through: c still closes / separates
+
+            if not self._stack:
+                if c in "{[":
+                    self._stack.append(_Frame("obj" if c == "{" else "arr", (), i))
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if c.isspace() or c == ":":
+                pass
+            elif c == ",":
+                if frame.kind == "arr":
+                    frame.index += 1
+                else:
+                    frame.expect_key = True
+            elif c == '"':
+                if frame.kind == "obj" and frame.expect_key:
+                    self._string = (i, None)
+                else:
+                    self._string = (i, frame.child_path())
+            elif c in "{[":
+                kind = "obj" if c == "{" else "arr"
+                self._stack.append(_Frame(kind, frame.child_path(), i))
+            elif c in "}]":
+                self._stack.pop()
+                self._emit(frame.path, frame.start, i + 1, out)
+                if not self._stack:
+                    self.done = True
+            else:
+                self._scalar = (i, frame.child_path())
+            i += 1
+
+        self._pos = i
+        return out
+
+    def _set_key(self, raw: str):
+        frame = self._stack[-1]
+        try:
+            frame.key = json.loads(raw)
+        except ValueError:
+            frame.key = raw[1:-1]
+        frame.expect_key = False
+
+    def _emit(self, path: Path, start: int, end: int, out: list):
+        if not self.matches(path):
+            return
+        try:
+            out.append((path, json.loads(self.text[start:end])))
+        except ValueError:
+            pass  # malformed fragment (e.g. trailing comma); final parse decides
+
+
+__all__ = ["IncrementalJSONParser"]
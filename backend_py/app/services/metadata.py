@@ -1,5 +1,4 @@
 from __future__ import annotations
-from io import BytesIO
 from typing import Dict, Any
 
 
@@ -16,36 +15,27 @@ def textstats(text: str) -> Dict[str, Any]:
 
 
 def pdfmeta(b: bytes) -> Dict[str, Any]:
-    meta: Dict[str, Any] = {}
-    try:
-        from PyPDF2 import PdfReader
-
-        reader = PdfReader(BytesIO(b))
-        pages = len(reader.pages)
-        text = ""
-        for p in reader.pages[:5]:
-            try:
-                text += p.extract_text() or ""
-            except Exception:
-                pass
-        meta.update({"pages": pages})
-        meta.update(textstats(text))
-    except Exception:
-        meta.update({"pages": None})
+    from text_extraction import extract_document
+
+    # only the first 5 pages are parsed; the page count covers the whole file
+    result = extract_document(b, mime="application/pdf", max_pages=5)
+    if result["error"]:
+        return {"pages": None}
+    meta: Dict[str, Any] = {"pages": result["pages"]}
+    meta.update(textstats(result["text"]))
     return meta
 
 
 def docxmeta(b: bytes) -> Dict[str, Any]:
-    meta: Dict[str, Any] = {}
-    try:
-        import docx
-
-        doc = docx.Document(BytesIO(b))
-        text = "\n".join([p.text for p in doc.paragraphs])[:5000]
-        meta.update(textstats(text))
-    except Exception:
-        pass
-    return meta
+    from text_extraction import extract_document
+
+    result = extract_document(
+        b,
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    )
+    if result["error"]:
+        return {}
+    return textstats(result["text"][:5000])
 
 
 def extract_metadata(
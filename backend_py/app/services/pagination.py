@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination for newest-first listings
+
+OFFSET pagination makes the database read and discard every row before the
+page; a keyset cursor remembers the (created_at, id) of the last row sent and
+the next page starts right after it, so every page is an index range scan on
+(creator_id, created_at, id) no matter how deep the user scrolls.
+
+The cursor is opaque to clients: urlsafe base64 of the JSON
+[created_at isoformat, id].
+"""
+
+from __future__ import annotations
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (TypeError, ValueError) as e:  # binascii.Error is a ValueError
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def after_cursor(created_col: Any, id_col: Any, cursor: Optional[str]):
+    """
+    WHERE clause for the rows after cursor in (created_at DESC, id DESC)
+    order, None for the first page
+    """
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        created_col < created_at,
+        and_(created_col == created_at, id_col < row_id),
+    )
+
+
+__all__ = ["after_cursor", "decode_cursor", "encode_cursor"]
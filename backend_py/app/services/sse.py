@@ -0,0 +1,37 @@
+from __future__ import annotations
+import json
+from typing import Any, Optional
+
+# Disable proxy buffering (nginx) and caching so events reach the browser live
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(
+    data: Any, event: Optional[str] = None, event_id: Optional[Any] = None
+) -> str:
+    """One Server-Sent Events frame; non-string data is sent as JSON"""
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def format_ndjson(data: Any) -> str:
+    """One newline-delimited JSON record"""
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+# comment frame, keeps idle connections from being closed by proxies
+SSE_KEEPALIVE = ": keepalive\n\n"
+
+
+__all__ = ["SSE_HEADERS", "SSE_KEEPALIVE", "format_ndjson", "format_sse"]
@@ -0,0 +1,198 @@
+"""
+Server-side document structure extraction (Lock OFF / fast mode)
+
+generate_from_text and generate_from_files used to carry their own copy of
+a line-by-line section detector (`any(marker in line.lower() ...)` per
+line) that only looked at the first 50-100 lines. Both now use
+StructureExtractor:
+
+- heading detection is a list of pluggable rules, line -> level or None.
+  The base rule is doc_analyzer.classify_heading, with the same level <= 2
+  boundary as split_sections, so fast mode and the local LLM section
+  chunking agree on where sections start; fast mode only adds
+  the step / phase / stage / chapter keyword rule on top (one compiled
+  regex instead of a lower() copy and a substring test per marker)
+- the whole document is scanned once, linear in its length, keeping only
+  a short preview per section
+- select_sections() picks the sections sent to the LLM from across the
+  whole outline (top-level headings first, evenly spread), so long inputs
+  get a representative outline for the same prompt size
+"""
+
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from doc_analyzer import MARKDOWN_HEADING_RE, classify_heading
+
+# stripped, non-empty line → heading level, or None if the rule does not apply
+HeadingRule = Callable[[str], Optional[int]]
+
+_WORD_RE = re.compile(r"[A-Za-z]{4,}")
+_COMMON_WORDS = frozenset(
+    {"this", "that", "with", "from", "have", "will", "your", "their", "about", "into"}
+)
+
+
+def analyzer_heading(line: str, max_level: int = 2) -> Optional[int]:
+    """
+    Markdown, numbered and UPPER CASE headings (doc_analyzer.classify_heading)
+
+    Like doc_analyzer.split_sections, only levels <= max_level count: the
+    level-3 "short capitalized line" rule fires on too many body lines to
+    be a section boundary.
+    """
+    heading = classify_heading(line)
+    return heading[0] if heading and heading[0] <= max_level else None
+
+
+def keyword_heading(
+    markers: Iterable[str], level: int = 1, max_chars: int = 100
+) -> HeadingRule:
+    """Short lines mentioning one of the markers (case-insensitive substring)"""
+    pattern = re.compile("|".join(re.escape(m) for m in markers), re.IGNORECASE)
+
+    def rule(line: str) -> Optional[int]:
+        return level if len(line) < max_chars and pattern.search(line) else None
+
+    return rule
+
+
+DEFAULT_HEADING_MARKERS = ("step", "phase", "stage", "chapter")
+
+DEFAULT_HEADING_RULES: List[HeadingRule] = [
+    analyzer_heading,
+    keyword_heading(DEFAULT_HEADING_MARKERS),
+]
+
+
+class StructureExtractor:
+    """
+    Linear-time section outline of a plain-text document
+
+        extractor = StructureExtractor()                      # default rules
+        extractor = StructureExtractor(rules=[analyzer_heading])
+        sections = extractor.sections(text)
+
+    A line is a heading if one of the rules returns a level (first match
+    wins). Text before the first
+    heading becomes a section titled by its first line. Each section keeps
+    at most preview_lines lines / preview_chars characters of content.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Sequence[HeadingRule]] = None,
+        preview_lines: int = 3,
+        preview_chars: int = 200,
+        title_chars: int = 150,
+    ):
+        self.rules = list(DEFAULT_HEADING_RULES if rules is None else rules)
+        self.preview_lines = preview_lines
+        self.preview_chars = preview_chars
+        self.title_chars = title_chars
+
+    def heading_level(self, line: str) -> Optional[int]:
+        for rule in self.rules:
+            level = rule(line)
+            if level:
+                return level
+        return None
+
+    def _section(self, lines: List[str], level: int) -> Dict[str, Any]:
+        title = lines[0]
+        m = MARKDOWN_HEADING_RE.match(title)
+        if m:
+            title = title[m.end() :]
+        return {
+            "title": title[: self.title_chars],
+            "content": " ".join(lines)[: self.preview_chars],
+            "level": level,
+        }
+
+    def sections(self, text: str) -> List[Dict[str, Any]]:
+        """All sections of the document, in order"""
+        sections: List[Dict[str, Any]] = []
+        current: List[str] = []
+        level = 1
+        preview_lines = self.preview_lines
+        for raw in text.split("\n"):
+            line = raw.strip()
+            if not line:
+                continue
+            heading = self.heading_level(line)
+            if heading:
+                if current:
+                    sections.append(self._section(current, level))
+                current, level = [line], heading
+            elif len(current) < preview_lines:
+                current.append(line)
+        if current:
+            sections.append(self._section(current, level))
+        return sections
+
+
+default_extractor = StructureExtractor()
+
+
+def _spread(items: List[Any], limit: int) -> List[Any]:
+    """limit items evenly spaced over the list (first and last included)"""
+    if len(items) <= limit:
+        return list(items)
+    if limit <= 1:
+        return items[:limit]
+    step = (len(items) - 1) / (limit - 1)
+    return [items[round(i * step)] for i in range(limit)]
+
+
+def select_sections(sections: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Pick at most `limit` sections covering the whole document: the deepest
+    heading level that still fits is kept in full, otherwise the top level
+    is sampled evenly. Document order is preserved.
+    """
+    if len(sections) <= limit:
+        return list(sections)
+    levels = sorted({s["level"] for s in sections})
+    keep: List[Dict[str, Any]] = []
+    for level in levels:
+        candidate = [s for s in sections if s["level"] <= level]
+        if len(candidate) > limit:
+            break
+        keep = candidate
+    if not keep:
+        keep = _spread([s for s in sections if s["level"] == levels[0]], limit)
+    return keep
+
+
+def pick_keywords(
+    title: str, sections: List[Dict[str, Any]], limit: int = 5
+) -> List[str]:
+    """Title words (> 3 chars) first, then the most frequent heading words"""
+    keywords = [w.strip() for w in title.lower().split() if len(w.strip()) > 3]
+    keywords = list(dict.fromkeys(keywords))[:limit]
+    if len(keywords) >= limit:
+        return keywords
+
+    ignore = set(keywords) | set(DEFAULT_HEADING_MARKERS)
+    counts = Counter(w.lower() for s in sections for w in _WORD_RE.findall(s["title"]))
+    for word, _ in counts.most_common():
+        if len(keywords) >= limit:
+            break
+        if word not in ignore and word not in _COMMON_WORDS:
+            keywords.append(word)
+    return keywords
+
+
+__all__ = [
+    "DEFAULT_HEADING_MARKERS",
+    "DEFAULT_HEADING_RULES",
+    "HeadingRule",
+    "StructureExtractor",
+    "analyzer_heading",
+    "default_extractor",
+    "keyword_heading",
+    "pick_keywords",
+    "select_sections",
+]
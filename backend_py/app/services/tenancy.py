@@ -0,0 +1,68 @@
+"""
+Per-request tenant for the outbound LLM fair queue (see llm_limits.py)
+
+The tenant is, in order: the user id (JWT "sub") of a valid Bearer token,
+the X-Tenant-ID header, or the client address. Invalid tokens are not rejected
+here; authentication stays with the route dependencies.
+
+X-Tenant-ID is only honoured from TENANT_HEADER_TRUSTED_IPS (comma separated
+client addresses, e.g. an internal gateway); anyone else could rotate the
+header to get a fresh fair-queue share per request.
+"""
+
+import os
+from typing import FrozenSet, Optional
+
+from llm_limits import tenant_scope
+
+
+def _trusted_ips() -> FrozenSet[str]:
+    raw = os.getenv("TENANT_HEADER_TRUSTED_IPS", "")
+    return frozenset(ip.strip() for ip in raw.split(",") if ip.strip())
+
+
+TRUSTED_IPS = _trusted_ips()
+
+
+def _bearer_subject(authorization: str) -> Optional[str]:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        from jose import jwt
+        from ..auth import ALGORITHM, SECRET_KEY
+
+        return jwt.decode(token.strip(), SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except Exception:
+        return None
+
+
+def tenant_from_scope(scope) -> str:
+    headers = {
+        k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])
+    }
+    user_id = _bearer_subject(headers.get("authorization", ""))
+    if user_id:
+        return f"user:{user_id}"
+    client = scope.get("client")
+    tenant = headers.get("x-tenant-id", "").strip()
+    if tenant and client and client[0] in TRUSTED_IPS:
+        return f"tenant:{tenant[:64]}"
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+class TenantMiddleware:
+    """
+    Pure ASGI middleware: LLM calls made while handling a request queue
+    under its tenant (the contextvar is inherited by tasks and to_thread)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with tenant_scope(tenant_from_scope(scope)):
+            await self.app(scope, receive, send)
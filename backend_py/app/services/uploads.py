@@ -0,0 +1,193 @@
+"""
+Streaming upload ingest
+
+Endpoints used to `await file.read()` the whole upload, check the size
+afterwards and then copy it again into a NamedTemporaryFile. Uploads are now
+read in fixed-size chunks, hashed (sha256) on the fly and written straight
+to disk, aborting as soon as the limit is crossed, so memory per request
+stays constant whatever the file size.
+
+Starlette parses the multipart body before the endpoint runs, so
+RequestSizeLimitMiddleware additionally rejects oversized requests at the
+ASGI level (Content-Length, or a running byte count for chunked bodies)
+before anything is parsed or spooled.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
+
+UPLOAD_CHUNK_SIZE = 256 * 1024  # 256KB
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries / part headers / form fields
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, filename: Optional[str], limit: int):
+        self.filename = filename
+        self.limit = limit
+        super().__init__(f"{filename or 'upload'} exceeds {limit} bytes")
+
+
+class SpooledUpload:
+    """An upload written to disk: path, original filename, size, sha256"""
+
+    def __init__(self, path: str, filename: str, size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "name": self.filename,
+            "size": self.size,
+            "sha256": self.sha256,
+        }
+
+    def cleanup(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+async def read_upload(
+    file, max_bytes: int, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[bytes, str]:
+    """
+    Read a (small) upload into memory chunk by chunk, aborting as soon as
+    max_bytes is exceeded. Returns (payload, sha256 hex).
+    """
+    digest = hashlib.sha256()
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(file.filename, max_bytes)
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+async def spool_upload(
+    file,
+    max_bytes: int,
+    suffix: str = "",
+    directory: Optional[str] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> SpooledUpload:
+    """
+    Stream an UploadFile to a temp file (suffix / directory as in
+    tempfile.mkstemp), hashing as it goes. The partial file is removed if
+    the limit is exceeded or reading fails.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(file.filename, max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+    return SpooledUpload(path, file.filename, size, digest.hexdigest())
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Pure ASGI middleware: reject request bodies above a per-path limit with
+    413 before the app reads / parses them.
+
+        app.add_middleware(RequestSizeLimitMiddleware, limits={"/upload": 2_000_000})
+
+    Paths match exactly; requests to other paths are not limited.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http":
+            limit = self.limits.get(scope["path"].rstrip("/") or "/")
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await self._reject(send, limit)
+                return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if not started:
+                await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = ('{"detail": "Request body too large (max %d bytes)"}' % limit).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+__all__ = [
+    "MULTIPART_OVERHEAD",
+    "RequestSizeLimitMiddleware",
+    "SpooledUpload",
+    "UPLOAD_CHUNK_SIZE",
+    "UploadTooLarge",
+    "read_upload",
+    "spool_upload",
+]
@@ -0,0 +1,291 @@
+"""
+Benchmark: legacy four-pass preprocessing vs the single-pass DocumentAnalyzer
+
+    python bench_preprocess.py              # 1 MB, 10 MB, 50 MB
+    python bench_preprocess.py --sizes 5 20 --repeat 3
+
+The legacy_* functions below are the pre-doc_analyzer implementations of
+llm_local.extract_title_from_text / extract_simple_keywords /
+extract_sections_structure / extract_simple_entities, kept verbatim as the
+baseline. Every run also checks both produce the same results.
+"""
+
+import argparse
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List
+
+from doc_analyzer import DocumentAnalyzer, analyze_text
+
+
+# ============= Legacy implementation (baseline) =============
+
+
+def legacy_extract_title_from_text(text: str) -> str:
+    """提取文档标题（第一行或最突出的行）"""
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    if not lines:
+        return "Untitled Document"
+
+    # 尝试找到标题格式的行
+    for line in lines[:5]:  # 只看前5行
+        # 标题通常：较短、不以小写字母开头、可能有特殊格式
+        if len(line) < 200 and (line[0].isupper() or line[0] == "#"):
+            # 清理markdown标记
+            title = re.sub(r"^#+\s*", "", line)
+            return title.strip()
+
+    # 默认用第一行
+    return lines[0][:150]
+
+
+def legacy_extract_simple_keywords(text: str, top_n: int = 10) -> List[str]:
+    """简单的关键词提取（不用LLM）"""
+    # 转小写，分词
+    words = re.findall(r"\b[a-z]{4,}\b", text.lower())
+
+    # 停用词（常见无意义词）
+    stop_words = {
+        "this",
+        "that",
+        "with",
+        "from",
+        "have",
+        "been",
+        "were",
+        "will",
+        "would",
+        "could",
+        "should",
+        "about",
+        "their",
+        "there",
+        "where",
+        "which",
+        "these",
+        "those",
+        "what",
+        "when",
+        "then",
+        "them",
+        "they",
+        "than",
+        "such",
+        "into",
+        "through",
+        "during",
+        "before",
+        "after",
+        "above",
+        "below",
+    }
+
+    # 过滤停用词
+    words = [w for w in words if w not in stop_words]
+
+    # 词频统计
+    word_freq = Counter(words)
+
+    # 返回top N
+    return [word for word, count in word_freq.most_common(top_n)]
+
+
+def legacy_extract_sections_structure(text: str) -> List[Dict[str, str]]:
+    """提取文档结构（章节标题）"""
+    sections = []
+
+    lines = text.split("\n")
+    current_section = None
+
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+
+        # 识别章节标题的模式
+        is_section = False
+        level = 1
+
+        # Markdown标题格式
+        if line.startswith("#"):
+            is_section = True
+            level = len(re.match(r"^#+", line).group())
+            line = re.sub(r"^#+\s*", "", line)
+
+        # 数字编号格式 (1. 2. 3.)
+        elif re.match(r"^\d+[\.\)]\s+[A-Z]", line):
+            is_section = True
+            level = 2
+
+        # 全大写短行（可能是标题）
+        elif len(line) < 100 and line.isupper() and len(line.split()) > 1:
+            is_section = True
+            level = 2
+
+        # 短行且首字母大写（可能是标题）
+        elif (
+            len(line) < 80 and line[0].isupper() and not line.endswith((".", ",", ";"))
+        ):
+            is_section = True
+            level = 3
+
+        if is_section:
+            # 收集前一个section的内容
+            if current_section:
+                sections.append(current_section)
+
+            current_section = {
+                "title": line[:100],
+                "level": level,
+                "preview": "",  # 将在下面填充
+            }
+        elif current_section and len(current_section["preview"]) < 150:
+            # 添加内容预览
+            current_section["preview"] += " " + line
+
+    # 添加最后一个section
+    if current_section:
+        sections.append(current_section)
+
+    # 限制返回数量
+    return sections[:10]
+
+
+def legacy_extract_simple_entities(text: str) -> List[str]:
+    """简单的实体提取（不用spaCy，避免额外依赖）"""
+    entities = set()
+
+    # 大写开头的短语（可能是实体）
+    capitalized_phrases = re.findall(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b", text)
+
+    # 过滤常见词
+    common_words = {
+        "The",
+        "This",
+        "That",
+        "These",
+        "Those",
+        "There",
+        "Here",
+        "When",
+        "Where",
+        "What",
+        "Which",
+        "Who",
+        "How",
+        "Why",
+    }
+
+    for phrase in capitalized_phrases:
+        if phrase not in common_words and len(phrase) > 2:
+            entities.add(phrase)
+
+    # 限制数量
+    return list(entities)[:15]
+
+
+def legacy_preprocess(text: str) -> Dict:
+    return {
+        "title": legacy_extract_title_from_text(text),
+        "keywords": legacy_extract_simple_keywords(text, top_n=10),
+        "sections": legacy_extract_sections_structure(text),
+        "entities": legacy_extract_simple_entities(text),
+    }
+
+
+# ============= Synthetic documents =============
+
+WORDS = (
+    "framework governance policy compliance risk control audit strategy "
+    "process stakeholder assessment implementation monitoring report data "
+    "security privacy model review approval budget resource delivery quality"
+).split()
+NAMES = [
+    "Acme Corporation",
+    "Board Of Directors",
+    "Singapore",
+    "Data Office",
+    "Risk Committee",
+]
+
+
+def make_document(size_bytes: int, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    lines: List[str] = ["# Enterprise Risk Framework", ""]
+    size = 0
+    section = 0
+    while size < size_bytes:
+        if rnd.random() < 0.05:
+            section += 1
+            line = rnd.choice(
+                [
+                    f"{section}. Section {section} Overview",
+                    f"## {rnd.choice(WORDS).title()} {rnd.choice(WORDS)}",
+                    f"{rnd.choice(WORDS).upper()} {rnd.choice(WORDS).upper()}",
+                ]
+            )
+        else:
+            words = [rnd.choice(WORDS) for _ in range(rnd.randint(8, 18))]
+            if rnd.random() < 0.3:
+                words.insert(rnd.randint(0, len(words)), rnd.choice(NAMES))
+            line = "The " + " ".join(words) + "."
+            if rnd.random() < 0.1:
+                line += " " + rnd.choice(NAMES)  # phrase continued on next line
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+# ============= Runner =============
+
+
+def normalize(result: Dict) -> Dict:
+    # entity order was set-iteration order in the legacy code; compare as sets
+    return {**result, "entities": sorted(result["entities"])}
+
+
+def all_entities(text: str) -> set:
+    analyzer = DocumentAnalyzer()
+    analyzer.feed(text)
+    analyzer.result()
+    return set(analyzer._entities)
+
+
+def timed(fn, text: str, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="MB")
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    print(f"{'size':>8} {'legacy':>10} {'analyzer':>10} {'speedup':>8}")
+    for mb in args.sizes:
+        text = make_document(int(mb * 1024 * 1024))
+        t_old, old = timed(legacy_preprocess, text, args.repeat)
+        t_new, new = timed(analyze_text, text, args.repeat)
+
+        new = {k: new[k] for k in ("title", "keywords", "sections", "entities")}
+        if len(old["entities"]) < 15:
+            assert normalize(old) == normalize(new), "results differ"
+        else:
+            # more than 15 candidates: the legacy slice is arbitrary, compare
+            # everything else plus the full candidate sets
+            assert {**old, "entities": None} == {**new, "entities": None}
+            found = set(re.findall(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b", text))
+            assert found == all_entities(text), "entity candidates differ"
+        print(f"{mb:>6.0f}MB {t_old:>9.2f}s {t_new:>9.2f}s {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
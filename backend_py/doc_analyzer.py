@@ -0,0 +1,407 @@
+"""
+Single-pass document analyzer for local preprocessing
+
+preprocess_document_smart used to run four independent scans
+(extract_title_from_text / extract_simple_keywords /
+extract_sections_structure / extract_simple_entities), each re-splitting
+or re-regexing the whole text, plus a full-text lower() copy. The analyzer
+computes the same four results in one sweep:
+
+- text is consumed in blocks of complete lines (feed / feed_lines), so it
+  works on a page or line iterator without joining the document first
+- keywords and entity candidates: one pass per block (a precompiled
+  regex, or a bytes translate/split fast path for ASCII keywords)
+- title and section outline: line-by-line, but only until they are
+  complete (first 5 non-empty lines / 10 sections), not over the whole text
+
+Results are identical to the four legacy functions (see bench_preprocess.py,
+which checks this on every run).
+"""
+
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 停用词（常见无意义词）
+STOP_WORDS = frozenset(
+    {
+        "this",
+        "that",
+        "with",
+        "from",
+        "have",
+        "been",
+        "were",
+        "will",
+        "would",
+        "could",
+        "should",
+        "about",
+        "their",
+        "there",
+        "where",
+        "which",
+        "these",
+        "those",
+        "what",
+        "when",
+        "then",
+        "them",
+        "they",
+        "than",
+        "such",
+        "into",
+        "through",
+        "during",
+        "before",
+        "after",
+        "above",
+        "below",
+    }
+)
+
+# 实体过滤的常见词
+COMMON_ENTITY_WORDS = frozenset(
+    {
+        "The",
+        "This",
+        "That",
+        "These",
+        "Those",
+        "There",
+        "Here",
+        "When",
+        "Where",
+        "What",
+        "Which",
+        "Who",
+        "How",
+        "Why",
+    }
+)
+
+KEYWORD_RE = re.compile(r"\b[a-z]{4,}\b")
+# same matches as r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b", but starting with a
+# character class lets the regex engine skip ahead instead of testing \b at
+# every position (~2x faster)
+ENTITY_RE = re.compile(r"[A-Z](?<!\w[A-Z])[a-z]+(?:\s+[A-Z][a-z]+)*\b")
+MARKDOWN_HEADING_RE = re.compile(r"^(#+)\s*")
+NUMBERED_HEADING_RE = re.compile(r"^\d+[\.\)]\s+[A-Z]")
+LEADING_WS_RE = re.compile(r"\s*")
+
+# ASCII bytes that are not \w → space (keyword tokenizer fast path)
+_NON_WORD_TO_SPACE = bytes(
+    c if c < 128 and (chr(c).isalnum() or c == ord("_")) else 32 for c in range(256)
+)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def classify_heading(line: str) -> Optional[Tuple[int, str]]:
+    """(level, title) if a stripped, non-empty line looks like a heading"""
+    # 识别章节标题的模式
+    heading = MARKDOWN_HEADING_RE.match(line)
+    if heading:  # Markdown标题格式
+        return len(heading.group(1)), line[heading.end() :]
+    if NUMBERED_HEADING_RE.match(line):  # 数字编号格式 (1. 2. 3.)
+        return 2, line
+    if len(line) < 100 and line.isupper() and len(line.split()) > 1:
+        return 2, line  # 全大写短行
+    if len(line) < 80 and line[0].isupper() and not line.endswith((".", ",", ";")):
+        return 3, line  # 短行且首字母大写
+    return None
+
+
+TITLE_LINES = 5
+MAX_SECTIONS = 10
+SECTION_PREVIEW_CHARS = 150
+HEAD_CHARS = 500
+BLOCK_CHARS = 1 << 20  # lines are batched into ~1MB blocks for the regex passes
+
+
+class DocumentAnalyzer:
+    """
+    Streaming title / keyword / section / entity extraction
+
+        analyzer = DocumentAnalyzer()
+        for page in pages:
+            analyzer.feed(page)
+        result = analyzer.result()
+
+    feed() takes arbitrary chunks of the text (a chunk may end mid-line);
+    feed_lines() takes lines without their trailing newline.
+    """
+
+    def __init__(self):
+        self.chars = 0
+        self.head = ""
+        self._buffer: List[str] = []
+        self._started = False  # a line break is owed before the next line
+
+        self._word_counts: Counter = Counter()
+        self._entities: Dict[str, None] = {}  # first-seen order
+        # entity phrase at the end of the previous block; it continues into
+        # the next block if that starts with a capitalized word (\s+ spans
+        # line breaks in the legacy full-text regex)
+        self._pending_entity: Optional[str] = None
+        self._pending_ws = ""
+
+        self._title_candidates: List[str] = []
+        self._first_line: Optional[str] = None
+        self._sections: List[Dict[str, Any]] = []
+        self._current_section: Optional[Dict[str, Any]] = None
+        self._outline_done = False
+
+    # ---------- input ----------
+
+    def feed(self, chunk: str) -> "DocumentAnalyzer":
+        if not chunk:
+            return self
+        self._track(chunk)
+        cut = chunk.rfind("\n")
+        if cut < 0:
+            self._buffer.append(chunk)
+            return self
+        self._buffer.append(chunk[: cut + 1])
+        block = "".join(self._buffer)
+        self._buffer = [chunk[cut + 1 :]] if cut + 1 < len(chunk) else []
+        self._process_block(block)
+        return self
+
+    def feed_lines(self, lines: Iterable[str]) -> "DocumentAnalyzer":
+        """Lines joined with "\\n" (trailing "\\n" on each line is tolerated)"""
+        batch: List[str] = []
+        size = 0
+        for line in lines:
+            if line.endswith("\n"):
+                line = line[:-1]
+            if self._started:
+                batch.append("\n")
+                size += 1
+            self._started = True
+            batch.append(line)
+            size += len(line)
+            if size >= BLOCK_CHARS:
+                self.feed("".join(batch))
+                batch, size = [], 0
+        if batch:
+            self.feed("".join(batch))
+        return self
+
+    def _track(self, chunk: str):
+        if self.chars < HEAD_CHARS:
+            self.head += chunk[: HEAD_CHARS - self.chars]
+        self.chars += len(chunk)
+        # mixing feed() and feed_lines(): keep the separator logic consistent
+        self._started = not chunk.endswith("\n")
+
+    # ---------- analysis ----------
+
+    def _process_block(self, block: str):
+        """block: complete lines (the final one may lack its newline at EOF)"""
+        self._count_keywords(block.lower())
+        self._scan_entities(block)
+        if not self._outline_done:
+            for line in block.split("\n"):
+                self._scan_line(line.strip())
+                if self._outline_done:
+                    break
+
+    def _count_keywords(self, lowered: str):
+        counts = self._word_counts
+        if not lowered.isascii():
+            counts.update(KEYWORD_RE.findall(lowered))
+            return
+        # ASCII fast path: \b[a-z]{4,}\b matches exactly the \w runs that are
+        # all letters and 4+ long, so split on non-word bytes instead of
+        # running the regex (first-seen order is preserved)
+        tokens = Counter(lowered.encode("ascii").translate(_NON_WORD_TO_SPACE).split())
+        for token, n in tokens.items():
+            if len(token) >= 4 and token.isalpha():
+                counts[token.decode("ascii")] += n
+
+    def _scan_entities(self, block: str):
+        entities = self._entities
+        start = 0
+        if self._pending_entity is not None:
+            lead = LEADING_WS_RE.match(block).end()
+            if lead == len(block):  # whitespace only, the phrase may go on
+                self._pending_ws += block
+                return
+            m = ENTITY_RE.match(block, lead)
+            if m is None:
+                entities[self._pending_entity] = None
+            else:
+                joined = (
+                    self._pending_entity + self._pending_ws + block[:lead] + m.group(0)
+                )
+                start = m.end()
+                if not block[start:].strip():  # reaches the end of this block too
+                    self._pending_entity = joined
+                    self._pending_ws = block[start:]
+                    return
+                entities[joined] = None
+            self._pending_entity = None
+            self._pending_ws = ""
+
+        found = ENTITY_RE.findall(block, start)
+        if not found:
+            return
+        last = found[-1]
+        content = block.rstrip()
+        if content.endswith(last) and (
+            len(content) == len(last) or not _is_word_char(content[-len(last) - 1])
+        ):
+            # the last phrase ends the block: it may continue in the next one
+            found.pop()
+            self._pending_entity = last
+            self._pending_ws = block[len(content) :]
+        entities.update(dict.fromkeys(found))
+
+    def _scan_line(self, line: str):
+        if not line:
+            return
+        if self._first_line is None:
+            self._first_line = line
+        if len(self._title_candidates) < TITLE_LINES:
+            self._title_candidates.append(line)
+
+        heading = classify_heading(line)
+        current = self._current_section
+        if heading:
+            level, line = heading
+            if current:
+                self._sections.append(current)
+            if len(self._sections) >= MAX_SECTIONS:
+                self._current_section = None
+                self._done_if_titled()
+                return
+            self._current_section = {"title": line[:100], "level": level, "preview": ""}
+        elif current and len(current["preview"]) < SECTION_PREVIEW_CHARS:
+            current["preview"] += " " + line
+        elif (
+            current
+            and len(self._sections) == MAX_SECTIONS - 1
+            and len(current["preview"]) >= SECTION_PREVIEW_CHARS
+        ):
+            # the 10th section can no longer change
+            self._done_if_titled()
+
+    def _done_if_titled(self):
+        if len(self._title_candidates) >= TITLE_LINES:
+            self._outline_done = True
+
+    # ---------- results ----------
+
+    @property
+    def section_count(self) -> int:
+        """Sections found so far (capped at MAX_SECTIONS, like sections())"""
+        found = len(self._sections) + (1 if self._current_section else 0)
+        return min(found, MAX_SECTIONS)
+
+    def _flush(self):
+        if self._buffer:
+            block = "".join(self._buffer)
+            self._buffer = []
+            self._process_block(block)
+        if self._pending_entity is not None:
+            self._entities[self._pending_entity] = None
+            self._pending_entity = None
+            self._pending_ws = ""
+
+    def title(self) -> str:
+        """提取文档标题（前5个非空行中第一个像标题的行）"""
+        if self._first_line is None:
+            return "Untitled Document"
+        for line in self._title_candidates:
+            if len(line) < 200 and (line[0].isupper() or line[0] == "#"):
+                return MARKDOWN_HEADING_RE.sub("", line).strip()
+        return self._first_line[:150]
+
+    def keywords(self, top_n: int = 10) -> List[str]:
+        counts = self._word_counts
+        # counting everything and dropping stop words afterwards keeps the
+        # first-seen order (most_common tie-break) of the legacy filter-first loop
+        ranked = (w for w, _ in counts.most_common() if w not in STOP_WORDS)
+        out = []
+        for word in ranked:
+            out.append(word)
+            if len(out) >= top_n:
+                break
+        return out
+
+    def sections(self) -> List[Dict[str, Any]]:
+        sections = list(self._sections)
+        if self._current_section:
+            sections.append(self._current_section)
+        return [dict(s) for s in sections[:MAX_SECTIONS]]
+
+    def entities(self, limit: int = 15) -> List[str]:
+        found = [
+            e for e in self._entities if e not in COMMON_ENTITY_WORDS and len(e) > 2
+        ]
+        return found[:limit]
+
+    def result(self, top_n: int = 10) -> Dict[str, Any]:
+        self._flush()
+        return {
+            "title": self.title(),
+            "keywords": self.keywords(top_n),
+            "sections": self.sections(),
+            "entities": self.entities(),
+            "head": self.head,
+            "chars": self.chars,
+        }
+
+
+def analyze_text(text: str, top_n: int = 10) -> Dict[str, Any]:
+    """One-shot helper: DocumentAnalyzer().feed(text).result()"""
+    analyzer = DocumentAnalyzer()
+    for start in range(0, len(text), BLOCK_CHARS):
+        analyzer.feed(text[start : start + BLOCK_CHARS])
+    return analyzer.result(top_n)
+
+
+def split_sections(text: str, max_level: int = 2) -> List[Dict[str, Any]]:
+    """
+    Cut the whole text at its headings (same rules as the outline, but only
+    levels <= max_level start a section: the level-3 "short capitalized
+    line" rule fires on too many body lines to be a boundary)
+
+    Returns [{"id", "title", "level", "text"}] covering the text in order;
+    ids are "s1", "s2", ... and text before the first heading is "s0".
+    """
+    sections: List[Dict[str, Any]] = []
+    headings = 0
+    start = pos = 0
+    title, level = "", 0
+
+    def close(end: int):
+        body = text[start:end]
+        if level or body.strip():
+            sid = f"s{headings}" if level else "s0"
+            sections.append({"id": sid, "title": title, "level": level, "text": body})
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        heading = classify_heading(stripped) if stripped else None
+        if heading and heading[0] <= max_level:
+            close(pos)
+            headings += 1
+            start = pos
+            level, title = heading[0], heading[1][:100]
+        pos += len(line)
+    close(pos)
+    return sections
+
+
+__all__ = [
+    "DocumentAnalyzer",
+    "STOP_WORDS",
+    "analyze_text",
+    "classify_heading",
+    "split_sections",
+]
@@ -0,0 +1,191 @@
+"""
+Persistent, content-addressed result cache for LLM calls (SQLite)
+
+Entries are stored per namespace (e.g. "seed" for local metadata extraction)
+under a caller-built key, usually make_key(document hash, model, prompt
+version, ...). Each namespace is bounded by an entry count, a total size and
+a TTL; when over the caps, least-recently-used entries are evicted first.
+
+Environment variables:
+- LLM_CACHE_PATH: SQLite file (default ./llm_cache.db)
+- LLM_CACHE_MAX_ENTRIES: max entries per namespace (default 5000)
+- LLM_CACHE_MAX_MB: max stored JSON per namespace in MB (default 200)
+- LLM_CACHE_TTL_HOURS: entry lifetime (default 720 = 30 days, 0 = no expiry)
+"""
+
+from __future__ import annotations
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS ix_llm_cache_lru ON llm_cache (namespace, accessed_at);
+"""
+
+
+def make_key(*parts: Any) -> str:
+    """sha256 over the given parts (None → empty string)"""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(b"" if p is None else str(p).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        namespace: str,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.namespace = namespace
+        self.path = path or os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+        self.max_entries = max_entries or int(
+            os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")
+        )
+        self.max_bytes = max_bytes or int(
+            float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024
+        )
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("LLM_CACHE_TTL_HOURS", "720")) * 3600
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._ready = True
+        return conn
+
+    @contextlib.contextmanager
+    def _session(self):
+        """Serialized connection, committed on success and always closed"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        try:
+            with self._session() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache "
+                    "WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    )
+                    return None
+                conn.execute(
+                    "UPDATE llm_cache SET accessed_at = ? "
+                    "WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+            return json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️  Cache read failed ({self.namespace}): {e}")
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            with self._session() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(namespace, key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, payload, len(payload), now, now),
+                )
+                self._evict(conn, now)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"⚠️  Cache write failed ({self.namespace}): {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.ttl_seconds),
+            )
+
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache "
+            "WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # walk from least recently used, drop until both caps are satisfied
+        doomed = []
+        rows = conn.execute(
+            "SELECT key, size FROM llm_cache WHERE namespace = ? "
+            "ORDER BY accessed_at ASC",
+            (self.namespace,),
+        )
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((self.namespace, key))
+            count -= 1
+            total -= size
+        conn.executemany(
+            "DELETE FROM llm_cache WHERE namespace = ? AND key = ?", doomed
+        )
+
+    def clear(self):
+        with self._session() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._session() as conn:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache "
+                "WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+        return {"namespace": self.namespace, "entries": count, "bytes": total}
+
+
+_caches: Dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str) -> ResultCache:
+    """Shared ResultCache instance per namespace"""
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = ResultCache(namespace)
+            _caches[namespace] = cache
+    return cache
@@ -0,0 +1,198 @@
+"""
+Process-wide registry of pooled HTTP / OpenAI clients
+
+Every LLM call used to build a brand-new OpenAI(...) client (or a new
+requests.Session), paying a TCP+TLS handshake per request. Clients are now
+created once per (base_url, api_key, timeout) and reused, so connections are
+kept alive and bounded by a connection pool.
+
+Environment variables:
+- LLM_POOL_MAX_CONNECTIONS: max open connections per client (default 20)
+- LLM_POOL_MAX_KEEPALIVE: max idle keep-alive connections (default 10)
+- LLM_POOL_KEEPALIVE_EXPIRY: seconds an idle connection is kept (default 30)
+- LLM_HTTP2: "0" to disable HTTP/2 (only used if the h2 package is installed)
+- LLM_TRUST_ENV: "1" to let OpenAI clients honour HTTP(S)_PROXY env vars
+
+Proxy bypass is a property of each client's transport (httpx trust_env=False)
+instead of deleting HTTP_PROXY & co. from os.environ around every call, which
+raced between concurrent requests.
+"""
+
+from __future__ import annotations
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+_lock = threading.Lock()
+_sync_clients: Dict[Tuple, Any] = {}
+_async_clients: Dict[Tuple, Any] = {}
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install httpx[http2])"""
+    if os.getenv("LLM_HTTP2", "1") == "0":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _resolve_trust_env(trust_env: Optional[bool]) -> bool:
+    if trust_env is not None:
+        return trust_env
+    return os.getenv("LLM_TRUST_ENV", "0") == "1"
+
+
+def _get_or_create(cache: Dict[Tuple, Any], key: Tuple, factory):
+    client = cache.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = cache.get(key)
+        if client is None:
+            client = factory()
+            cache[key] = client
+    return client
+
+
+# ---------- raw httpx clients (Ollama etc.) ----------
+
+
+def get_http_client(
+    base_url: str, timeout: float, trust_env: bool = True
+) -> httpx.Client:
+    key = ("http", base_url, None, float(timeout), trust_env)
+    return _get_or_create(
+        _sync_clients,
+        key,
+        lambda: httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=_pool_limits(),
+            http2=http2_enabled(),
+            trust_env=trust_env,
+        ),
+    )
+
+
+def get_async_http_client(
+    base_url: str, timeout: float, trust_env: bool = True
+) -> httpx.AsyncClient:
+    key = ("http", base_url, None, float(timeout), trust_env)
+    return _get_or_create(
+        _async_clients,
+        key,
+        lambda: httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=_pool_limits(),
+            http2=http2_enabled(),
+            trust_env=trust_env,
+        ),
+    )
+
+
+# ---------- OpenAI-compatible clients ----------
+
+
+def get_openai_client(
+    api_key: str,
+    base_url: Optional[str] = None,
+    timeout: float = 180.0,
+    max_retries: int = 2,
+    trust_env: Optional[bool] = None,
+):
+    from openai import OpenAI, DefaultHttpxClient
+
+    trust_env = _resolve_trust_env(trust_env)
+    key = ("openai", base_url, api_key, float(timeout), max_retries, trust_env)
+
+    def factory():
+        http_client = DefaultHttpxClient(
+            limits=_pool_limits(), http2=http2_enabled(), trust_env=trust_env
+        )
+        kwargs = {"base_url": base_url} if base_url else {}
+        return OpenAI(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=http_client,
+            **kwargs,
+        )
+
+    return _get_or_create(_sync_clients, key, factory)
+
+
+def get_async_openai_client(
+    api_key: str,
+    base_url: Optional[str] = None,
+    timeout: float = 180.0,
+    max_retries: int = 2,
+    trust_env: Optional[bool] = None,
+):
+    """
+    Async clients belong to the event loop that first uses them (the server
+    loop); aclose_clients() on shutdown releases them.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    trust_env = _resolve_trust_env(trust_env)
+    key = ("openai", base_url, api_key, float(timeout), max_retries, trust_env)
+
+    def factory():
+        http_client = DefaultAsyncHttpxClient(
+            limits=_pool_limits(), http2=http2_enabled(), trust_env=trust_env
+        )
+        kwargs = {"base_url": base_url} if base_url else {}
+        return AsyncOpenAI(
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=http_client,
+            **kwargs,
+        )
+
+    return _get_or_create(_async_clients, key, factory)
+
+
+# ---------- shutdown ----------
+
+
+def close_clients():
+    """Close all pooled sync clients"""
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Warning: failed to close HTTP client: {e}")
+
+
+async def aclose_clients():
+    """Close all pooled clients (call from the app shutdown hook)"""
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()  # AsyncOpenAI
+        except Exception as e:
+            print(f"Warning: failed to close async HTTP client: {e}")
+    close_clients()
@@ -1,6 +1,18 @@
-import os, sys, json, argparse, re, time
+import os, sys, json, argparse, time, asyncio, random
 from typing import Dict, Any, Optional, List
 
+from llm_cache import get_cache, make_key
+from llm_clients import get_async_openai_client, get_openai_client
+from llm_json import lenient_loads
+from llm_health import (
+    BackendUnavailableError,
+    CircuitBreaker,
+    get_breaker,
+    is_backend_failure,
+)
+from llm_limits import BackendLimiter, LLMOverloadedError, get_limiter
+from llm_tokens import count_message_tokens, get_profile
+
 
 def log(msg: str, on: bool):
     if on:
@@ -31,37 +43,6 @@ def dump_json(obj: Dict[str, Any], out_path: str):
             json.dump(obj, f, ensure_ascii=False, indent=2)
 
 
-def robust_json_loads(s: str) -> Dict[str, Any]:
-    """
-    Try to parse JSON, tolerate accidental markdown fences and extra text
-    """
-    s = s.strip()
-    try:
-        obj = json.loads(s)
-        if not isinstance(obj, dict):
-            raise ValueError("top-level must be object")
-        return obj
-    except Exception:
-        pass
-
-    # strip ```json ... ``` if present
-    if s.startswith("```"):
-        s = re.sub(r"^```(?:json)?\s*", "", s, flags=re.I)
-        s = re.sub(r"\s*```$", "", s)
-
-    # try to extract { ... }
-    l = s.find("{")
-    r = s.rfind("}")
-    if l != -1 and r != -1 and r > l:
-        core = s[l:r + 1]
-        obj = json.loads(core)
-        if not isinstance(obj, dict):
-            raise ValueError("top-level must be object")
-        return obj
-
-    raise ValueError("not valid json")
-
-
 # ---------- Mock POV helper ----------
 
 def generate_mock_pov(title_lower: str) -> List[str]:
@@ -93,6 +74,11 @@ def generate_mock_pov(title_lower: str) -> List[str]:
 
 # ---------- Mock framework builder (no API key) ----------
 
+def calculate_mock_confidence() -> float:
+    """mock confidence 分数 (60-95)"""
+    return round(random.uniform(60, 95), 1)
+
+
 def build_mock_framework(md: Dict[str, Any]) -> Dict[str, Any]:
     # Basic title/author
     title = (md.get("title") or md.get("subject") or "Untitled Framework").strip()
@@ -403,6 +389,302 @@ def resolve_api_settings(
     return key, base
 
 
+def _openai_backend(base_url: Optional[str]) -> str:
+    return f"openai|{base_url or 'https://api.openai.com/v1'}"
+
+
+def openai_limiter(base_url: Optional[str]) -> BackendLimiter:
+    """Shared limiter of the OpenAI org key / base URL (see llm_limits.py)"""
+    return get_limiter(_openai_backend(base_url), "openai")
+
+
+def openai_breaker(base_url: Optional[str]) -> CircuitBreaker:
+    """Health of the OpenAI backend (see llm_health.py)"""
+    return get_breaker(_openai_backend(base_url))
+
+
+def request_tokens(request: Dict[str, Any]) -> int:
+    """Prompt tokens + the answer tokens the API counts against tokens/min"""
+    model = request.get("model")
+    answer = request.get("max_tokens") or get_profile(model).max_output_tokens
+    return count_message_tokens(request.get("messages", []), model) + answer
+
+
+def _enter_breaker(breaker: CircuitBreaker):
+    if not breaker.allow():
+        raise BackendUnavailableError(
+            f"LLM backend {breaker.name} is unavailable (circuit open)"
+        )
+
+
+def _record_failure(breaker: CircuitBreaker, error: BaseException):
+    if isinstance(error, Exception) and is_backend_failure(error):
+        breaker.record_failure()
+    else:
+        breaker.release_trial()
+
+
+def create_chat_completion(client, base_url: Optional[str], **request):
+    """
+    client.chat.completions.create(**request) through the backend's circuit
+    breaker and limiter (fair queue, rate limits, 429 / Retry-After).
+    Create the client with max_retries=0: the limiter does the retrying.
+    """
+    breaker = openai_breaker(base_url)
+    _enter_breaker(breaker)
+    start = time.monotonic()
+    try:
+        resp = openai_limiter(base_url).call(
+            lambda: client.chat.completions.create(**request), request_tokens(request)
+        )
+    except BaseException as e:
+        _record_failure(breaker, e)
+        raise
+    breaker.record_success(time.monotonic() - start)
+    return resp
+
+
+async def acreate_chat_completion(client, base_url: Optional[str], **request):
+    """Async version of create_chat_completion() (AsyncOpenAI client)"""
+    breaker = openai_breaker(base_url)
+    _enter_breaker(breaker)
+    start = time.monotonic()
+    try:
+        resp = await openai_limiter(base_url).acall(
+            lambda: client.chat.completions.create(**request), request_tokens(request)
+        )
+    except BaseException as e:
+        _record_failure(breaker, e)
+        raise
+    breaker.record_success(time.monotonic() - start)
+    return resp
+
+
+def build_framework_messages(md: Dict[str, Any]) -> List[Dict[str, str]]:
+    """System + user messages for the framework generation call"""
+    sys_prompt = (
+        "You are a senior framework designer. Transform metadata into a comprehensive framework.\n\n"
+        "CRITICAL REQUIREMENTS:\n"
+        "1. workflow_layers MUST include 'focus' (1-2 sentence overview) AND 'guidance' (3-5 actionable steps)\n"
+        "2. risks_watchouts MUST be objects with 'risk', 'impact', and 'mitigation' fields\n"
+        "3. escalation MUST be objects with 'trigger' and 'action' fields\n"
+        "4. primary_artefact MUST have meaningful 'name' and 'purpose' - NEVER leave as null\n"
+        "5. outputs_deliverables MUST include 'default' and 3-5 'optional' artefacts specific to this framework\n"
+        "6. Be specific and actionable, not generic - use actual content from metadata\n"
+        "7. Return ONLY valid JSON - no markdown, no code fences, no comments\n\n"
+        "Use null or [] ONLY for truly unknown fields, NOT for artefacts."
+    )
+
+    schema = {
+        "id": None,
+        "title": None,
+        "type": None,
+        "attribution": None,
+        "quadrant": None,
+        "version": "1.0",
+        "core_method": [],
+        "pov": [
+            "<point of view sentence 1>",
+            "<point of view sentence 2>",
+        ],
+        "primary_artefact": {
+            "name": "<primary artefact name>",
+            "purpose": "<1-2 sentence purpose>",
+            "when_to_use": ["<scenario 1>", "<scenario 2>", "<scenario 3>"],
+            "variant_id": "<id of the main artefact in artefact_variants>",
+        },
+        "concept_clusters": {},
+        "trigger_context": [],
+        "workflow_layers": [
+            {
+                "name": "<layer name>",
+                "focus": "<1-2 sentence description of what this layer achieves>",
+                "guidance": [
+                    "<specific actionable step 1>",
+                    "<specific actionable step 2>",
+                    "<specific actionable step 3>",
+                ],
+            }
+        ],
+        "inputs_required": [],
+        "risks_watchouts": [
+            {
+                "risk": "<risk title>",
+                "impact": "<why this matters>",
+                "mitigation": "<how to address>",
+            }
+        ],
+        "research_required": [],
+        "outputs_deliverables": {
+            "default": "<primary deliverable name>",
+            "optional": [
+                {
+                    "name": "<specific artefact name>",
+                    "description": "<10-20 word description of purpose and use case>",
+                }
+            ],
+        },
+        "escalation": [
+            {
+                "trigger": "<specific condition that requires escalation>",
+                "action": "<who to escalate to and what action to take>",
+            }
+        ],
+        "tags": [],
+        "derived_from_metadata": {
+            "used_facets": [],
+            "used_triples": [],
+            "used_key_values": [],
+        },
+        "confidence": 75.0,  # ✅ AI-generated confidence score (60-100)
+        # =====new：multiple artefact schema =====
+        "artefact_variants": [
+            {
+                "id": "<short id, e.g. 'readiness_pack', 'hr_playbook'>",
+                "name": "<artefact name, e.g. 'Gen-AI Readiness Pack'>",
+                "summary": "<2-4 sentence description in plain text, no markdown>",
+                "when_to_use": [
+                    "<specific scenario 1>",
+                    "<specific scenario 2>",
+                ],
+                "sections": [
+                    {
+                        "heading": "<section heading, e.g. '1. System Overview'>",
+                        "body": "<full plain-text description of what belongs in this section>",
+                    }
+                ],
+                "risk_register": [
+                    {
+                        "risk": "<risk title>",
+                        "category": "<risk category, e.g. 'Accuracy', 'Privacy'>",
+                        "control": "<control or mitigation in 1-2 sentences>",
+                        "owner": "<role accountable for this risk>",
+                    }
+                ],
+            }
+        ],
+    }
+
+    user_prompt = (
+        "Build the framework JSON from this metadata. Keep lists short (<=6).\n\n"
+        "Schema:\n"
+        + json.dumps(schema, indent=2)
+        + "\n\nMetadata:\n"
+        + json.dumps(md, indent=2)
+        + "\n\nCRITICAL INSTRUCTIONS:\n\n"
+        "0. POINT OF VIEW (POV):\n"
+        "   - Generate 2-4 concise points of view as an ARRAY of strings.\n"
+        "   - Each POV is ONE sentence describing a guiding principle of the framework.\n\n"
+        "1. WORKFLOW LAYERS:\n"
+        "   - Each workflow_layer MUST have 'name', 'focus', and 'guidance'.\n"
+        "   - guidance is a list of 3-5 specific, actionable steps.\n\n"
+        "2. ARTEFACTS (PRIMARY + OPTIONALS):\n"
+        "   - primary_artefact.name MUST be a specific deliverable name, not generic.\n"
+        "   - primary_artefact.purpose MUST explain why it matters in 1-2 sentences.\n"
+        "   - outputs_deliverables.default MUST equal primary_artefact.name.\n"
+        "   - outputs_deliverables.optional MUST be an array of OBJECTS with name and description.\n\n"
+        "3. RISKS AND ESCALATION:\n"
+        "   - risks_watchouts[*] MUST have risk, impact, mitigation.\n"
+        "   - escalation[*] MUST have trigger and action.\n\n"
+        "4. MULTIPLE INDEPENDENT ARTEFACT VARIANTS (REASONABLE COUNT):\n"
+        "   - artefact_variants MUST be an ARRAY of a reasonable number of independent artefacts.\n"
+        "   - Generate AT LEAST 2 artefacts and AT MOST 7 artefacts.\n"
+        "   - Use the breadth and richness of the metadata to decide how many to create:\n"
+        "       · If the metadata is simple or narrow in scope → 2–3 artefacts.\n"
+        "       · If the metadata is moderately rich → 3–5 artefacts.\n"
+        "       · If the metadata is broad with many use cases or risks → 5–7 artefacts.\n"
+        "   - Each artefact MUST have: id, name, summary, when_to_use, sections and risk_register.\n"
+        "   - Do NOT merge multiple ideas into a single artefact if they could be separate usable artefacts.\n"
+        "   - primary_artefact.variant_id MUST equal artefact_variants[0].id.\n"
+        "   - primary_artefact.name MUST equal artefact_variants[0].name.\n"
+        "   - primary_artefact.when_to_use should align with artefact_variants[0].when_to_use.\n\n"
+        "5. TEXT FORMAT (IMPORTANT):\n"
+        "   - All strings, especially in artefact_variants.summary, sections.body and risk_register.control, MUST be plain text.\n"
+        "   - DO NOT use Markdown syntax: no **bold**, no headings with ###, no tables, no ``` fences.\n"
+        "   - You can use normal sentences and line breaks only.\n\n"
+        "6. SPECIFICITY:\n"
+        "   - Base all artefacts and guidance on the actual themes in the metadata (e.g. HR, GenAI, compliance).\n"
+        "   - Avoid generic placeholders like 'Framework Document' unless it really fits.\n\n"
+        "7. CONFIDENCE SCORE (REQUIRED):\n"
+        "   - Evaluate the framework quality and assign a confidence score between 60-100.\n"
+        "   - Consider these factors when calculating the score:\n"
+        "     · Metadata richness (facets, sections, keywords present): +0 to +15 points\n"
+        "     · Structure completeness (all required fields filled): +0 to +15 points\n"
+        "     · Artefact quality and specificity: +0 to +10 points\n"
+        "     · Risk coverage and mitigation detail: +0 to +10 points\n"
+        "   - Base score starts at 60 (minimum acceptable framework).\n"
+        "   - Score interpretation:\n"
+        "     · 60-64: Minimal framework with only basic structure\n"
+        "     · 65-74: Adequate framework with standard completeness\n"
+        "     · 75-84: Good framework with solid structure and meaningful detail\n"
+        "     · 85-94: Excellent framework with comprehensive coverage\n"
+        "     · 95-100: Outstanding framework with exceptional quality and depth\n"
+        "   - IMPORTANT: The confidence field MUST be a number (float), NOT a string.\n"
+        "   - Example: \"confidence\": 82.5\n"
+        "   - DO NOT return \"confidence\": \"82.5\" (with quotes around the number).\n\n"
+        "Return ONLY a single valid JSON object matching the schema above."
+    )
+
+    return [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def build_repair_messages(txt: str) -> List[Dict[str, str]]:
+    """Messages asking the model to convert its previous answer to strict JSON"""
+    fix_msg = (
+        "Convert your previous answer to a single strict JSON object. "
+        "No markdown, no explanation, only JSON."
+    )
+    return [
+        {"role": "system", "content": "You convert text to strict JSON."},
+        {"role": "user", "content": txt},
+        {"role": "system", "content": fix_msg},
+    ]
+
+
+# ---------- Response cache ----------
+
+# bump whenever build_framework_messages() (prompt or schema) changes
+FRAMEWORK_PROMPT_VERSION = "framework-v1"
+FRAMEWORK_TEMPERATURE = 0.2
+
+# per-run fields that must not change the cache key
+VOLATILE_MD_KEYS = {"doc_id"}
+
+
+def canonical_metadata(md: Dict[str, Any]) -> str:
+    """Stable JSON for md: sorted keys, no per-run fields ("_*" and doc_id)"""
+    core = {
+        k: v
+        for k, v in md.items()
+        if not str(k).startswith("_") and k not in VOLATILE_MD_KEYS
+    }
+    return json.dumps(core, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def framework_cache_key(
+    md: Dict[str, Any], model: str, temperature: float = FRAMEWORK_TEMPERATURE
+) -> str:
+    return make_key(
+        make_key(canonical_metadata(md)),
+        model,
+        temperature,
+        FRAMEWORK_PROMPT_VERSION,
+    )
+
+
+def repair_cache_key(txt: str, model: str) -> str:
+    return make_key(make_key(txt), model, "repair-v1")
+
+
+def framework_cache_enabled(use_cache: Optional[bool] = None) -> bool:
+    if use_cache is not None:
+        return use_cache
+    return os.getenv("FRAMEWORK_CACHE_ENABLED", "1") != "0"
+
+
 def call_openai_framework(
     md: Dict[str, Any],
     model: str,
@@ -410,234 +692,189 @@ def call_openai_framework(
     api_key: str,
     base_url: Optional[str],
     verbose: bool,
+    use_cache: Optional[bool] = None,
 ) -> Dict[str, Any]:
-    from openai import OpenAI
-
-    # clear proxies for safety
-    original_proxies = {}
-    proxy_keys = [
-        "HTTP_PROXY",
-        "HTTPS_PROXY",
-        "http_proxy",
-        "https_proxy",
-        "ALL_PROXY",
-        "all_proxy",
-        "NO_PROXY",
-        "no_proxy",
-    ]
-    for key in proxy_keys:
-        if key in os.environ:
-            original_proxies[key] = os.environ[key]
-            del os.environ[key]
+    """
+    Generate the framework with OpenAI
+
+    Identical metadata (same canonical JSON, model, temperature and prompt
+    version) is served from the "framework" cache. The answer is parsed with
+    llm_json.lenient_loads; only if that cannot recover it does a strict-JSON
+    repair round trip run, cached separately by the hash of the answer.
+    Pass use_cache=False (or FRAMEWORK_CACHE_ENABLED=0) to bypass both.
+    """
+    cache_on = framework_cache_enabled(use_cache)
+    key = framework_cache_key(md, model)
+    if cache_on:
+        cached = get_cache("framework").get(key)
+        if cached is not None:
+            log(f">> framework cache hit ({key[:16]})", verbose)
+            return cached
+
+    # proxies are bypassed by the pooled client itself (trust_env=False)
+    client = get_openai_client(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+    )
+
+    log(">> calling OpenAI...", verbose)
+    resp = create_chat_completion(
+        client,
+        base_url,
+        model=model,
+        temperature=FRAMEWORK_TEMPERATURE,
+        messages=build_framework_messages(md),
+    )
+    txt = (resp.choices[0].message.content or "").strip()
 
     try:
-        if base_url:
-            client = OpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                timeout=timeout,
-                max_retries=2,
+        framework = lenient_loads(txt)
+    except Exception:
+        rkey = repair_cache_key(txt, model)
+        framework = get_cache("framework_repair").get(rkey) if cache_on else None
+        if framework is None:
+            resp2 = create_chat_completion(
+                client,
+                base_url,
+                model=model,
+                temperature=0.0,
+                messages=build_repair_messages(txt),
             )
-        else:
-            client = OpenAI(api_key=api_key, timeout=timeout, max_retries=2)
-
-        sys_prompt = (
-            "You are a senior framework designer. Transform metadata into a comprehensive framework.\n\n"
-            "CRITICAL REQUIREMENTS:\n"
-            "1. workflow_layers MUST include 'focus' (1-2 sentence overview) AND 'guidance' (3-5 actionable steps)\n"
-            "2. risks_watchouts MUST be objects with 'risk', 'impact', and 'mitigation' fields\n"
-            "3. escalation MUST be objects with 'trigger' and 'action' fields\n"
-            "4. primary_artefact MUST have meaningful 'name' and 'purpose' - NEVER leave as null\n"
-            "5. outputs_deliverables MUST include 'default' and 3-5 'optional' artefacts specific to this framework\n"
-            "6. Be specific and actionable, not generic - use actual content from metadata\n"
-            "7. Return ONLY valid JSON - no markdown, no code fences, no comments\n\n"
-            "Use null or [] ONLY for truly unknown fields, NOT for artefacts."
-        )
+            txt2 = (resp2.choices[0].message.content or "").strip()
+            framework = lenient_loads(txt2)
+            if cache_on:
+                get_cache("framework_repair").set(rkey, framework)
 
-        schema = {
-            "id": None,
-            "title": None,
-            "type": None,
-            "attribution": None,
-            "quadrant": None,
-            "version": "1.0",
-            "core_method": [],
-            "pov": [
-                "<point of view sentence 1>",
-                "<point of view sentence 2>",
-            ],
-            "primary_artefact": {
-                "name": "<primary artefact name>",
-                "purpose": "<1-2 sentence purpose>",
-                "when_to_use": ["<scenario 1>", "<scenario 2>", "<scenario 3>"],
-                "variant_id": "<id of the main artefact in artefact_variants>",
-            },
-            "concept_clusters": {},
-            "trigger_context": [],
-            "workflow_layers": [
-                {
-                    "name": "<layer name>",
-                    "focus": "<1-2 sentence description of what this layer achieves>",
-                    "guidance": [
-                        "<specific actionable step 1>",
-                        "<specific actionable step 2>",
-                        "<specific actionable step 3>",
-                    ],
-                }
-            ],
-            "inputs_required": [],
-            "risks_watchouts": [
-                {
-                    "risk": "<risk title>",
-                    "impact": "<why this matters>",
-                    "mitigation": "<how to address>",
-                }
-            ],
-            "research_required": [],
-            "outputs_deliverables": {
-                "default": "<primary deliverable name>",
-                "optional": [
-                    {
-                        "name": "<specific artefact name>",
-                        "description": "<10-20 word description of purpose and use case>",
-                    }
-                ],
-            },
-            "escalation": [
-                {
-                    "trigger": "<specific condition that requires escalation>",
-                    "action": "<who to escalate to and what action to take>",
-                }
-            ],
-            "tags": [],
-            "derived_from_metadata": {
-                "used_facets": [],
-                "used_triples": [],
-                "used_key_values": [],
-            },
-            "confidence": 75.0,  # ✅ AI-generated confidence score (60-100)
-            # =====new：multiple artefact schema =====
-            "artefact_variants": [
-                {
-                    "id": "<short id, e.g. 'readiness_pack', 'hr_playbook'>",
-                    "name": "<artefact name, e.g. 'Gen-AI Readiness Pack'>",
-                    "summary": "<2-4 sentence description in plain text, no markdown>",
-                    "when_to_use": [
-                        "<specific scenario 1>",
-                        "<specific scenario 2>",
-                    ],
-                    "sections": [
-                        {
-                            "heading": "<section heading, e.g. '1. System Overview'>",
-                            "body": "<full plain-text description of what belongs in this section>",
-                        }
-                    ],
-                    "risk_register": [
-                        {
-                            "risk": "<risk title>",
-                            "category": "<risk category, e.g. 'Accuracy', 'Privacy'>",
-                            "control": "<control or mitigation in 1-2 sentences>",
-                            "owner": "<role accountable for this risk>",
-                        }
-                    ],
-                }
-            ],
-        }
+    if cache_on:
+        get_cache("framework").set(key, framework)
+    return framework
 
-        user_prompt = (
-            "Build the framework JSON from this metadata. Keep lists short (<=6).\n\n"
-            "Schema:\n"
-            + json.dumps(schema, indent=2)
-            + "\n\nMetadata:\n"
-            + json.dumps(md, indent=2)
-            + "\n\nCRITICAL INSTRUCTIONS:\n\n"
-            "0. POINT OF VIEW (POV):\n"
-            "   - Generate 2-4 concise points of view as an ARRAY of strings.\n"
-            "   - Each POV is ONE sentence describing a guiding principle of the framework.\n\n"
-            "1. WORKFLOW LAYERS:\n"
-            "   - Each workflow_layer MUST have 'name', 'focus', and 'guidance'.\n"
-            "   - guidance is a list of 3-5 specific, actionable steps.\n\n"
-            "2. ARTEFACTS (PRIMARY + OPTIONALS):\n"
-            "   - primary_artefact.name MUST be a specific deliverable name, not generic.\n"
-            "   - primary_artefact.purpose MUST explain why it matters in 1-2 sentences.\n"
-            "   - outputs_deliverables.default MUST equal primary_artefact.name.\n"
-            "   - outputs_deliverables.optional MUST be an array of OBJECTS with name and description.\n\n"
-            "3. RISKS AND ESCALATION:\n"
-            "   - risks_watchouts[*] MUST have risk, impact, mitigation.\n"
-            "   - escalation[*] MUST have trigger and action.\n\n"
-            "4. MULTIPLE INDEPENDENT ARTEFACT VARIANTS (REASONABLE COUNT):\n"
-            "   - artefact_variants MUST be an ARRAY of a reasonable number of independent artefacts.\n"
-            "   - Generate AT LEAST 2 artefacts and AT MOST 7 artefacts.\n"
-            "   - Use the breadth and richness of the metadata to decide how many to create:\n"
-            "       · If the metadata is simple or narrow in scope → 2–3 artefacts.\n"
-            "       · If the metadata is moderately rich → 3–5 artefacts.\n"
-            "       · If the metadata is broad with many use cases or risks → 5–7 artefacts.\n"
-            "   - Each artefact MUST have: id, name, summary, when_to_use, sections and risk_register.\n"
-            "   - Do NOT merge multiple ideas into a single artefact if they could be separate usable artefacts.\n"
-            "   - primary_artefact.variant_id MUST equal artefact_variants[0].id.\n"
-            "   - primary_artefact.name MUST equal artefact_variants[0].name.\n"
-            "   - primary_artefact.when_to_use should align with artefact_variants[0].when_to_use.\n\n"
-            "5. TEXT FORMAT (IMPORTANT):\n"
-            "   - All strings, especially in artefact_variants.summary, sections.body and risk_register.control, MUST be plain text.\n"
-            "   - DO NOT use Markdown syntax: no **bold**, no headings with ###, no tables, no ``` fences.\n"
-            "   - You can use normal sentences and line breaks only.\n\n"
-            "6. SPECIFICITY:\n"
-            "   - Base all artefacts and guidance on the actual themes in the metadata (e.g. HR, GenAI, compliance).\n"
-            "   - Avoid generic placeholders like 'Framework Document' unless it really fits.\n\n"
-            "7. CONFIDENCE SCORE (REQUIRED):\n"
-            "   - Evaluate the framework quality and assign a confidence score between 60-100.\n"
-            "   - Consider these factors when calculating the score:\n"
-            "     · Metadata richness (facets, sections, keywords present): +0 to +15 points\n"
-            "     · Structure completeness (all required fields filled): +0 to +15 points\n"
-            "     · Artefact quality and specificity: +0 to +10 points\n"
-            "     · Risk coverage and mitigation detail: +0 to +10 points\n"
-            "   - Base score starts at 60 (minimum acceptable framework).\n"
-            "   - Score interpretation:\n"
-            "     · 60-64: Minimal framework with only basic structure\n"
-            "     · 65-74: Adequate framework with standard completeness\n"
-            "     · 75-84: Good framework with solid structure and meaningful detail\n"
-            "     · 85-94: Excellent framework with comprehensive coverage\n"
-            "     · 95-100: Outstanding framework with exceptional quality and depth\n"
-            "   - IMPORTANT: The confidence field MUST be a number (float), NOT a string.\n"
-            "   - Example: \"confidence\": 82.5\n"
-            "   - DO NOT return \"confidence\": \"82.5\" (with quotes around the number).\n\n"
-            "Return ONLY a single valid JSON object matching the schema above."
-        )
 
-        log(">> calling OpenAI...", verbose)
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=0.2,
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
-        txt = (resp.choices[0].message.content or "").strip()
-
-        try:
-            return robust_json_loads(txt)
-        except Exception:
-            fix_msg = (
-                "Convert your previous answer to a single strict JSON object. "
-                "No markdown, no explanation, only JSON."
-            )
-            resp2 = client.chat.completions.create(
+async def acall_openai_framework(
+    md: Dict[str, Any],
+    model: str,
+    timeout: int,
+    api_key: str,
+    base_url: Optional[str],
+    verbose: bool,
+    use_cache: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Async version of call_openai_framework() (AsyncOpenAI) for the API server
+    """
+    cache_on = framework_cache_enabled(use_cache)
+    key = framework_cache_key(md, model)
+    if cache_on:
+        cached = await asyncio.to_thread(get_cache("framework").get, key)
+        if cached is not None:
+            log(f">> framework cache hit ({key[:16]})", verbose)
+            return cached
+
+    client = get_async_openai_client(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+    )
+
+    log(">> calling OpenAI (async)...", verbose)
+    resp = await acreate_chat_completion(
+        client,
+        base_url,
+        model=model,
+        temperature=FRAMEWORK_TEMPERATURE,
+        messages=build_framework_messages(md),
+    )
+    txt = (resp.choices[0].message.content or "").strip()
+
+    try:
+        framework = lenient_loads(txt)
+    except Exception:
+        rkey = repair_cache_key(txt, model)
+        framework = None
+        if cache_on:
+            framework = await asyncio.to_thread(get_cache("framework_repair").get, rkey)
+        if framework is None:
+            resp2 = await acreate_chat_completion(
+                client,
+                base_url,
                 model=model,
                 temperature=0.0,
-                messages=[
-                    {"role": "system", "content": "You convert text to strict JSON."},
-                    {"role": "user", "content": txt},
-                    {"role": "system", "content": fix_msg},
-                ],
+                messages=build_repair_messages(txt),
             )
             txt2 = (resp2.choices[0].message.content or "").strip()
-            return robust_json_loads(txt2)
+            framework = lenient_loads(txt2)
+            if cache_on:
+                await asyncio.to_thread(
+                    get_cache("framework_repair").set, rkey, framework
+                )
+
+    if cache_on:
+        await asyncio.to_thread(get_cache("framework").set, key, framework)
+    return framework
+
+
+# ---------- failover ----------
+
+def framework_fallback_enabled() -> bool:
+    return os.getenv("LLM_GLOBAL_FALLBACK", "mock") == "mock"
+
+
+def _should_fall_back(error: Exception) -> bool:
+    """OpenAI down / circuit open / overloaded → mock; other errors propagate"""
+    if not framework_fallback_enabled():
+        return False
+    return isinstance(
+        error, (BackendUnavailableError, LLMOverloadedError)
+    ) or is_backend_failure(error)
+
 
-    finally:
-        # restore proxies
-        for key, value in original_proxies.items():
-            os.environ[key] = value
+def generate_framework(
+    md: Dict[str, Any],
+    model: str,
+    timeout: int,
+    api_key: Optional[str],
+    base_url: Optional[str],
+    verbose: bool,
+    use_cache: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    call_openai_framework(), falling back to build_mock_framework() when
+    there is no API key or OpenAI is unavailable (LLM_GLOBAL_FALLBACK=off
+    to raise instead)
+    """
+    if not api_key:
+        log(">> no API key detected, using mock mode", verbose)
+        return build_mock_framework(md)
+    try:
+        return call_openai_framework(
+            md, model, timeout, api_key, base_url, verbose, use_cache=use_cache
+        )
+    except Exception as e:
+        if not _should_fall_back(e):
+            raise
+        print(f"⚠️  Global LLM unavailable ({e}), using mock framework")
+        return build_mock_framework(md)
+
+
+async def agenerate_framework(
+    md: Dict[str, Any],
+    model: str,
+    timeout: int,
+    api_key: Optional[str],
+    base_url: Optional[str],
+    verbose: bool,
+    use_cache: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Async version of generate_framework()"""
+    if not api_key:
+        log(">> no API key detected, using mock mode", verbose)
+        return build_mock_framework(md)
+    try:
+        return await acall_openai_framework(
+            md, model, timeout, api_key, base_url, verbose, use_cache=use_cache
+        )
+    except Exception as e:
+        if not _should_fall_back(e):
+            raise
+        print(f"⚠️  Global LLM unavailable ({e}), using mock framework")
+        return build_mock_framework(md)
 
 
 # ---------- main ----------
@@ -652,6 +889,7 @@ def main():
     ap.add_argument("--verbose", action="store_true")
     ap.add_argument("--out", default="-")
     ap.add_argument("--dry-run", action="store_true", help="force mock output without calling API")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the framework cache")
     args = ap.parse_args()
 
     md = load_metadata(args.metadata)
@@ -668,6 +906,7 @@ def main():
             api_key=key,
             base_url=base,
             verbose=args.verbose,
+            use_cache=False if args.no_cache else None,
         )
 
     dump_json(fw, args.out)
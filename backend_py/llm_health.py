@@ -0,0 +1,212 @@
+"""
+Backend health: circuit breakers, latency tracking and cached probes
+
+LLMClient used to pick cloud or local once from LLM_TYPE and keep calling
+it: when the vLLM box was slow or down, every request waited out the 300 s
+timeout. regenerate_framework also pinged Ollama with a blocking 2 s GET on
+every call.
+
+- CircuitBreaker per backend key (LLMClient.backend_key, "openai|<url>"):
+  after LLM_BREAKER_FAILURES consecutive failures the backend is skipped
+  for LLM_BREAKER_RESET_SECONDS, then one trial request decides whether it
+  closes again (half-open)
+- each breaker keeps the latencies of recent successes; p95() drives the
+  optional hedged requests of llm_local.FailoverLLM (LLM_HEDGE=1)
+- aprobe_http() caches reachability checks for LLM_HEALTH_TTL_SECONDS
+  instead of probing per request
+
+Client errors (4xx other than 429) and our own queue timeouts
+(LLMOverloadedError) do not count as backend failures.
+"""
+
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from llm_limits import LLMOverloadedError, classify_error
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BackendUnavailableError(RuntimeError):
+    """The backend's circuit is open; the call was not attempted"""
+
+
+def _http_status(exc: BaseException) -> Optional[int]:
+    seen = 0
+    while exc is not None and seen < 4:
+        status = getattr(exc, "status_code", None) or getattr(
+            getattr(exc, "response", None), "status_code", None
+        )
+        if status:
+            return status
+        exc = exc.__cause__ or exc.__context__
+        seen += 1
+    return None
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Does this error say something about the backend's health?"""
+    if isinstance(exc, (LLMOverloadedError, BackendUnavailableError)):
+        return False
+    if classify_error(exc) is not None:  # 429 / 5xx / connection / timeout
+        return True
+    status = _http_status(exc)
+    return status is None or status >= 500
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        window: int = 100,
+        min_samples: int = 20,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_samples = min_samples
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False  # a half-open trial request is in flight
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Would allow() let a request through (without taking the trial)?"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() >= self.opened_at + self.reset_timeout
+            return not self._trial
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() < self.opened_at + self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._trial = False
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self, latency: Optional[float] = None):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f" Circuit {self.name}: closed (backend recovered)")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial = False
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(
+                        f"⚠️  Circuit {self.name}: open for {self.reset_timeout:.0f}s "
+                        f"after {self.failures} failure(s)"
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The trial request ended without a verdict (cancelled / client error)"""
+        with self._lock:
+            self._trial = False
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "p95_seconds": round(p95, 2) if p95 is not None else None,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(backend_key: str) -> CircuitBreaker:
+    breaker = _breakers.get(backend_key)
+    if breaker is not None:
+        return breaker
+    with _breakers_lock:
+        breaker = _breakers.get(backend_key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                backend_key,
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            )
+            _breakers[backend_key] = breaker
+    return breaker
+
+
+# ============= Cached probes =============
+
+_probes: Dict[str, Tuple[bool, float]] = {}
+
+
+async def aprobe_http(base_url: str, path: str = "/", timeout: float = 2.0) -> bool:
+    """
+    Is the server at base_url answering? Cached for LLM_HEALTH_TTL_SECONDS
+    (default 15), so request handlers do not probe on every call.
+    """
+    ttl = float(os.getenv("LLM_HEALTH_TTL_SECONDS", "15"))
+    now = time.monotonic()
+    cached = _probes.get(base_url)
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+
+    from llm_clients import get_async_http_client
+
+    try:
+        client = get_async_http_client(base_url, timeout=timeout, trust_env=False)
+        await client.get(path)
+        ok = True
+    except Exception:
+        ok = False
+    _probes[base_url] = (ok, time.monotonic())
+    return ok
+
+
+def health_snapshot() -> Dict[str, Any]:
+    return {
+        "breakers": {k: b.snapshot() for k, b in list(_breakers.items())},
+        "probes": {k: ok for k, (ok, _) in list(_probes.items())},
+    }
+
+
+__all__ = [
+    "BackendUnavailableError",
+    "CircuitBreaker",
+    "aprobe_http",
+    "get_breaker",
+    "health_snapshot",
+    "is_backend_failure",
+]
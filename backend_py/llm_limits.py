@@ -0,0 +1,569 @@
+"""
+Outbound LLM backpressure: rate limits, adaptive concurrency, fair queueing
+
+One vLLM box (LOCAL_LLM_URL) and one OpenAI org key are shared by every
+tenant. Requests used to go out as fast as callers produced them (bounded
+only by a fixed per-process semaphore) and 429s were retried blindly by the
+SDK, so a burst from one user turned into timeouts for everybody.
+
+Every backend (LLMClient.backend_key / OpenAI base URL) now has one
+BackendLimiter per process:
+
+- token buckets for requests/min and tokens/min (a call reserves its prompt
+  + max output tokens up front; the unused part is refunded from the usage
+  reported in the response)
+- an AIMD concurrency limit between 1 and LLM_MAX_INFLIGHT_<KIND>: +1 per
+  window of fast successes, x0.9 when latency exceeds the target, x0.7 on
+  5xx / connection errors and x0.5 on 429 (at most one decrease per
+  cooldown)
+- a fair queue: when a slot frees up, waiting tenants are served round-robin
+  (one request each), so a tenant with 50 chunks in flight cannot starve one
+  with a single request
+- 429 / 503 pause the whole backend for Retry-After (or an exponential
+  backoff) instead of each caller retrying on its own
+
+The tenant is a contextvar (tenant_scope / set_tenant), set per request by
+app.services.tenancy.TenantMiddleware and per background job by JobQueue.
+
+Environment variables (KIND is CLOUD, LOCAL or OPENAI; the unsuffixed name
+applies to every backend):
+- LLM_MAX_INFLIGHT_<KIND>: upper bound of the concurrency limit
+- LLM_RPM[_<KIND>] / LLM_TPM[_<KIND>]: requests / tokens per minute, 0 = off
+- LLM_TARGET_LATENCY_SECONDS[_<KIND>]: latency above which the limit shrinks
+- LLM_QUEUE_TIMEOUT_SECONDS: max wait for a slot before LLMOverloadedError
+- LLM_LIMIT_RETRIES: retries of 429 / 5xx / connection errors (default 3)
+"""
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+DEFAULT_TENANT = "anonymous"
+_tenant: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_tenant", default=DEFAULT_TENANT
+)
+
+DEFAULT_MAX_INFLIGHT = {"cloud": 4, "local": 2, "openai": 8}
+DEFAULT_TARGET_LATENCY = {"cloud": 60.0, "local": 120.0, "openai": 60.0}
+
+_RETRYABLE_STATUS = {429, 502, 503, 504}
+# connection / timeout errors (openai and httpx), matched by class name so
+# this module does not import either
+_TRANSPORT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "TransportError",
+    "TimeoutException",
+}
+
+
+class LLMOverloadedError(RuntimeError):
+    """No slot on the backend within LLM_QUEUE_TIMEOUT_SECONDS"""
+
+    def __init__(self, backend: str, waited: float, retry_after: float = 30.0):
+        super().__init__(
+            f"LLM backend {backend} is overloaded "
+            f"(waited {waited:.0f}s for a slot), try again later"
+        )
+        self.retry_after = retry_after
+
+
+# ============= Tenant =============
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+def set_tenant(tenant: Optional[str]) -> contextvars.Token:
+    return _tenant.set(str(tenant) if tenant else DEFAULT_TENANT)
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str]):
+    """with tenant_scope(user_id): ... → LLM calls inside queue as that tenant"""
+    token = set_tenant(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+# ============= Token bucket =============
+
+
+class TokenBucket:
+    """
+    per_minute units per minute, bursts up to `burst` (default: one minute
+    worth). reserve() debits immediately and returns how long to wait; the
+    balance may go negative so concurrent reservations queue up in time.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: Optional[float] = None) -> float:
+        if not self.enabled or amount <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic() if now is None else now)
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        """Give back (amount > 0) or charge (amount < 0) after the fact"""
+        if not self.enabled or not amount:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# ============= Adaptive concurrency =============
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease concurrency limit"""
+
+    SLOW_FACTOR = 0.9
+    ERROR_FACTOR = 0.7
+    RATE_LIMITED_FACTOR = 0.5
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        target_latency: float = 60.0,
+        cooldown: float = 5.0,
+    ):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self._last_decrease = -math.inf
+
+    @property
+    def allowed(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def on_success(self, latency: float, now: Optional[float] = None):
+        if latency > self.target_latency:
+            self._decrease(self.SLOW_FACTOR, now)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_error(self, rate_limited: bool, now: Optional[float] = None):
+        self._decrease(
+            self.RATE_LIMITED_FACTOR if rate_limited else self.ERROR_FACTOR, now
+        )
+
+    def _decrease(self, factor: float, now: Optional[float]):
+        now = time.monotonic() if now is None else now
+        if now - self._last_decrease < self.cooldown:
+            return  # one decrease per congestion event
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+
+# ============= Error classification =============
+
+
+def _retry_after(response: Any) -> Optional[float]:
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> Optional[Tuple[bool, Optional[float]]]:
+    """
+    (rate_limited, retry_after) for overload errors worth retrying (429,
+    502-504, connection failures), None otherwise. Wrapped errors
+    (raise ... from e) are unwrapped.
+    """
+    seen = 0
+    while exc is not None and seen < 4:
+        response = getattr(exc, "response", None)
+        status = getattr(exc, "status_code", None) or getattr(
+            response, "status_code", None
+        )
+        if status in _RETRYABLE_STATUS:
+            return status == 429, _retry_after(response)
+        if any(c.__name__ in _TRANSPORT_ERRORS for c in type(exc).__mro__):
+            return False, None
+        exc = exc.__cause__ or exc.__context__
+        seen += 1
+    return None
+
+
+def usage_tokens(result: Any) -> Optional[int]:
+    """Tokens actually used, from an OpenAI response or an Ollama JSON body"""
+    if isinstance(result, dict):
+        if "prompt_eval_count" in result or "eval_count" in result:
+            return int(result.get("prompt_eval_count") or 0) + int(
+                result.get("eval_count") or 0
+            )
+        return None
+    total = getattr(getattr(result, "usage", None), "total_tokens", None)
+    return int(total) if total is not None else None
+
+
+# ============= Fair queue =============
+
+
+class _Waiter:
+    __slots__ = ("tenant", "event", "loop", "future", "granted")
+
+    def __init__(self, tenant: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tenant = tenant
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def wake(self) -> bool:
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:  # loop closed: the waiter is gone
+            return False
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Permit:
+    """A granted slot; reserved tokens are refunded from the actual usage"""
+
+    def __init__(self, limiter: "BackendLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.used: Optional[int] = None
+
+    def record(self, result: Any):
+        self.used = usage_tokens(result)
+
+
+class BackendLimiter:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        target_latency: float = 60.0,
+        queue_timeout: float = 300.0,
+        retries: int = 3,
+    ):
+        self.name = name
+        self.controller = AIMDController(max_concurrency, target_latency=target_latency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._turns: Deque[str] = deque()  # tenants with waiters, round-robin
+        self._blocked_until = 0.0  # backend-wide pause after 429 / 503
+
+    # ---------- slots ----------
+
+    def _grant_locked(self):
+        while self._turns and self.inflight < self.controller.allowed:
+            tenant = self._turns.popleft()
+            queue = self._queues[tenant]
+            waiter = queue.popleft()
+            if queue:
+                self._turns.append(tenant)
+            else:
+                del self._queues[tenant]
+            waiter.granted = True
+            self.inflight += 1
+            if not waiter.wake():
+                waiter.granted = False
+                self.inflight -= 1
+
+    def _try_enter(self, waiter: _Waiter) -> bool:
+        """Take a slot right away, or join the tenant's queue"""
+        with self._lock:
+            if not self._turns and self.inflight < self.controller.allowed:
+                self.inflight += 1
+                return True
+            queue = self._queues.get(waiter.tenant)
+            if queue is None:
+                queue = self._queues[waiter.tenant] = deque()
+                self._turns.append(waiter.tenant)
+            queue.append(waiter)
+            return False
+
+    def _abandon(self, waiter: _Waiter, keep_granted: bool) -> bool:
+        """
+        Leave the queue after a timeout / cancellation. Returns True if the
+        waiter holds a slot after all (granted meanwhile and keep_granted).
+        """
+        with self._lock:
+            if waiter.granted:
+                if keep_granted:
+                    return True
+                self.inflight -= 1
+                self._grant_locked()
+                return False
+            queue = self._queues.get(waiter.tenant)
+            if queue and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.tenant]
+                    self._turns.remove(waiter.tenant)
+            return False
+
+    def _release(self, permit: Permit, error: Optional[BaseException]):
+        now = time.monotonic()
+        overload = classify_error(error) if error is not None else None
+        with self._lock:
+            self.inflight -= 1
+            if overload is not None:
+                rate_limited, retry_after = overload
+                self.controller.on_error(rate_limited, now)
+                if rate_limited or retry_after is not None:
+                    pause = retry_after if retry_after is not None else 1.0
+                    self._blocked_until = max(self._blocked_until, now + pause)
+            elif error is None:
+                self.controller.on_success(now - permit.started, now)
+            self._grant_locked()
+        if permit.used is not None:
+            self.tokens.refund(permit.tokens - permit.used)
+
+    def _rate_delay(self, tokens: int) -> float:
+        """Seconds to wait before sending (pause, requests/min, tokens/min)"""
+        pause = self._blocked_until - time.monotonic()
+        return max(pause, self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    # ---------- sync ----------
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """with limiter.slot(tokens) as permit: ... (blocks for a fair turn)"""
+        waiter = _Waiter(current_tenant())
+        start = time.monotonic()
+        if not self._try_enter(waiter):
+            if not waiter.event.wait(self.queue_timeout):
+                if not self._abandon(waiter, keep_granted=True):
+                    raise LLMOverloadedError(self.name, time.monotonic() - start)
+        permit = Permit(self, tokens)
+        error: Optional[BaseException] = None
+        try:
+            delay = self._rate_delay(tokens)
+            if delay > 0:
+                time.sleep(delay)
+            permit.started = time.monotonic()
+            yield permit
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._release(permit, error)
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """fn() inside a slot, retrying overload errors with backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                with self.slot(tokens) as permit:
+                    result = fn()
+                    permit.record(result)
+                    return result
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                print(f"⚠️  {self.name}: {e}; retry {attempt + 1}/{self.retries}")
+                time.sleep(delay)
+
+    # ---------- async ----------
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        """async with limiter.aslot(tokens) as permit: ..."""
+        waiter = _Waiter(current_tenant(), asyncio.get_running_loop())
+        start = time.monotonic()
+        if not self._try_enter(waiter):
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(waiter.future), self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter, keep_granted=True):
+                    raise LLMOverloadedError(self.name, time.monotonic() - start)
+            except asyncio.CancelledError:
+                self._abandon(waiter, keep_granted=False)
+                raise
+        permit = Permit(self, tokens)
+        error: Optional[BaseException] = None
+        try:
+            delay = self._rate_delay(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            permit.started = time.monotonic()
+            yield permit
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._release(permit, error)
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.aslot(tokens) as permit:
+                    result = await fn()
+                    permit.record(result)
+                    return result
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                print(f"⚠️  {self.name}: {e}; retry {attempt + 1}/{self.retries}")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """None if the error is not retryable or retries are used up"""
+        overload = classify_error(error)
+        if overload is None or attempt >= self.retries:
+            return None
+        _, retry_after = overload
+        if retry_after is not None:
+            return 0.0  # the backend-wide pause already covers it (see slot)
+        return min(2**attempt, 30) * (0.5 + random.random() / 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "inflight": self.inflight,
+                "limit": self.controller.allowed,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "tenants_waiting": len(self._turns),
+                "paused_for": max(0.0, self._blocked_until - time.monotonic()),
+            }
+
+
+# ============= Registry =============
+
+_limiters: Dict[str, BackendLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def _env(kind: str, name: str, default: float) -> float:
+    raw = os.getenv(f"{name}_{kind.upper()}") or os.getenv(name)
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def get_limiter(
+    backend_key: str, kind: str, max_concurrency: Optional[int] = None
+) -> BackendLimiter:
+    """
+    Process-wide limiter of a backend. kind ("cloud" / "local" / "openai")
+    selects the env settings; max_concurrency overrides LLM_MAX_INFLIGHT_<KIND>.
+    """
+    limiter = _limiters.get(backend_key)
+    if limiter is not None:
+        return limiter
+    with _registry_lock:
+        limiter = _limiters.get(backend_key)
+        if limiter is None:
+            if max_concurrency is None:
+                max_concurrency = int(
+                    os.getenv(
+                        f"LLM_MAX_INFLIGHT_{kind.upper()}",
+                        str(DEFAULT_MAX_INFLIGHT.get(kind, 4)),
+                    )
+                )
+            limiter = BackendLimiter(
+                backend_key,
+                max(1, max_concurrency),
+                requests_per_minute=_env(kind, "LLM_RPM", 0),
+                tokens_per_minute=_env(kind, "LLM_TPM", 0),
+                target_latency=_env(
+                    kind,
+                    "LLM_TARGET_LATENCY_SECONDS",
+                    DEFAULT_TARGET_LATENCY.get(kind, 60.0),
+                ),
+                queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "300")),
+                retries=max(0, int(os.getenv("LLM_LIMIT_RETRIES", "3"))),
+            )
+            _limiters[backend_key] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {key: limiter.snapshot() for key, limiter in list(_limiters.items())}
+
+
+__all__ = [
+    "AIMDController",
+    "BackendLimiter",
+    "LLMOverloadedError",
+    "TokenBucket",
+    "classify_error",
+    "current_tenant",
+    "get_limiter",
+    "limiter_stats",
+    "set_tenant",
+    "tenant_scope",
+    "usage_tokens",
+]
@@ -1,10 +1,55 @@
 from __future__ import annotations
-import os, io, re, json, time, mimetypes, pathlib, hashlib, uuid, sys
+import os, json, time, mimetypes, pathlib, hashlib, uuid, sys, asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from dotenv import load_dotenv
 
 load_dotenv()
-from typing import Dict, Any, List, Optional, Union, Tuple
-from collections import Counter
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from llm_cache import get_cache, make_key
+from llm_json import lenient_loads
+from llm_merge import MetadataAccumulator, _norm_facets, merge_maps
+from text_extraction import extract_text, iter_document_pages
+from doc_analyzer import DocumentAnalyzer, analyze_text, split_sections
+from llm_tokens import (
+    ModelProfile,
+    Tokenizer,
+    chunk_by_tokens,
+    chunk_sections,
+    count_message_tokens,
+    get_profile,
+    get_tokenizer,
+)
+from llm_limits import (
+    BackendLimiter,
+    LLMOverloadedError,
+    current_tenant,
+    get_limiter,
+    tenant_scope,
+)
+from llm_health import (
+    BackendUnavailableError,
+    CircuitBreaker,
+    get_breaker,
+    is_backend_failure,
+)
+from llm_clients import (
+    get_async_http_client,
+    get_async_openai_client,
+    get_http_client,
+    get_openai_client,
+)
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -35,234 +80,8 @@ def read_bytes(path: Union[str, pathlib.Path]) -> bytes:
 def extract_text_from_bytes(
     data: bytes, mime: Optional[str], filename: Optional[str]
 ) -> str:
-    name = (filename or "").lower()
-    mime = (mime or "").lower()
-
-    if name.endswith((".txt", ".md", ".csv", ".log")) or mime.startswith("text/"):
-        try:
-            import chardet
-
-            enc = chardet.detect(data).get("encoding") or "utf-8"
-        except Exception:
-            enc = "utf-8"
-        out = data.decode(enc, errors="replace")
-        return out
-
-    if name.endswith(".pdf") or mime == "application/pdf":
-        try:
-            from pypdf import PdfReader
-
-            pages = [p.extract_text() or "" for p in PdfReader(io.BytesIO(data)).pages]
-            out = "\n\n".join(pages).strip()
-            return out
-        except Exception as e:
-            msg = f"[PDF parse error: {e}]"
-            return msg
-
-    if name.endswith(".docx") or "wordprocessingml.document" in mime:
-        try:
-            import docx
-
-            doc = docx.Document(io.BytesIO(data))
-            out = "\n".join(p.text for p in doc.paragraphs)
-            return out
-        except Exception as e:
-            msg = f"[DOCX parse error: {e}]"
-            return msg
-
-    if name.endswith((".html", ".htm")) or mime == "text/html":
-        try:
-            from bs4 import BeautifulSoup
-
-            soup = BeautifulSoup(data, "lxml")
-            out = soup.get_text("\n")
-            return out
-        except Exception:
-            out = re.sub(r"<[^>]+>", "", data.decode("utf-8", errors="replace"))
-            return out
-
-    msg = f"[Unsupported binary file: {len(data)} bytes]"
-    return msg
-
-
-# schema
-A_FIXED = {
-    "doc_id": None,
-    "title": None,
-    "subject": None,
-    "author": None,
-    "created_at": None,
-    "jurisdiction": [],
-    "industry": [],
-    "confidentiality": None,
-    "version": None,
-    "language": None,
-    "keywords": [],
-    "entities": [],
-}
-B_MINIMUM = {
-    "facets": {},
-    "sections": [],
-    "triples": [],
-    "key_values": [],
-    "tags": [],
-    "questions": [],
-    "risks": [],
-    "actions_todo": [],
-    "metrics": [],
-    "tables": [],
-    "figures": [],
-    "extra": {},
-}
-
-
-def ensure_open_schema(parsed: Dict[str, Any]) -> Dict[str, Any]:
-    out: Dict[str, Any] = {}
-    for k, v in A_FIXED.items():
-        out[k] = parsed.get(k, v)
-    for k, v in B_MINIMUM.items():
-        out[k] = parsed.get(k, v)
-    for k, v in parsed.items():
-        if k not in out:
-            out[k] = v
-    return out
-
-
-def dedup_list(values: List[Any]) -> List[Any]:
-    seen, out = set(), []
-    for v in values:
-        key = json.dumps(v, ensure_ascii=False, sort_keys=True)
-        if key not in seen:
-            seen.add(key)
-            out.append(v)
-    return out
-
-
-def _as_list(x):
-    if x is None:
-        return []
-    if isinstance(x, list):
-        return x
-    return [x]
-
-
-def _norm_facet_item(it):
-    if isinstance(it, dict):
-        val = str(it.get("value", it.get("text", it.get("name", "")))).strip()
-        ev = str(it.get("evidence", "")).strip()[:200]
-        loc = str(it.get("location", "")).strip()
-        try:
-            conf = float(it.get("confidence", it.get("score", 0.5)))
-        except Exception:
-            conf = 0.5
-        return {
-            "value": val,
-            "evidence": ev,
-            "location": loc,
-            "confidence": max(0.0, min(1.0, conf)),
-        }
-    return {"value": str(it), "evidence": "", "location": "", "confidence": 0.5}
-
-
-def _norm_facets(facets_obj):
-    out = {}
-    if isinstance(facets_obj, list) or isinstance(facets_obj, str):
-        items = [_norm_facet_item(x) for x in _as_list(facets_obj)]
-        out["misc"] = {"summary": "", "items": items}
-        return out
-    if not isinstance(facets_obj, dict):
-        return {}
-    for name, obj in facets_obj.items():
-        if isinstance(obj, dict):
-            summary = str(obj.get("summary", ""))
-            items = [_norm_facet_item(x) for x in _as_list(obj.get("items", []))]
-        elif isinstance(obj, list):
-            summary = ""
-            items = [_norm_facet_item(x) for x in obj]
-        else:
-            summary = ""
-            items = [_norm_facet_item(obj)]
-        out[name] = {"summary": summary, "items": items}
-    return out
-
-
-def _dedup_items(items):
-    seen, out = set(), []
-    for it in items:
-        key = json.dumps(
-            {
-                "v": it.get("value", ""),
-                "e": it.get("evidence", ""),
-                "l": it.get("location", ""),
-            },
-            ensure_ascii=False,
-            sort_keys=True,
-        )
-        if key not in seen:
-            seen.add(key)
-            out.append(it)
-    return out
-
-
-def merge_maps(results: List[Dict[str, Any]]) -> Dict[str, Any]:
-    results = [ensure_open_schema(r) for r in results]
-    merged: Dict[str, Any] = {}
-
-    for k, v in A_FIXED.items():
-        if isinstance(v, list):
-            merged[k] = dedup_list(sum((r.get(k, []) for r in results), []))[:50]
-        else:
-            merged[k] = next(
-                (r.get(k) for r in results if r.get(k) not in (None, "", "unknown")),
-                None,
-            )
-
-    facets_merged: Dict[str, Dict[str, Any]] = {}
-    for r in results:
-        rf_raw = r.get("facets", {}) or {}
-        rf = _norm_facets(rf_raw)
-        for name, obj in rf.items():
-            tgt = facets_merged.setdefault(name, {"summary": "", "items": []})
-            cand_summary = obj.get("summary", "") or ""
-            if len(cand_summary) > len(tgt["summary"]):
-                tgt["summary"] = cand_summary[:2000]
-            tgt["items"].extend(obj.get("items", []))
-    for name in list(facets_merged.keys()):
-        facets_merged[name]["items"] = _dedup_items(facets_merged[name]["items"])[:200]
-    merged["facets"] = facets_merged
-
-    def _norm_list_slot(all_res, key, cap):
-        acc = []
-        for r in all_res:
-            val = r.get(key, [])
-            if val is None:
-                continue
-            if isinstance(val, list):
-                acc.extend(val)
-            else:
-                acc.append(val)
-        return dedup_list(acc)[:cap]
-
-    merged["sections"] = _norm_list_slot(results, "sections", 200)
-    merged["triples"] = _norm_list_slot(results, "triples", 500)
-    merged["key_values"] = _norm_list_slot(results, "key_values", 500)
-    merged["tags"] = _norm_list_slot(results, "tags", 300)
-    merged["questions"] = _norm_list_slot(results, "questions", 300)
-    merged["risks"] = _norm_list_slot(results, "risks", 300)
-    merged["actions_todo"] = _norm_list_slot(results, "actions_todo", 300)
-    merged["metrics"] = _norm_list_slot(results, "metrics", 300)
-    merged["tables"] = _norm_list_slot(results, "tables", 300)
-    merged["figures"] = _norm_list_slot(results, "figures", 300)
-
-    extra: Dict[str, Any] = {}
-    for r in results:
-        ex = r.get("extra", {}) or {}
-        if isinstance(ex, dict):
-            extra.update(ex)
-    merged["extra"] = extra
-
-    out = ensure_open_schema(merged)
-    return out
+    # PDF / DOCX / HTML 解析在进程池中执行（超时 + 内存上限），见 text_extraction.py
+    return extract_text(data, filename=filename, mime=mime)
 
 
 # ============= Smart Preprocessing Functions =============
@@ -270,204 +89,43 @@ def merge_maps(results: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 def extract_title_from_text(text: str) -> str:
     """提取文档标题（第一行或最突出的行）"""
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    if not lines:
-        return "Untitled Document"
-
-    # 尝试找到标题格式的行
-    for line in lines[:5]:  # 只看前5行
-        # 标题通常：较短、不以小写字母开头、可能有特殊格式
-        if len(line) < 200 and (line[0].isupper() or line[0] == "#"):
-            # 清理markdown标记
-            title = re.sub(r"^#+\s*", "", line)
-            return title.strip()
-
-    # 默认用第一行
-    return lines[0][:150]
+    return analyze_text(text)["title"]
 
 
 def extract_simple_keywords(text: str, top_n: int = 10) -> List[str]:
     """简单的关键词提取（不用LLM）"""
-    # 转小写，分词
-    words = re.findall(r"\b[a-z]{4,}\b", text.lower())
-
-    # 停用词（常见无意义词）
-    stop_words = {
-        "this",
-        "that",
-        "with",
-        "from",
-        "have",
-        "been",
-        "were",
-        "will",
-        "would",
-        "could",
-        "should",
-        "about",
-        "their",
-        "there",
-        "where",
-        "which",
-        "these",
-        "those",
-        "what",
-        "when",
-        "then",
-        "them",
-        "they",
-        "than",
-        "such",
-        "into",
-        "through",
-        "during",
-        "before",
-        "after",
-        "above",
-        "below",
-    }
-
-    # 过滤停用词
-    words = [w for w in words if w not in stop_words]
-
-    # 词频统计
-    word_freq = Counter(words)
-
-    # 返回top N
-    return [word for word, count in word_freq.most_common(top_n)]
+    return analyze_text(text, top_n=top_n)["keywords"]
 
 
 def extract_sections_structure(text: str) -> List[Dict[str, str]]:
     """提取文档结构（章节标题）"""
-    sections = []
-
-    lines = text.split("\n")
-    current_section = None
-
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line:
-            continue
-
-        # 识别章节标题的模式
-        is_section = False
-        level = 1
-
-        # Markdown标题格式
-        if line.startswith("#"):
-            is_section = True
-            level = len(re.match(r"^#+", line).group())
-            line = re.sub(r"^#+\s*", "", line)
-
-        # 数字编号格式 (1. 2. 3.)
-        elif re.match(r"^\d+[\.\)]\s+[A-Z]", line):
-            is_section = True
-            level = 2
-
-        # 全大写短行（可能是标题）
-        elif len(line) < 100 and line.isupper() and len(line.split()) > 1:
-            is_section = True
-            level = 2
-
-        # 短行且首字母大写（可能是标题）
-        elif (
-            len(line) < 80 and line[0].isupper() and not line.endswith((".", ",", ";"))
-        ):
-            is_section = True
-            level = 3
-
-        if is_section:
-            # 收集前一个section的内容
-            if current_section:
-                sections.append(current_section)
-
-            current_section = {
-                "title": line[:100],
-                "level": level,
-                "preview": "",  # 将在下面填充
-            }
-        elif current_section and len(current_section["preview"]) < 150:
-            # 添加内容预览
-            current_section["preview"] += " " + line
-
-    # 添加最后一个section
-    if current_section:
-        sections.append(current_section)
-
-    # 限制返回数量
-    return sections[:10]
+    return analyze_text(text)["sections"]
 
 
 def extract_simple_entities(text: str) -> List[str]:
     """简单的实体提取（不用spaCy，避免额外依赖）"""
-    entities = set()
-
-    # 大写开头的短语（可能是实体）
-    capitalized_phrases = re.findall(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b", text)
-
-    # 过滤常见词
-    common_words = {
-        "The",
-        "This",
-        "That",
-        "These",
-        "Those",
-        "There",
-        "Here",
-        "When",
-        "Where",
-        "What",
-        "Which",
-        "Who",
-        "How",
-        "Why",
-    }
-
-    for phrase in capitalized_phrases:
-        if phrase not in common_words and len(phrase) > 2:
-            entities.add(phrase)
-
-    # 限制数量
-    return list(entities)[:15]
+    return analyze_text(text)["entities"]
 
 
-def preprocess_document_smart(
-    text: str, max_summary_chars: int = 800
+def _build_preprocessed(
+    analysis: Dict[str, Any], max_summary_chars: int
 ) -> Dict[str, Any]:
-    """
-    智能预处理文档 - 在本地提取关键信息，不用LLM
-
-    Args:
-        text: 原始文档文本
-        max_summary_chars: 摘要最大字符数
-
-    Returns:
-        预处理后的结构化信息
-    """
-    print(f" Smart preprocessing: {len(text)} chars → extracting key info...")
-
-    # 1. 提取标题
-    title = extract_title_from_text(text)
+    """Summary + stats from a DocumentAnalyzer result"""
+    title = analysis["title"]
+    keywords = analysis["keywords"]
+    sections = analysis["sections"]
+    entities = analysis["entities"]
     print(f"    Title: {title[:50]}...")
-
-    # 2. 提取关键词
-    keywords = extract_simple_keywords(text, top_n=10)
     print(f"    Keywords: {', '.join(keywords[:5])}...")
-
-    # 3. 提取文档结构
-    sections = extract_sections_structure(text)
     print(f"    Sections: {len(sections)} found")
-
-    # 4. 提取实体
-    entities = extract_simple_entities(text)
     print(f"    Entities: {len(entities)} found")
 
-    # 5. 生成精简摘要
+    # 生成精简摘要
     # 摘要包含：标题 + 前几个段落 + 关键章节
     summary_parts = [f"Title: {title}\n"]
 
     # 添加文档开头（前500字符）
-    text_start = text[:500].strip()
+    text_start = analysis["head"].strip()
     summary_parts.append(f"Content: {text_start}...\n")
 
     # 添加章节结构
@@ -482,18 +140,101 @@ def preprocess_document_smart(
         f"    Generated summary: {len(summary)} chars (~{int(len(summary) * 0.7)} tokens)"
     )
 
+    chars = analysis["chars"]
     return {
         "title": title,
         "keywords": keywords,
         "entities": entities,
         "sections": sections,
         "summary": summary,
-        "original_length": len(text),
+        "original_length": chars,
         "summary_length": len(summary),
-        "compression_ratio": round(len(summary) / len(text), 2),
+        "compression_ratio": round(len(summary) / max(chars, 1), 2),
     }
 
 
+def preprocess_document_smart(
+    text: str, max_summary_chars: int = 800
+) -> Dict[str, Any]:
+    """
+    智能预处理文档 - 在本地提取关键信息，不用LLM
+
+    Title / keywords / sections / entities come from one DocumentAnalyzer
+    pass over the text (doc_analyzer.py).
+
+    Args:
+        text: 原始文档文本
+        max_summary_chars: 摘要最大字符数
+
+    Returns:
+        预处理后的结构化信息
+    """
+    print(f" Smart preprocessing: {len(text)} chars → extracting key info...")
+    return _build_preprocessed(analyze_text(text), max_summary_chars)
+
+
+def _env_budget(name: str, default: int) -> Optional[int]:
+    value = int(os.getenv(name, str(default)))
+    return value if value > 0 else None
+
+
+def collect_document_pages(
+    pages: Iterable[str],
+    page_budget: Optional[int] = None,
+    signal_chars: Optional[int] = None,
+    analyzer: Optional[DocumentAnalyzer] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    从分页文本流中读取，直到预处理信号足够就停止
+
+    preprocess_document_smart 只用到开头 500 字符、前 5 行标题和 10 个章节，
+    关键词/实体只需要一段足够长的样本，没必要解析完整个 500 页的 PDF。
+
+    Stops when either:
+    - page_budget pages were read (PREPROCESS_PAGE_BUDGET, default 20, 0 = all)
+    - at least signal_chars characters were read (PREPROCESS_SIGNAL_CHARS,
+      default 20000) and the full 10 sections have been found
+
+    analyzer: DocumentAnalyzer fed with the pages as they are read (the
+    section check is incremental; pass one in to reuse its result)
+
+    Returns:
+        (collected text, {"pages_read", "truncated"})
+    """
+    if page_budget is None:
+        page_budget = _env_budget("PREPROCESS_PAGE_BUDGET", 20)
+    if signal_chars is None:
+        signal_chars = _env_budget("PREPROCESS_SIGNAL_CHARS", 20000)
+
+    if analyzer is None:
+        analyzer = DocumentAnalyzer()
+    parts: List[str] = []
+    enough = truncated = False
+    iterator = iter(pages)
+    try:
+        for page in iterator:
+            if enough:
+                # more pages exist but are not needed
+                truncated = True
+                break
+            if parts:
+                analyzer.feed("\n")
+            parts.append(page)
+            analyzer.feed(page)
+            enough = bool(page_budget and len(parts) >= page_budget) or bool(
+                signal_chars
+                and analyzer.chars >= signal_chars
+                and analyzer.section_count >= 10
+            )
+    finally:
+        # stop the producer (no further PDF batches are parsed)
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+    return "\n".join(parts), {"pages_read": len(parts), "truncated": truncated}
+
+
 # ============= Unified LLM Client =============
 
 
@@ -508,6 +249,12 @@ class LLMClient:
     - LOCAL_LLM_URL: Cloud LLM URL
     - LOCAL_LLM_MODEL: Cloud LLM model name
     - LOCAL_LLM_API_KEY: Cloud LLM API key
+    - LLM_MAX_INFLIGHT_CLOUD / LLM_MAX_INFLIGHT_LOCAL: max concurrent requests
+      sent to each backend (shared by all callers in the process)
+
+    Every request goes through the backend's llm_limits.BackendLimiter
+    (fair queue per tenant, adaptive concurrency up to max_inflight,
+    requests/tokens per minute, 429 / Retry-After handling).
     """
 
     def __init__(
@@ -532,15 +279,13 @@ class LLMClient:
                 "LOCAL_LLM_API_KEY", "sk-F1YL14npR514cgzYEVFv19LcWf1dGQ98Wyv10"
             )
 
-            # Use OpenAI SDK
+            # Use OpenAI SDK (pooled client shared by every LLMClient)
             try:
-                from openai import OpenAI
-
-                self.client = OpenAI(
+                self.client = get_openai_client(
                     base_url=self.host,
                     api_key=self.api_key,
                     timeout=300.0,  # 增加到 5 分钟
-                    max_retries=3,
+                    max_retries=0,  # retried by the backend limiter
                 )
                 print(f" Using Cloud LLM: {self.host}")
             except ImportError:
@@ -559,6 +304,51 @@ class LLMClient:
             self.client = None
             print(f" Using Local Ollama: {self.host}")
 
+        default_inflight = "4" if self.llm_type == "cloud" else "2"
+        self.max_inflight = max(
+            1,
+            int(
+                os.getenv(
+                    f"LLM_MAX_INFLIGHT_{self.llm_type.upper()}", default_inflight
+                )
+            ),
+        )
+
+    @property
+    def profile(self) -> ModelProfile:
+        """Context window / output limits of self.model"""
+        return get_profile(self.model)
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return get_tokenizer(self.model)
+
+    def count_tokens(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    @property
+    def backend_key(self) -> str:
+        return f"{self.llm_type}|{self.host}"
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """Health of this backend, shared process-wide (see llm_health.py)"""
+        return get_breaker(self.backend_key)
+
+    @property
+    def limiter(self) -> BackendLimiter:
+        """Process-wide limiter of this backend (see llm_limits.py)"""
+        return get_limiter(self.backend_key, self.llm_type, self.max_inflight)
+
+    @property
+    def async_client(self):
+        """Pooled AsyncOpenAI client for the cloud backend"""
+        if self.llm_type != "cloud":
+            return None
+        return get_async_openai_client(
+            base_url=self.host, api_key=self.api_key, timeout=300.0, max_retries=0
+        )
+
     def generate(self, prompt: str, system: str = "") -> str:
         """
         Generate response (unified interface)
@@ -569,75 +359,177 @@ class LLMClient:
 
         Returns:
             LLM response text
+
+        Raises:
+            BackendUnavailableError: the backend's circuit is open
         """
-        if self.llm_type == "cloud":
-            return self._generate_cloud(prompt, system)
+        self._enter_breaker()
+        start = time.monotonic()
+        try:
+            if self.llm_type == "cloud":
+                out = self._generate_cloud(prompt, system)
+            else:
+                out = self._generate_local(prompt, system)
+        except BaseException as e:
+            self._record_failure(e)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return out
+
+    async def agenerate(self, prompt: str, system: str = "") -> str:
+        """
+        Async version of generate() - does not block the event loop
+
+        Args:
+            prompt: User prompt
+            system: System prompt
+
+        Returns:
+            LLM response text
+        """
+        self._enter_breaker()
+        start = time.monotonic()
+        try:
+            if self.llm_type == "cloud":
+                out = await self._agenerate_cloud(prompt, system)
+            else:
+                out = await self._agenerate_local(prompt, system)
+        except BaseException as e:  # incl. cancellation by a hedged request
+            self._record_failure(e)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return out
+
+    def _enter_breaker(self):
+        if not self.breaker.allow():
+            raise BackendUnavailableError(
+                f"LLM backend {self.backend_key} is unavailable (circuit open)"
+            )
+
+    def _record_failure(self, error: BaseException):
+        if isinstance(error, Exception) and is_backend_failure(error):
+            self.breaker.record_failure()
         else:
-            return self._generate_local(prompt, system)
+            self.breaker.release_trial()
+
+    def _cloud_request(
+        self, prompt: str, system: str = ""
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        chat.completions kwargs for Cloud LLM (shared by sync/async) and the
+        tokens to reserve with the limiter (prompt + max_tokens)
+        """
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+
+        # 🔧 Token budget from the model's context profile (see llm_tokens.py)
+        prompt_tokens = count_message_tokens(messages, self.model)
+        max_tokens = self.profile.output_budget(prompt_tokens, self.tokenizer)
+
+        # 调试日志
+        print(f" Token budget ({self.tokenizer.name}):")
+        print(f"   - 输入: {prompt_tokens} tokens")
+        print(f"   - 使用max_tokens: {max_tokens}")
+        print(
+            f"   - 预计总计: ~{prompt_tokens + max_tokens} / {self.profile.context_tokens}"
+        )
+
+        request = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+        }
+        return request, prompt_tokens + max_tokens
+
+    def _local_payload(
+        self, prompt: str, system: str = ""
+    ) -> Tuple[Dict[str, Any], int]:
+        """Ollama /api/generate payload (shared by sync/async) + tokens to reserve"""
+        prompt_tokens = self.count_tokens(system) + self.count_tokens(prompt)
+        num_predict = self.profile.output_budget(prompt_tokens, self.tokenizer)
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "system": system,
+            "stream": False,
+            "format": "json",
+            "options": {
+                "temperature": 0.0,
+                "top_p": 0.9,
+                # Ollama silently truncates prompts beyond num_ctx (default 2048)
+                "num_ctx": self.profile.context_tokens,
+                "num_predict": num_predict,
+            },
+        }
+        return payload, prompt_tokens + num_predict
 
     def _generate_cloud(self, prompt: str, system: str = "") -> str:
         """Generate using Cloud LLM (OpenAI format)"""
+        request, reserve = self._cloud_request(prompt, system)
         try:
-            messages = []
-            if system:
-                messages.append({"role": "system", "content": system})
-            messages.append({"role": "user", "content": prompt})
-
-            # 🔧 Token估算（保守）
-            input_tokens_estimate = len(prompt.split()) * 2.0
-
-            # 计算可用空间（留200 tokens安全缓冲）
-            available_space = 4096 - int(input_tokens_estimate) - 200
-
-            # 设置max_tokens：最少300，最多1500
-            max_tokens = max(300, min(1500, available_space))
-
-            # 如果可用空间太小，使用最小值
-            if available_space < 300:
-                max_tokens = 300
-                print("⚠️  Warning: Very limited output space")
-
-            # 调试日志
-            print(f" Token估算:")
-            print(f"   - 输入估算: ~{int(input_tokens_estimate)} tokens")
-            print(f"   - 可用空间: ~{available_space} tokens")
-            print(f"   - 使用max_tokens: {max_tokens}")
-            print(f"   - 预计总计: ~{int(input_tokens_estimate) + max_tokens} / 4096")
-
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.7,
+            response = self.limiter.call(
+                lambda: self.client.chat.completions.create(**request), reserve
             )
 
             content = response.choices[0].message.content
             return content.strip()
 
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             print(f" Cloud LLM error: {e}")
-            raise RuntimeError(f"Cloud LLM call failed: {e}")
+            raise RuntimeError(f"Cloud LLM call failed: {e}") from e
+
+    async def _agenerate_cloud(self, prompt: str, system: str = "") -> str:
+        """Generate using Cloud LLM (AsyncOpenAI)"""
+        request, reserve = self._cloud_request(prompt, system)
+        try:
+            response = await self.limiter.acall(
+                lambda: self.async_client.chat.completions.create(**request), reserve
+            )
+
+            content = response.choices[0].message.content
+            return content.strip()
+
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            print(f" Cloud LLM error: {e}")
+            raise RuntimeError(f"Cloud LLM call failed: {e}") from e
 
     def _generate_local(self, prompt: str, system: str = "") -> str:
-        """Generate using Local Ollama (original logic)"""
-        import requests
+        """Generate using Local Ollama (pooled keep-alive connection)"""
+        url = f"{self.host}/api/generate"
+        payload, reserve = self._local_payload(prompt, system)
+
+        client = get_http_client(self.host, timeout=600, trust_env=False)
 
+        def send() -> Dict[str, Any]:
+            r = client.post(url, json=payload)
+            r.raise_for_status()
+            return r.json()
+
+        data = self.limiter.call(send, reserve)
+        resp = (data.get("response") or "").strip()
+        return resp
+
+    async def _agenerate_local(self, prompt: str, system: str = "") -> str:
+        """Generate using Local Ollama (pooled httpx.AsyncClient)"""
         url = f"{self.host}/api/generate"
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "system": system,
-            "stream": False,
-            "format": "json",
-            "options": {"temperature": 0.0, "top_p": 0.9},
-        }
+        payload, reserve = self._local_payload(prompt, system)
+
+        client = get_async_http_client(self.host, timeout=600, trust_env=False)
 
-        with requests.Session() as s:
-            s.trust_env = False
-            r = s.post(url, json=payload, timeout=600)
+        async def send() -> Dict[str, Any]:
+            r = await client.post(url, json=payload)
+            r.raise_for_status()
+            return r.json()
 
-        r.raise_for_status()
-        resp = (r.json().get("response") or "").strip()
+        data = await self.limiter.acall(send, reserve)
+        resp = (data.get("response") or "").strip()
         return resp
 
 
@@ -651,6 +543,150 @@ class OllamaClient(LLMClient):
         super().__init__(llm_type="local", model=model, host=host)
 
 
+class FailoverLLM:
+    """
+    LLMClient-compatible client over several backends, in order of
+    preference (e.g. cloud vLLM → local Ollama)
+
+    A call goes to the first backend whose circuit is not open and moves on
+    to the next one if it fails. With hedge=True (LLM_HEDGE=1), an async call
+    still running after the primary's p95 latency is duplicated on the next
+    backend and the first answer wins.
+
+    Chunking uses the smallest context window of all backends, so any of
+    them can take any chunk. `degraded` is set once a call was served by a
+    fallback backend (seed results are then not cached).
+    """
+
+    def __init__(self, backends: List[LLMClient], hedge: Optional[bool] = None):
+        if not backends:
+            raise ValueError("FailoverLLM needs at least one backend")
+        self.backends = backends
+        self.primary = backends[0]
+        self.llm_type = self.primary.llm_type
+        self.model = self.primary.model
+        self.host = self.primary.host
+        self.max_inflight = self.primary.max_inflight
+        if hedge is None:
+            hedge = os.getenv("LLM_HEDGE", "0") == "1"
+        self.hedge = hedge and len(backends) > 1
+        self.degraded = False
+
+    @property
+    def profile(self) -> ModelProfile:
+        return min((b.profile for b in self.backends), key=lambda p: p.context_tokens)
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self.primary.tokenizer
+
+    def count_tokens(self, text: str) -> int:
+        return self.primary.count_tokens(text)
+
+    def _candidates(self) -> List[LLMClient]:
+        healthy = [b for b in self.backends if b.breaker.available]
+        # every circuit open: fail fast with BackendUnavailableError
+        return healthy or self.backends[:1]
+
+    def _served_by(self, backend: LLMClient):
+        if backend is not self.primary and not self.degraded:
+            self.degraded = True
+            print(f" Failover: served by {backend.backend_key}")
+
+    def generate(self, prompt: str, system: str = "") -> str:
+        errors = []
+        for backend in self._candidates():
+            try:
+                out = backend.generate(prompt, system)
+            except Exception as e:
+                errors.append(f"{backend.backend_key}: {e}")
+                print(f"⚠️  {backend.backend_key} failed ({e}), trying next backend")
+                continue
+            self._served_by(backend)
+            return out
+        raise RuntimeError("All LLM backends failed: " + "; ".join(errors))
+
+    async def agenerate(self, prompt: str, system: str = "") -> str:
+        candidates = self._candidates()
+        errors = []
+        start = 0
+        if self.hedge and len(candidates) > 1:
+            delay = candidates[0].breaker.p95()
+            if delay is not None:
+                try:
+                    return await self._ahedged(candidates[:2], prompt, system, delay)
+                except Exception as e:
+                    errors.append(str(e))
+                    start = 2
+        for backend in candidates[start:]:
+            try:
+                out = await backend.agenerate(prompt, system)
+            except Exception as e:
+                errors.append(f"{backend.backend_key}: {e}")
+                print(f"⚠️  {backend.backend_key} failed ({e}), trying next backend")
+                continue
+            self._served_by(backend)
+            return out
+        raise RuntimeError("All LLM backends failed: " + "; ".join(errors))
+
+    async def _ahedged(
+        self, pair: List[LLMClient], prompt: str, system: str, delay: float
+    ) -> str:
+        """
+        Primary first; after `delay` seconds the secondary races it. A
+        primary that fails before that hands over to the secondary at once.
+        """
+        primary, secondary = pair
+        first = asyncio.ensure_future(primary.agenerate(prompt, system))
+        tasks = {first: primary}
+        errors = []
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if first in done and first.exception() is not None:
+            e = first.exception()
+            errors.append(f"{primary.backend_key}: {e}")
+            print(f"⚠️  {primary.backend_key} failed ({e}), trying next backend")
+            del tasks[first]
+        elif not done:
+            print(f" Hedging after {delay:.1f}s (p95 of {primary.backend_key})")
+        if not done or errors:
+            second = asyncio.ensure_future(secondary.agenerate(prompt, system))
+            tasks[second] = secondary
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self._served_by(tasks[task])
+                        return task.result()
+                    errors.append(f"{tasks[task].backend_key}: {task.exception()}")
+        finally:
+            for task in pending:
+                task.cancel()
+        raise RuntimeError("; ".join(errors))
+
+
+def build_llm(
+    llm_type: Optional[str] = None,
+    model: Optional[str] = None,
+    host: Optional[str] = None,
+):
+    """
+    LLMClient for the configured backend; the cloud backend is wrapped in a
+    FailoverLLM with local Ollama as fallback (disable with LLM_FAILOVER=0)
+    """
+    llm = LLMClient(llm_type=llm_type, model=model, host=host)
+    if llm.llm_type != "cloud" or os.getenv("LLM_FAILOVER", "1") == "0":
+        return llm
+    fallback = OllamaClient(
+        model=os.getenv("LLM_FALLBACK_MODEL", "llama3.1:8b"),
+        host=os.getenv("LLM_FALLBACK_HOST", "http://127.0.0.1:11434"),
+    )
+    return FailoverLLM([llm, fallback])
+
+
 # prompts
 SYSTEM_PROMPT = (
     "Extract structured data from text. Return ONLY valid JSON. "
@@ -678,10 +714,11 @@ Rules:
 Return JSON only."""
 
 
-# chunk / json
+# chunking
 def chunk_text(text: str, chars: int = 2000) -> List[str]:
     """
-    Split text into chunks (default 2000 chars to fit 4096 token limit)
+    Split text into fixed-size character chunks (legacy helper; extraction
+    uses the token-aware llm_tokens.chunk_by_tokens)
     """
     out, i, n = [], 0, len(text)
     while i < n:
@@ -698,135 +735,340 @@ def chunk_text(text: str, chars: int = 2000) -> List[str]:
     return out or [""]
 
 
-def robust_loads(maybe_json: str) -> Dict[str, Any]:
+# progress(stage, info): optional hook used by the job queue to report
+# "extract_text" / "preprocess" / "llm_chunk" progress
+ProgressFn = Callable[[str, Dict[str, Any]], None]
+
+
+def _report(progress: Optional[ProgressFn], stage: str, **info):
+    if progress is None:
+        return
+    try:
+        progress(stage, info)
+    except Exception as e:  # a broken listener must not break extraction
+        print(f"⚠️  Progress callback failed ({stage}): {e}")
+
+
+def _chunk_prompts(text: str, llm: LLMClient) -> List[Dict[str, Any]]:
     """
-    Robust JSON parser with markdown cleanup and detailed debugging
+    Pack the text into as few prompts as fit the model's context: system
+    prompt + template + chunk + reserved answer tokens (see llm_tokens)
+
+    LLM_CHUNK_MODE=sections (default) packs whole sections found by
+    doc_analyzer.split_sections and tags each chunk with their ids;
+    LLM_CHUNK_MODE=tokens ignores the document structure.
+
+    Returns [{"prompt", "section_ids", "titles"}]
     """
-    # 调试：打印原始响应（前1000字符）
-    print("=" * 80)
-    print(" DEBUG: Raw LLM Response")
-    print("=" * 80)
-    print(maybe_json[:1000])
-    print("=" * 80)
+    overhead = count_message_tokens(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(text="")},
+        ],
+        llm.model,
+    )
+    budget = llm.profile.chunk_tokens(overhead, llm.tokenizer)
+    overlap = int(os.getenv("LLM_CHUNK_OVERLAP_TOKENS", "0"))
+    mode = os.getenv("LLM_CHUNK_MODE", "sections").strip().lower()
+    if mode == "tokens":
+        chunks = [
+            {"text": ck, "section_ids": [], "titles": []}
+            for ck in chunk_by_tokens(text, budget, llm.model, overlap_tokens=overlap)
+        ]
+    else:
+        sections = split_sections(text)
+        chunks = chunk_sections(sections, budget, llm.model, overlap_tokens=overlap)
+        print(f" Sections: {len(sections)} found")
+    print(
+        f" Chunking: {len(chunks)} chunk(s) of ≤{budget} tokens "
+        f"({llm.tokenizer.name}, {mode})"
+    )
+    for ck in chunks:
+        ck["prompt"] = USER_PROMPT_TEMPLATE.format(text=ck.pop("text"))
+    return chunks
 
-    # 尝试直接解析
-    try:
-        obj = json.loads(maybe_json)
-        if not isinstance(obj, dict):
-            raise ValueError("Top-level JSON must be an object")
-        print(" JSON parsed successfully (direct)")
-        return obj
-    except Exception as e:
-        print(f"⚠️  Direct JSON parse failed: {e}")
-        print("🔄 Trying cleanup...")
-
-    s = maybe_json.strip()
-
-    # 清理 markdown 代码块
-    if "```" in s:
-        print(" Removing markdown code fences...")
-        s = re.sub(r"^```(?:json)?\s*", "", s, flags=re.I)
-        s = re.sub(r"\s*```$", "", s)
-
-    # 提取 JSON 对象 { ... }
-    l = s.find("{")
-    r = s.rfind("}")
-    if l != -1 and r != -1 and r > l:
-        s2 = s[l : r + 1]
-        print(f" Extracted JSON from position {l} to {r}")
-        print(" Cleaned content:")
-        print(s2[:500])
-        print("=" * 80)
+
+def _section_location(chunk: Dict[str, Any]) -> str:
+    """Facet location of a chunk: 's3 Scope' for one section, 's3-s5' for several"""
+    ids = chunk.get("section_ids") or []
+    if not ids:
+        return ""
+    if len(ids) == 1:
+        titles = chunk.get("titles") or []
+        return f"{ids[0]} {titles[0]}" if titles else ids[0]
+    return f"{ids[0]}-{ids[-1]}"
+
+
+def _tag_sections(part: Dict[str, Any], chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Attribute a chunk result to the sections it was extracted from, so that
+    merge_maps keeps the attribution: facet items without a location get
+    the chunk's section ids
+    """
+    location = _section_location(chunk)
+    if not location or not isinstance(part, dict):
+        return part
+    facets = _norm_facets(part.get("facets", {}) or {})
+    for obj in facets.values():
+        for item in obj["items"]:
+            if not item["location"]:
+                item["location"] = location
+    part["facets"] = facets
+    return part
+
+
+def _chunk_retries() -> int:
+    return max(0, int(os.getenv("LLM_CHUNK_RETRIES", "2")))
+
+
+def _extract_chunk(llm: LLMClient, prompt: str, index: int) -> Dict[str, Any]:
+    """One chunk → parsed JSON, retrying LLM / JSON failures individually"""
+    retries = _chunk_retries()
+    for attempt in range(retries + 1):
         try:
-            obj = json.loads(s2)
-            if not isinstance(obj, dict):
-                raise ValueError("Top-level JSON must be an object")
-            print(" JSON parsed successfully (after cleanup)")
-            return obj
+            raw = llm.generate(prompt, system=SYSTEM_PROMPT)
+            return lenient_loads(raw)
+        except LLMOverloadedError:
+            raise  # already waited a full queue timeout
         except Exception as e:
-            print(f" Cleaned JSON parse failed: {e}")
-            print(f" Failed content (first 500 chars): {s2[:500]}")
+            if attempt >= retries:
+                raise
+            print(f"⚠️  Chunk {index} failed ({e}), retry {attempt + 1}/{retries}")
+            time.sleep(min(2**attempt, 8))
+
 
-    print("=" * 80)
-    print(" All parsing attempts failed")
-    print(f" Original content (first 1000 chars):")
-    print(maybe_json[:1000])
-    print("=" * 80)
-    raise ValueError("LLM did not return valid JSON")
+async def _aextract_chunk(llm: LLMClient, prompt: str, index: int) -> Dict[str, Any]:
+    retries = _chunk_retries()
+    for attempt in range(retries + 1):
+        try:
+            raw = await llm.agenerate(prompt, system=SYSTEM_PROMPT)
+            return lenient_loads(raw)
+        except LLMOverloadedError:
+            raise  # already waited a full queue timeout
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            print(f"⚠️  Chunk {index} failed ({e}), retry {attempt + 1}/{retries}")
+            await asyncio.sleep(min(2**attempt, 8))
 
 
 # !!!core function!!!
 def extract_seed_from_text(
-    text: str, llm: Optional[LLMClient] = None
+    text: str,
+    llm: Optional[LLMClient] = None,
+    max_workers: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+    until: Optional[Callable[[MetadataAccumulator], bool]] = None,
 ) -> Dict[str, Any]:
     """
     Extract seed data from text
 
+    Chunks are sent to the LLM concurrently (at most llm.max_inflight at a
+    time), each failed chunk is retried on its own, and every result is
+    folded into a MetadataAccumulator as soon as it parses (merged in chunk
+    order through its reorder buffer).
+
     Args:
         text: Input text (should be pre-processed summary)
         llm: LLM client (auto-selects local/cloud based on environment)
+        max_workers: Override the number of chunks in flight (1 = sequential)
+        progress: Called as progress("llm_chunk", {"done", "total", "partial"})
+            per chunk, "partial" being MetadataAccumulator.summary()
+        until: Early cutoff: checked after each chunk, once it returns True
+            the chunks not started yet are skipped
 
     Returns:
         Extracted structured data
     """
-    llm = llm or LLMClient()  # Auto-select LLM type
-    parts = []
+    llm = llm or build_llm()  # Auto-select LLM type (+ failover)
+    chunks = _chunk_prompts(text, llm)
+    workers = min(len(chunks), max_workers or llm.max_inflight)
+    acc = MetadataAccumulator()
+    tenant = current_tenant()  # pool threads do not inherit contextvars
+
+    def run(index: int, chunk: Dict[str, Any]):
+        with tenant_scope(tenant):
+            part = _extract_chunk(llm, chunk["prompt"], index)
+        acc.add(index, _tag_sections(part, chunk))
+        _report(
+            progress,
+            "llm_chunk",
+            done=acc.received,
+            total=len(chunks),
+            partial=acc.summary(),
+        )
 
-    # Process in chunks (each chunk ~2000 chars for 4K limit)
-    for ck in chunk_text(text, chars=2000):
-        limited_chunk = ck[:2000]
-        prompt = USER_PROMPT_TEMPLATE.format(text=limited_chunk)
-        raw = llm.generate(prompt, system=SYSTEM_PROMPT)
-        parts.append(robust_loads(raw))
+    def stop() -> bool:
+        if until is None or acc.received >= len(chunks) or not until(acc):
+            return False
+        print(f" Early cutoff after {acc.received}/{len(chunks)} chunks")
+        return True
+
+    if workers <= 1:
+        for i, ck in enumerate(chunks):
+            run(i, ck)
+            if stop():
+                break
+    else:
+        print(f" Dispatching {len(chunks)} chunks ({workers} in flight)...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run, i, ck) for i, ck in enumerate(chunks)]
+            try:
+                for fut in as_completed(futures):
+                    fut.result()
+                    if stop():
+                        break
+            finally:
+                for fut in futures:  # error / cutoff: drop chunks not started
+                    fut.cancel()
+
+    return acc.finish()
+
+
+async def aextract_seed_from_text(
+    text: str,
+    llm: Optional[LLMClient] = None,
+    progress: Optional[ProgressFn] = None,
+    until: Optional[Callable[[MetadataAccumulator], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Async version of extract_seed_from_text() (uses LLMClient.agenerate)
+    """
+    llm = llm or build_llm()
+    chunks = _chunk_prompts(text, llm)
+    acc = MetadataAccumulator()
+
+    async def run(index: int, chunk: Dict[str, Any]):
+        part = _tag_sections(await _aextract_chunk(llm, chunk["prompt"], index), chunk)
+        acc.add(index, part)
+        _report(
+            progress,
+            "llm_chunk",
+            done=acc.received,
+            total=len(chunks),
+            partial=acc.summary(),
+        )
 
-    out = merge_maps(parts)
-    return out
+    # all chunks start at once; the backend limiter bounds concurrency
+    tasks = [asyncio.ensure_future(run(i, ck)) for i, ck in enumerate(chunks)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            await fut
+            if until is not None and acc.received < len(chunks) and until(acc):
+                print(f" Early cutoff after {acc.received}/{len(chunks)} chunks")
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    return acc.finish()
+
+
+def _is_file(input_data: Union[str, pathlib.Path]) -> bool:
+    """Is input_data the path of an existing file (rather than raw text)?"""
+    if not isinstance(input_data, (str, pathlib.Path)):
+        return False
+    try:
+        return pathlib.Path(str(input_data)).is_file()
+    except (OSError, ValueError):  # long text / NUL bytes are not paths
+        return False
 
 
-def extract_seed(
-    input_data: Union[str, pathlib.Path],
-    model: Optional[str] = None,
-    host: Optional[str] = None,
-    llm_type: Optional[str] = None,
-) -> Dict[str, Any]:
+def _read_document(
+    input_data: Union[str, pathlib.Path], doc_hash: Optional[str] = None
+) -> Tuple[Union[bytes, str], Optional[pathlib.Path], str]:
     """
-    Extract seed data (main entry point) - WITH SMART PREPROCESSING
+    Read file/text, return (raw bytes or text, path, doc_hash)
 
-    This function now:
-    1. Preprocesses document locally (extracts title, keywords, structure)
-    2. Generates a summary (~800 chars)
-    3. Sends only the summary to Cloud LLM for enhancement
-    4. Merges local + LLM results
+    doc_hash: sha256 already computed by the caller (e.g. while streaming an
+    upload to disk), skips re-hashing
+    """
+    if _is_file(input_data):
+        path = pathlib.Path(str(input_data))
+        data = read_bytes(path)
+        return data, path, doc_hash or sha256_hex(data)
+    text = str(input_data)
+    return text, None, doc_hash or sha256_hex(text.encode("utf-8"))
 
-    Args:
-        input_data: Text or file path
-        model: Model name (optional, defaults to environment variable)
-        host: LLM server address (optional, defaults to environment variable)
-        llm_type: LLM type "local"/"cloud" (optional, defaults to environment variable)
+
+def _document_pages(
+    raw: Union[bytes, str], path: Optional[pathlib.Path]
+) -> Iterator[str]:
+    """Page stream for collect_document_pages (raw text is one page)"""
+    if path is None:
+        yield raw
+        return
+    yield from iter_document_pages(raw, filename=path.name, mime=guess_mime(path))
+
+
+def _read_pages(
+    raw: Union[bytes, str], path: Optional[pathlib.Path]
+) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    """
+    Extract only as many pages as preprocessing needs
 
     Returns:
-        Extracted structured data
+        (text, {"pages_read", "truncated"}, DocumentAnalyzer result of the
+        pages as they were read, so the text is analysed only once)
     """
-    # Read file/text
-    if (
-        isinstance(input_data, (str, pathlib.Path))
-        and pathlib.Path(str(input_data)).exists()
-    ):
-        path = pathlib.Path(str(input_data))
-        data = read_bytes(path)
-        text = extract_text_from_bytes(data, guess_mime(path), path.name)
-        doc_hash = sha256_hex(data)
-        del data
-    else:
-        text = str(input_data)
-        doc_hash = sha256_hex(text.encode("utf-8"))
+    analyzer = DocumentAnalyzer()
+    text, info = collect_document_pages(_document_pages(raw, path), analyzer=analyzer)
+    if info["truncated"]:
+        print(f" Early cutoff: read {info['pages_read']} pages ({len(text)} chars)")
+    return text, info, analyzer.result()
+
+
+# ============= Seed cache (content-addressed) =============
+
+# bump whenever SYSTEM_PROMPT / USER_PROMPT_TEMPLATE / preprocessing change,
+# so stale cache entries are no longer hit
+PROMPT_VERSION = "seed-v1"
+
 
+def _seed_cache_enabled(use_cache: Optional[bool]) -> bool:
+    if use_cache is not None:
+        return use_cache
+    return os.getenv("SEED_CACHE_ENABLED", "1") != "0"
+
+
+def _seed_cache_key(doc_hash: str, llm: LLMClient) -> str:
+    return make_key(doc_hash, llm.model, PROMPT_VERSION, llm.llm_type)
+
+
+def _seed_cache_hit(key: str) -> Optional[Dict[str, Any]]:
+    cached = get_cache("seed").get(key)
+    if cached is None:
+        return None
+    if os.getenv("SEED_ID_MODE", "random").lower() != "hash":
+        cached["doc_id"] = f"doc-{uuid.uuid4().hex[:16]}"
+    cached["_cache"] = {"hit": True, "key": key[:16]}
+    print(f" Seed cache hit ({key[:16]}), skipping preprocessing and LLM")
+    return cached
+
+
+def _seed_cache_store(key: str, metadata: Dict[str, Any], enabled: bool):
+    if enabled:
+        get_cache("seed").set(key, metadata)
+    metadata["_cache"] = {"hit": False, "key": key[:16]}
+
+
+def _preprocess_for_llm(
+    text: str, analysis: Dict[str, Any], page_info: Dict[str, Any]
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Step 1 of extract_seed: local smart preprocessing (NO LLM)
+
+    analysis: DocumentAnalyzer result from _read_pages (no second pass)
+
+    Returns:
+        (preprocessed info, compact prompt for the LLM)
+    """
     print(f"\n{'='*60}")
     print(f" Document Processing Pipeline (Smart Mode)")
     print(f"{'='*60}")
 
-    # 🔧 Step 1: Local smart preprocessing (NO LLM)
-    preprocessed = preprocess_document_smart(text, max_summary_chars=800)
+    print(f" Smart preprocessing: {len(text)} chars → extracting key info...")
+    preprocessed = _build_preprocessed(analysis, max_summary_chars=800)
+    preprocessed.update(page_info)
 
     print(f"\n Compression: {len(text)} → {preprocessed['summary_length']} chars")
     print(f"   Ratio: {preprocessed['compression_ratio']*100:.1f}%")
@@ -834,10 +1076,6 @@ def extract_seed(
         f"   Saved: ~{int((len(text) - preprocessed['summary_length']) * 0.7)} tokens\n"
     )
 
-    # 🔧 Step 2: Use LLM to enhance metadata (send only summary)
-    print(f"  Sending summary to Cloud LLM for enhancement...")
-    llm = LLMClient(llm_type=llm_type, model=model, host=host)
-
     # Construct compact prompt
     enhanced_prompt = f"""
 Based on this document summary, extract structured metadata:
@@ -851,11 +1089,13 @@ Pre-extracted info:
 
 Enhance and validate this information, return complete metadata JSON.
 """
+    return preprocessed, enhanced_prompt
 
-    # Call LLM (input is now very small)
-    llm_metadata = extract_seed_from_text(enhanced_prompt, llm=llm)
 
-    # 🔧 Step 3: Merge local extraction + LLM enhancement
+def _finalize_metadata(
+    preprocessed: Dict[str, Any], llm_metadata: Dict[str, Any], doc_hash: str
+) -> Dict[str, Any]:
+    """Step 3 of extract_seed: merge local extraction + LLM enhancement"""
     final_metadata = {
         **llm_metadata,
         "title": preprocessed["title"] or llm_metadata.get("title"),
@@ -870,6 +1110,8 @@ Enhance and validate this information, return complete metadata JSON.
             "original_length": preprocessed["original_length"],
             "processed_length": preprocessed["summary_length"],
             "compression_ratio": preprocessed["compression_ratio"],
+            "pages_read": preprocessed.get("pages_read"),
+            "truncated": preprocessed.get("truncated", False),
             "method": "smart_local_preprocessing",
         },
     }
@@ -887,6 +1129,574 @@ Enhance and validate this information, return complete metadata JSON.
     return final_metadata
 
 
+def extract_seed(
+    input_data: Union[str, pathlib.Path],
+    model: Optional[str] = None,
+    host: Optional[str] = None,
+    llm_type: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    progress: Optional[ProgressFn] = None,
+    doc_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Extract seed data (main entry point) - WITH SMART PREPROCESSING
+
+    This function now:
+    1. Preprocesses document locally (extracts title, keywords, structure)
+    2. Generates a summary (~800 chars)
+    3. Sends only the summary to Cloud LLM for enhancement
+    4. Merges local + LLM results
+
+    Results are cached by (document hash, model, PROMPT_VERSION, llm_type);
+    the returned metadata carries "_cache": {"hit": bool, "key": ...}.
+
+    Args:
+        input_data: Text or file path
+        model: Model name (optional, defaults to environment variable)
+        host: LLM server address (optional, defaults to environment variable)
+        llm_type: LLM type "local"/"cloud" (optional, defaults to environment variable)
+        use_cache: Read/write the seed cache (default: SEED_CACHE_ENABLED env)
+        progress: Optional progress(stage, info) callback, see ProgressFn
+        doc_hash: sha256 of the input if already known; a cache hit then
+            returns without reading the file at all
+
+    Returns:
+        Extracted structured data
+    """
+    raw = path = None
+    if doc_hash is None:
+        raw, path, doc_hash = _read_document(input_data)
+    llm = build_llm(llm_type=llm_type, model=model, host=host)
+
+    cache_on = _seed_cache_enabled(use_cache)
+    cache_key = _seed_cache_key(doc_hash, llm)
+    if cache_on:
+        cached = _seed_cache_hit(cache_key)
+        if cached is not None:
+            _report(progress, "cache_hit", key=cache_key[:16])
+            return cached
+
+    if raw is None:
+        raw, path, _ = _read_document(input_data, doc_hash)
+
+    _report(progress, "extract_text", status="started")
+    text, page_info, analysis = _read_pages(raw, path)
+    del raw
+    _report(progress, "extract_text", status="done", chars=len(text), **page_info)
+
+    # 🔧 Step 1: Local smart preprocessing (NO LLM)
+    _report(progress, "preprocess", status="started")
+    preprocessed, enhanced_prompt = _preprocess_for_llm(text, analysis, page_info)
+    _report(progress, "preprocess", status="done")
+
+    # 🔧 Step 2: Use LLM to enhance metadata (send only summary)
+    print(f"  Sending summary to Cloud LLM for enhancement...")
+
+    # Call LLM (input is now very small)
+    llm_metadata = extract_seed_from_text(enhanced_prompt, llm=llm, progress=progress)
+
+    # 🔧 Step 3: Merge local extraction + LLM enhancement
+    final_metadata = _finalize_metadata(preprocessed, llm_metadata, doc_hash)
+    # answers from a fallback backend are not cached under the primary's key
+    cache_on = cache_on and not getattr(llm, "degraded", False)
+    _seed_cache_store(cache_key, final_metadata, cache_on)
+    return final_metadata
+
+
+async def aextract_seed(
+    input_data: Union[str, pathlib.Path],
+    model: Optional[str] = None,
+    host: Optional[str] = None,
+    llm_type: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    progress: Optional[ProgressFn] = None,
+    doc_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Async version of extract_seed() for the API server
+
+    File reading / parsing / preprocessing / cache I/O run in a worker thread
+    and the LLM call uses LLMClient.agenerate, so the event loop is never
+    blocked.
+    """
+    raw = path = None
+    if doc_hash is None:
+        raw, path, doc_hash = await asyncio.to_thread(_read_document, input_data)
+    llm = build_llm(llm_type=llm_type, model=model, host=host)
+
+    cache_on = _seed_cache_enabled(use_cache)
+    cache_key = _seed_cache_key(doc_hash, llm)
+    if cache_on:
+        cached = await asyncio.to_thread(_seed_cache_hit, cache_key)
+        if cached is not None:
+            _report(progress, "cache_hit", key=cache_key[:16])
+            return cached
+
+    if raw is None:
+        raw, path, _ = await asyncio.to_thread(_read_document, input_data, doc_hash)
+
+    _report(progress, "extract_text", status="started")
+    text, page_info, analysis = await asyncio.to_thread(_read_pages, raw, path)
+    del raw
+    _report(progress, "extract_text", status="done", chars=len(text), **page_info)
+
+    _report(progress, "preprocess", status="started")
+    # summary building only: the analysis already happened while reading
+    preprocessed, enhanced_prompt = _preprocess_for_llm(text, analysis, page_info)
+    _report(progress, "preprocess", status="done")
+
+    print(f"  Sending summary to Cloud LLM for enhancement...")
+    llm_metadata = await aextract_seed_from_text(
+        enhanced_prompt, llm=llm, progress=progress
+    )
+
+    final_metadata = _finalize_metadata(preprocessed, llm_metadata, doc_hash)
+    cache_on = cache_on and not getattr(llm, "degraded", False)
+    await asyncio.to_thread(_seed_cache_store, cache_key, final_metadata, cache_on)
+    return final_metadata
+
+
+# ============= Batch extraction =============
+
+BATCH_PROMPT_TEMPLATE = """Return ONLY valid JSON. NO markdown.
+
+Extract metadata from each of these {count} documents separately:
+
+{documents}
+
+Required JSON structure, one entry per document id:
+{{
+  "documents": {{
+    "d1": {{
+      "title": null, "subject": null, "keywords": [], "entities": [],
+      "facets": {{}}, "industry": []
+    }}
+  }}
+}}
+
+Rules:
+- One entry for EVERY document id, never mix information between documents
+- facets: topic groups. Each item has "value", "evidence" (max 15 words), "confidence" (0-1)
+- ALL text in English
+- If unknown: null or []
+- NO verbatim quotes
+
+Return JSON only."""
+
+# a batch input: text, file path, or {"input", "name"?, "doc_hash"?}
+BatchInput = Union[str, pathlib.Path, Dict[str, Any]]
+
+
+def _batch_item(index: int, item: BatchInput) -> Dict[str, Any]:
+    if isinstance(item, dict):
+        doc = {
+            "input": item["input"],
+            "name": item.get("name"),
+            "doc_hash": item.get("doc_hash"),
+        }
+    else:
+        doc = {"input": item, "name": None, "doc_hash": None}
+    if not doc["name"]:
+        is_file = _is_file(doc["input"])
+        doc["name"] = pathlib.Path(str(doc["input"])).name if is_file else f"text-{index}"
+    doc["index"] = index
+    return doc
+
+
+def _input_hash(input_data: Union[str, pathlib.Path]) -> str:
+    """sha256 like _read_document, but streams files instead of keeping them"""
+    if _is_file(input_data):
+        h = hashlib.sha256()
+        with open(input_data, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+    return sha256_hex(str(input_data).encode("utf-8"))
+
+
+def _dedup_batch(
+    docs: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """First document per content hash, and hash → later copies"""
+    unique, copies = [], {}
+    for doc in docs:
+        if doc["doc_hash"] in copies:
+            copies[doc["doc_hash"]].append(doc)
+        else:
+            copies[doc["doc_hash"]] = []
+            unique.append(doc)
+    return unique, copies
+
+
+def _prepare_batch_doc(
+    doc: Dict[str, Any], llm: LLMClient, cache_on: bool
+) -> Dict[str, Any]:
+    """Cache lookup, text extraction and preprocessing of one batch document"""
+    doc["cache_key"] = _seed_cache_key(doc["doc_hash"], llm)
+    if cache_on:
+        cached = _seed_cache_hit(doc["cache_key"])
+        if cached is not None:
+            doc["metadata"] = cached
+            return doc
+    raw, path, _ = _read_document(doc["input"], doc["doc_hash"])
+    text, page_info, analysis = _read_pages(raw, path)
+    del raw
+    preprocessed, prompt = _preprocess_for_llm(text, analysis, page_info)
+    doc["preprocessed"], doc["prompt"] = preprocessed, prompt
+    doc["prompt_tokens"] = llm.count_tokens(prompt)
+    return doc
+
+
+class _BatchPacker:
+    """
+    Groups the summaries of small documents into shared LLM calls
+
+    A pack holds at most SEED_BATCH_DOCS_PER_CALL documents (default 6) and
+    no more than max_output_tokens // SEED_BATCH_ANSWER_TOKENS, so every
+    document still gets ~SEED_BATCH_ANSWER_TOKENS (default 350) of answer;
+    the summaries must fit the rest of the context window. Documents larger
+    than half of that room are sent on their own.
+    """
+
+    def __init__(self, llm: LLMClient):
+        profile = llm.profile
+        answer = max(1, int(os.getenv("SEED_BATCH_ANSWER_TOKENS", "350")))
+        self.max_docs = max(
+            1,
+            min(
+                int(os.getenv("SEED_BATCH_DOCS_PER_CALL", "6")),
+                profile.max_output_tokens // answer,
+            ),
+        )
+        overhead = count_message_tokens(
+            [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": BATCH_PROMPT_TEMPLATE.format(count=0, documents=""),
+                },
+            ],
+            llm.model,
+        )
+        room = profile.context_tokens - self.max_docs * answer - profile.safety_margin
+        if not llm.tokenizer.exact:
+            room = room * 10 // 11  # margin() adds prompt // 10
+        self.room = room - overhead
+        self.pack: List[Dict[str, Any]] = []
+        self.tokens = 0
+
+    def add(self, doc: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """Returns the packs that are ready to send"""
+        cost = doc["prompt_tokens"] + 16  # <document> tags
+        if self.max_docs == 1 or cost > self.room // 2:
+            return [[doc]]
+        ready = []
+        if self.tokens + cost > self.room:
+            ready = self.flush()
+        self.pack.append(doc)
+        self.tokens += cost
+        if len(self.pack) >= self.max_docs:
+            ready += self.flush()
+        return ready
+
+    def flush(self) -> List[List[Dict[str, Any]]]:
+        pack, self.pack, self.tokens = self.pack, [], 0
+        return [pack] if pack else []
+
+
+def _pack_prompt(pack: List[Dict[str, Any]]) -> str:
+    blocks = [
+        f'<document id="d{i}">\n{doc["prompt"].strip()}\n</document>'
+        for i, doc in enumerate(pack, 1)
+    ]
+    return BATCH_PROMPT_TEMPLATE.format(count=len(pack), documents="\n\n".join(blocks))
+
+
+def _pack_answers(
+    pack: List[Dict[str, Any]], data: Dict[str, Any]
+) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Split a pack answer into (doc, llm_metadata) pairs and unanswered docs"""
+    answers = data.get("documents") if isinstance(data, dict) else None
+    if not isinstance(answers, dict):
+        answers = {}
+    answered, missing = [], []
+    for i, doc in enumerate(pack, 1):
+        part = answers.get(f"d{i}")
+        if isinstance(part, dict) and part:
+            answered.append((doc, merge_maps([part])))
+        else:
+            missing.append(doc)
+    return answered, missing
+
+
+def _finish_batch_doc(
+    doc: Dict[str, Any],
+    llm: LLMClient,
+    llm_metadata: Dict[str, Any],
+    cache_on: bool,
+    packed: int,
+) -> Dict[str, Any]:
+    final_metadata = _finalize_metadata(
+        doc["preprocessed"], llm_metadata, doc["doc_hash"]
+    )
+    cache_on = cache_on and not getattr(llm, "degraded", False)
+    _seed_cache_store(doc["cache_key"], final_metadata, cache_on)
+    doc["metadata"], doc["packed"] = final_metadata, packed
+    return doc
+
+
+def _batch_failed(doc: Dict[str, Any], error: BaseException) -> Dict[str, Any]:
+    print(f" Batch document {doc['name']} failed: {error}")
+    doc["error"] = str(error) or type(error).__name__
+    return doc
+
+
+def _extract_pack(
+    llm: LLMClient, pack: List[Dict[str, Any]], cache_on: bool
+) -> List[Dict[str, Any]]:
+    """
+    One shared LLM call for the pack; documents missing from the answer (or
+    all of them, if the answer is unusable) are retried one by one
+    """
+    answered, missing = [], pack
+    if len(pack) > 1:
+        print(f"  Sending {len(pack)} document summaries in one LLM call...")
+        try:
+            data = _extract_chunk(llm, _pack_prompt(pack), 0)
+            answered, missing = _pack_answers(pack, data)
+        except LLMOverloadedError as e:
+            return [_batch_failed(doc, e) for doc in pack]
+        except Exception as e:
+            print(f"⚠️  Packed call failed ({e}), extracting documents one by one")
+    out = []
+    for doc, md in answered + [(doc, None) for doc in missing]:
+        try:
+            if md is None:
+                md = extract_seed_from_text(doc["prompt"], llm=llm, max_workers=1)
+                packed = 1
+            else:
+                packed = len(pack)
+            out.append(_finish_batch_doc(doc, llm, md, cache_on, packed))
+        except Exception as e:
+            out.append(_batch_failed(doc, e))
+    return out
+
+
+async def _aextract_pack(
+    llm: LLMClient, pack: List[Dict[str, Any]], cache_on: bool
+) -> List[Dict[str, Any]]:
+    answered, missing = [], pack
+    if len(pack) > 1:
+        print(f"  Sending {len(pack)} document summaries in one LLM call...")
+        try:
+            data = await _aextract_chunk(llm, _pack_prompt(pack), 0)
+            answered, missing = _pack_answers(pack, data)
+        except LLMOverloadedError as e:
+            return [_batch_failed(doc, e) for doc in pack]
+        except Exception as e:
+            print(f"⚠️  Packed call failed ({e}), extracting documents one by one")
+
+    async def finish(doc, md):
+        try:
+            packed = len(pack)
+            if md is None:
+                md = await aextract_seed_from_text(doc["prompt"], llm=llm)
+                packed = 1
+            return await asyncio.to_thread(
+                _finish_batch_doc, doc, llm, md, cache_on, packed
+            )
+        except Exception as e:
+            return _batch_failed(doc, e)
+
+    pairs = answered + [(doc, None) for doc in missing]
+    return list(await asyncio.gather(*(finish(doc, md) for doc, md in pairs)))
+
+
+def _batch_results(
+    doc: Dict[str, Any], copies: Dict[str, List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Result of a finished document, plus one per duplicate upload of it"""
+    result = {
+        "index": doc["index"],
+        "name": doc["name"],
+        "doc_hash": doc["doc_hash"],
+        "status": "error" if "error" in doc else "done",
+        "duplicate_of": None,
+    }
+    if "error" in doc:
+        result["error"] = doc["error"]
+    else:
+        result["metadata"] = doc["metadata"]
+        result["packed"] = doc.get("packed", 0)  # 0: cache hit, no LLM call
+    results = [result]
+    for copy in copies.get(doc["doc_hash"], []):
+        dup = {**result, "index": copy["index"], "name": copy["name"]}
+        dup["duplicate_of"] = doc["index"]
+        if "metadata" in result:
+            dup["metadata"] = json.loads(json.dumps(result["metadata"], default=str))
+        results.append(dup)
+    return results
+
+
+def _batch_workers(max_workers: Optional[int]) -> int:
+    return max(1, max_workers or int(os.getenv("SEED_BATCH_WORKERS", "4")))
+
+
+def extract_seed_batch(
+    inputs: Iterable[BatchInput],
+    model: Optional[str] = None,
+    host: Optional[str] = None,
+    llm_type: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Extract seed data for many documents, yielding each result as soon as
+    it is ready (not in input order)
+
+    - documents are deduplicated by content hash: a copy is reported with
+      "duplicate_of" = index of the document that was processed
+    - cache lookup, text extraction and preprocessing run on max_workers
+      threads (default SEED_BATCH_WORKERS=4)
+    - summaries of small documents share one LLM call (see _BatchPacker);
+      at most llm.max_inflight calls run at a time
+
+    Args:
+        inputs: texts, file paths or {"input", "name", "doc_hash"} dicts
+        model / host / llm_type / use_cache: as for extract_seed()
+        max_workers: preprocessing threads
+
+    Yields:
+        {"index", "name", "doc_hash", "status": "done"|"error",
+         "duplicate_of", "metadata" | "error", "packed"}
+    """
+    llm = build_llm(llm_type=llm_type, model=model, host=host)
+    cache_on = _seed_cache_enabled(use_cache)
+    docs = [_batch_item(i, item) for i, item in enumerate(inputs)]
+    workers = _batch_workers(max_workers)
+    tenant = current_tenant()  # pool threads do not inherit contextvars
+
+    def call(pack):
+        with tenant_scope(tenant):
+            return _extract_pack(llm, pack, cache_on)
+
+    with ThreadPoolExecutor(max_workers=workers) as prep, ThreadPoolExecutor(
+        max_workers=llm.max_inflight
+    ) as calls:
+        for doc, h in zip(
+            docs, prep.map(lambda d: d["doc_hash"] or _input_hash(d["input"]), docs)
+        ):
+            doc["doc_hash"] = h
+        unique, copies = _dedup_batch(docs)
+        print(f" Batch: {len(docs)} document(s), {len(unique)} unique")
+
+        packer = _BatchPacker(llm)
+        pending = {
+            prep.submit(_prepare_batch_doc, doc, llm, cache_on): doc for doc in unique
+        }
+        running = set()
+        try:
+            while pending or running:
+                done, _ = wait(set(pending) | running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut in running:
+                        running.discard(fut)
+                        for doc in fut.result():
+                            yield from _batch_results(doc, copies)
+                        continue
+                    doc = pending.pop(fut)
+                    if fut.exception() is not None:
+                        _batch_failed(doc, fut.exception())
+                    if "metadata" in doc or "error" in doc:
+                        yield from _batch_results(doc, copies)
+                        continue
+                    for pack in packer.add(doc):
+                        running.add(calls.submit(call, pack))
+                # send a partial pack once preprocessing is over or the LLM is idle
+                if not pending or not running:
+                    for pack in packer.flush():
+                        running.add(calls.submit(call, pack))
+        finally:
+            # consumer stopped early: drop the work that has not started yet
+            for fut in list(pending) + list(running):
+                fut.cancel()
+
+
+async def aextract_seed_batch(
+    inputs: Iterable[BatchInput],
+    model: Optional[str] = None,
+    host: Optional[str] = None,
+    llm_type: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async version of extract_seed_batch() for the API server
+
+    Closing the generator early (e.g. the client disconnected) cancels the
+    remaining work.
+    """
+    llm = build_llm(llm_type=llm_type, model=model, host=host)
+    cache_on = _seed_cache_enabled(use_cache)
+    docs = [_batch_item(i, item) for i, item in enumerate(inputs)]
+    threads = asyncio.Semaphore(_batch_workers(max_workers))
+
+    async def in_thread(fn, *args):
+        async with threads:
+            return await asyncio.to_thread(fn, *args)
+
+    hashes = await asyncio.gather(
+        *(
+            in_thread(_input_hash, doc["input"])
+            for doc in docs
+            if not doc["doc_hash"]
+        )
+    )
+    for doc, h in zip([d for d in docs if not d["doc_hash"]], hashes):
+        doc["doc_hash"] = h
+    unique, copies = _dedup_batch(docs)
+    print(f" Batch: {len(docs)} document(s), {len(unique)} unique")
+
+    packer = _BatchPacker(llm)
+    queued: List[List[Dict[str, Any]]] = []
+    pending = {
+        asyncio.ensure_future(in_thread(_prepare_batch_doc, doc, llm, cache_on)): doc
+        for doc in unique
+    }
+    running = set()
+    try:
+        while pending or running:
+            done, _ = await asyncio.wait(
+                set(pending) | running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task in running:
+                    running.discard(task)
+                    for doc in task.result():
+                        for result in _batch_results(doc, copies):
+                            yield result
+                    continue
+                doc = pending.pop(task)
+                if task.exception() is not None:
+                    _batch_failed(doc, task.exception())
+                if "metadata" in doc or "error" in doc:
+                    for result in _batch_results(doc, copies):
+                        yield result
+                    continue
+                queued += packer.add(doc)
+            if not pending or not (running or queued):
+                queued += packer.flush()
+            # at most max_inflight packs in flight, so none waits out the
+            # limiter's queue timeout behind the others
+            while queued and len(running) < llm.max_inflight:
+                running.add(
+                    asyncio.ensure_future(_aextract_pack(llm, queued.pop(0), cache_on))
+                )
+    finally:
+        for task in list(pending) + list(running):
+            task.cancel()
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -902,6 +1712,7 @@ if __name__ == "__main__":
         default=None,
         help="LLM type: local (Ollama) or cloud (GCP)",
     )
+    ap.add_argument("--no-cache", action="store_true", help="bypass the seed cache")
     args = ap.parse_args()
 
     if pathlib.Path(args.input).exists():
@@ -909,5 +1720,11 @@ if __name__ == "__main__":
     else:
         inp = args.input
 
-    out = extract_seed(inp, model=args.model, host=args.host, llm_type=args.llm_type)
+    out = extract_seed(
+        inp,
+        model=args.model,
+        host=args.host,
+        llm_type=args.llm_type,
+        use_cache=False if args.no_cache else None,
+    )
     print(json.dumps(out, ensure_ascii=False, indent=2))
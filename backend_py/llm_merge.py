@@ -0,0 +1,341 @@
+"""
+Merging of per-chunk extraction results (the open metadata schema)
+
+merge_maps used to json.dumps(v, sort_keys=True) every element of every list
+slot again for each merge, concatenate with sum(..., []) (quadratic in the
+number of chunks) and only cut to the slot caps (triples 500, tags 300, ...)
+after deduplicating everything.
+
+MetadataMerger folds one chunk result at a time:
+
+- each item gets its canonical key exactly once: strings are their own key,
+  other values are serialized with orjson (sorted keys) when available;
+  facet items are keyed by the (value, evidence, location) tuple
+- slots are plain lists + seen-sets, extended in linear time
+- a slot that reached its cap skips further items without serializing them
+
+MetadataAccumulator wraps it for parallel chunk extraction: results are
+folded as soon as they parse, through a reorder buffer that keeps chunk
+order.
+
+The result is the same as the old merge_maps: first non-empty scalar wins,
+lists keep the first occurrence of every item, the longest facet summary
+wins and "extra" dicts are updated in order.
+"""
+
+from __future__ import annotations
+import json
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+try:  # optional, see llm_json
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# schema
+A_FIXED = {
+    "doc_id": None,
+    "title": None,
+    "subject": None,
+    "author": None,
+    "created_at": None,
+    "jurisdiction": [],
+    "industry": [],
+    "confidentiality": None,
+    "version": None,
+    "language": None,
+    "keywords": [],
+    "entities": [],
+}
+B_MINIMUM = {
+    "facets": {},
+    "sections": [],
+    "triples": [],
+    "key_values": [],
+    "tags": [],
+    "questions": [],
+    "risks": [],
+    "actions_todo": [],
+    "metrics": [],
+    "tables": [],
+    "figures": [],
+    "extra": {},
+}
+
+# list slot → max items kept after merging
+FIXED_LIST_CAP = 50
+LIST_CAPS = {
+    "sections": 200,
+    "triples": 500,
+    "key_values": 500,
+    "tags": 300,
+    "questions": 300,
+    "risks": 300,
+    "actions_todo": 300,
+    "metrics": 300,
+    "tables": 300,
+    "figures": 300,
+}
+FACET_ITEMS_CAP = 200
+FACET_SUMMARY_CHARS = 2000
+
+
+def ensure_open_schema(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in A_FIXED.items():
+        out[k] = parsed.get(k, v)
+    for k, v in B_MINIMUM.items():
+        out[k] = parsed.get(k, v)
+    for k, v in parsed.items():
+        if k not in out:
+            out[k] = v
+    return out
+
+
+def canonical_key(value: Any) -> Hashable:
+    """Hashable identity of a JSON value (dict key order does not matter)"""
+    if isinstance(value, str):
+        return value
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass  # non-str dict keys, big ints, ...
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode()
+
+
+def dedup_list(values: List[Any]) -> List[Any]:
+    seen, out = set(), []
+    for v in values:
+        key = canonical_key(v)
+        if key not in seen:
+            seen.add(key)
+            out.append(v)
+    return out
+
+
+def _as_list(x):
+    if x is None:
+        return []
+    if isinstance(x, list):
+        return x
+    return [x]
+
+
+def _norm_facet_item(it):
+    if isinstance(it, dict):
+        val = str(it.get("value", it.get("text", it.get("name", "")))).strip()
+        ev = str(it.get("evidence", "")).strip()[:200]
+        loc = str(it.get("location", "")).strip()
+        try:
+            conf = float(it.get("confidence", it.get("score", 0.5)))
+        except Exception:
+            conf = 0.5
+        return {
+            "value": val,
+            "evidence": ev,
+            "location": loc,
+            "confidence": max(0.0, min(1.0, conf)),
+        }
+    return {"value": str(it), "evidence": "", "location": "", "confidence": 0.5}
+
+
+def _norm_facets(facets_obj):
+    out = {}
+    if isinstance(facets_obj, list) or isinstance(facets_obj, str):
+        items = [_norm_facet_item(x) for x in _as_list(facets_obj)]
+        out["misc"] = {"summary": "", "items": items}
+        return out
+    if not isinstance(facets_obj, dict):
+        return {}
+    for name, obj in facets_obj.items():
+        if isinstance(obj, dict):
+            summary = str(obj.get("summary", ""))
+            items = [_norm_facet_item(x) for x in _as_list(obj.get("items", []))]
+        elif isinstance(obj, list):
+            summary = ""
+            items = [_norm_facet_item(x) for x in obj]
+        else:
+            summary = ""
+            items = [_norm_facet_item(obj)]
+        out[name] = {"summary": summary, "items": items}
+    return out
+
+
+def _facet_item_key(it: Dict[str, Any]) -> Hashable:
+    return (it.get("value", ""), it.get("evidence", ""), it.get("location", ""))
+
+
+def _dedup_items(items):
+    seen, out = set(), []
+    for it in items:
+        key = _facet_item_key(it)
+        if key not in seen:
+            seen.add(key)
+            out.append(it)
+    return out
+
+
+class _Slot:
+    """Deduplicated, capped list"""
+
+    __slots__ = ("cap", "items", "seen")
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.items: List[Any] = []
+        self.seen: Set[Hashable] = set()
+
+    def extend(self, values, key=canonical_key):
+        for v in values:
+            if len(self.items) >= self.cap:
+                return
+            k = key(v)
+            if k not in self.seen:
+                self.seen.add(k)
+                self.items.append(v)
+
+
+class MetadataMerger:
+    """
+    Incremental merge_maps: add() chunk results in chunk order, result()
+    at any time
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._scalars: Dict[str, Any] = {}
+        self._lists: Dict[str, _Slot] = {}
+        for k, v in A_FIXED.items():
+            if isinstance(v, list):
+                self._lists[k] = _Slot(FIXED_LIST_CAP)
+        for k, cap in LIST_CAPS.items():
+            self._lists[k] = _Slot(cap)
+        self._facets: Dict[str, Dict[str, Any]] = {}
+        self._extra: Dict[str, Any] = {}
+
+    def add(self, result: Optional[Dict[str, Any]]):
+        if not isinstance(result, dict):
+            return
+        self.count += 1
+        for k, v in A_FIXED.items():
+            if v is None and k not in self._scalars:
+                value = result.get(k)
+                if value not in (None, "", "unknown"):
+                    self._scalars[k] = value
+        for k, slot in self._lists.items():
+            if len(slot.items) < slot.cap:
+                slot.extend(_as_list(result.get(k)))
+
+        for name, obj in _norm_facets(result.get("facets") or {}).items():
+            tgt = self._facets.get(name)
+            if tgt is None:
+                tgt = self._facets[name] = {
+                    "summary": "",
+                    "items": _Slot(FACET_ITEMS_CAP),
+                }
+            summary = obj.get("summary", "") or ""
+            if len(summary) > len(tgt["summary"]):
+                tgt["summary"] = summary[:FACET_SUMMARY_CHARS]
+            tgt["items"].extend(obj.get("items", []), key=_facet_item_key)
+
+        extra = result.get("extra") or {}
+        if isinstance(extra, dict):
+            self._extra.update(extra)
+
+    def result(self) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {}
+        for k, v in A_FIXED.items():
+            if isinstance(v, list):
+                merged[k] = list(self._lists[k].items)
+            else:
+                merged[k] = self._scalars.get(k)
+        merged["facets"] = {
+            name: {"summary": obj["summary"], "items": list(obj["items"].items)}
+            for name, obj in self._facets.items()
+        }
+        for k in LIST_CAPS:
+            merged[k] = list(self._lists[k].items)
+        merged["extra"] = dict(self._extra)
+        return ensure_open_schema(merged)
+
+
+class MetadataAccumulator:
+    """
+    Thread-safe streaming fold of chunk results that finish out of order
+
+    add(index, part) folds the part right away if it is the next chunk in
+    order; otherwise it waits in a reorder buffer until the chunks before it
+    arrive, so the merge stays deterministic while only the out-of-order
+    window is held in memory. snapshot() / summary() expose the metadata
+    merged so far (progress reporting, early cutoff); finish() folds what is
+    left in the buffer, skipping chunks that never arrived.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self._merger = MetadataMerger()
+        self._next = 0
+        self._buffer: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def merged(self) -> int:
+        return self._next
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def add(self, index: int, part: Optional[Dict[str, Any]]):
+        with self._lock:
+            self.received += 1
+            self._buffer[index] = part
+            while self._next in self._buffer:
+                self._merger.add(self._buffer.pop(self._next))
+                self._next += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._merger.result()
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact view of the merge so far, small enough for progress events"""
+        with self._lock:
+            m = self._merger
+            return {
+                "merged": self._next,
+                "buffered": len(self._buffer),
+                "title": m._scalars.get("title"),
+                "keywords": len(m._lists["keywords"].items),
+                "entities": len(m._lists["entities"].items),
+                "facets": len(m._facets),
+            }
+
+    def finish(self) -> Dict[str, Any]:
+        with self._lock:
+            for index in sorted(self._buffer):
+                self._merger.add(self._buffer.pop(index))
+                self._next = index + 1
+            return self._merger.result()
+
+
+def merge_maps(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merger = MetadataMerger()
+    for r in results:
+        merger.add(r)
+    return merger.result()
+
+
+__all__ = [
+    "A_FIXED",
+    "B_MINIMUM",
+    "MetadataAccumulator",
+    "MetadataMerger",
+    "canonical_key",
+    "dedup_list",
+    "ensure_open_schema",
+    "merge_maps",
+]
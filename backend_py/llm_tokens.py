@@ -0,0 +1,445 @@
+"""
+Token counting, per-model context profiles and token-aware chunking
+
+The local-LLM path used to chunk documents every 2000 characters and guess
+prompt size as `len(prompt.split()) * 2` against a hard-coded 4096 context.
+That under-fills the context on English (2000 chars ≈ 500 tokens) and
+overflows it on Chinese, where split() sees one "word" per sentence and a
+character is roughly one token.
+
+Tokenizers, first available wins (all loaded offline):
+1. LLM_TOKENIZER_PATH: a HuggingFace tokenizer.json (needs `tokenizers`),
+   e.g. the one shipped with the served Llama model
+2. tiktoken, only if its BPE file is already in TIKTOKEN_CACHE_DIR (never
+   downloaded); for non-OpenAI models cl100k_base is used as an inexact
+   stand-in (exact=False, heuristic safety margin)
+3. a conservative CJK-aware estimate (no dependency)
+
+Context profiles are matched by model-name prefix; LLM_MODEL_PROFILES
+(JSON, {"prefix": {"context": 8192, "max_output": 2000}}) overrides or adds
+entries and LLM_CONTEXT_TOKENS forces the context size of every model.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# per chat message framing (role, separators) and reply priming
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+
+# ============= Tokenizers =============
+
+# kana, CJK ideographs (+ ext. A / compatibility), hangul, full-width forms
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+_ESTIMATE_RE = re.compile(
+    rf"(?P<cjk>[{_CJK}])|(?P<word>[^\W\d_{_CJK}]+)|(?P<num>\d+)|(?P<other>[^\s\w])"
+)
+
+
+class Tokenizer:
+    """count(text) → tokens; exact=False for the heuristic estimate"""
+
+    def __init__(self, name: str, count: Callable[[str], int], exact: bool):
+        self.name = name
+        self._count = count
+        self.exact = exact
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._count(text)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Dependency-free upper-bound estimate: 1.5 tokens per CJK character, a
+    token per 4 letters of other words, per 3 digits and per symbol
+    """
+    cjk = words = other = 0
+    for m in _ESTIMATE_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "cjk":
+            cjk += 1
+        elif kind == "word":
+            words += math.ceil(len(m.group()) / 4)
+        elif kind == "num":
+            words += math.ceil(len(m.group()) / 3)
+        else:
+            other += 1
+    return math.ceil(cjk * 1.5) + words + other
+
+
+_HEURISTIC = Tokenizer("heuristic", estimate_tokens, exact=False)
+_tokenizers: Dict[str, Tokenizer] = {}
+_tokenizer_lock = threading.Lock()
+
+
+def _load_hf_tokenizer(path: str) -> Optional[Tokenizer]:
+    try:
+        from tokenizers import Tokenizer as HFTokenizer
+
+        tok = HFTokenizer.from_file(path)
+    except Exception as e:
+        print(f"⚠️  Could not load tokenizer {path}: {e}")
+        return None
+    return Tokenizer(
+        f"hf:{os.path.basename(path)}",
+        lambda text: len(tok.encode(text, add_special_tokens=False).ids),
+        exact=True,
+    )
+
+
+_TIKTOKEN_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+
+def _tiktoken_cached(name: str) -> bool:
+    """
+    The BPE file of an encoding is in TIKTOKEN_CACHE_DIR (tiktoken's own
+    cache key: sha1 of the download URL); otherwise get_encoding() would
+    download it
+    """
+    cache_dir = os.getenv("TIKTOKEN_CACHE_DIR")
+    if not cache_dir:
+        return False
+    key = hashlib.sha1(_TIKTOKEN_URL.format(name).encode()).hexdigest()
+    return os.path.isfile(os.path.join(cache_dir, key))
+
+
+def _load_tiktoken(model: str) -> Optional[Tokenizer]:
+    try:
+        import tiktoken
+        from tiktoken.model import encoding_name_for_model
+    except ImportError:
+        return None
+    try:
+        name, exact = encoding_name_for_model(model), True
+    except KeyError:
+        # Llama and other non-OpenAI models: cl100k_base is a stand-in with a
+        # different vocabulary, so it gets the estimate's safety margin
+        name, exact = "cl100k_base", False
+    if not _tiktoken_cached(name):
+        return None  # never download at runtime
+    try:
+        enc = tiktoken.get_encoding(name)
+    except Exception:
+        return None
+    return Tokenizer(
+        f"tiktoken:{enc.name}",
+        lambda text: len(enc.encode(text, disallowed_special=())),
+        exact=exact,
+    )
+
+
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """Best available tokenizer for a model (cached per model)"""
+    key = model or ""
+    with _tokenizer_lock:
+        tok = _tokenizers.get(key)
+        if tok is None:
+            path = os.getenv("LLM_TOKENIZER_PATH")
+            tok = (
+                (_load_hf_tokenizer(path) if path else None)
+                or _load_tiktoken(key)
+                or _HEURISTIC
+            )
+            _tokenizers[key] = tok
+        return tok
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return get_tokenizer(model).count(text)
+
+
+def count_message_tokens(
+    messages: List[Dict[str, str]], model: Optional[str] = None
+) -> int:
+    """Prompt tokens of a chat.completions message list"""
+    tok = get_tokenizer(model)
+    total = REPLY_OVERHEAD_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + tok.count(message.get("content") or "")
+    return total
+
+
+# ============= Model profiles =============
+
+
+class ModelProfile:
+    """
+    context_tokens: prompt + completion limit of the deployment
+    max_output_tokens: cap for max_tokens
+    min_output_tokens: below this a request is considered too tight
+    chunk_output_tokens: completion space reserved per extraction chunk
+    """
+
+    def __init__(
+        self,
+        context_tokens: int,
+        max_output_tokens: int,
+        min_output_tokens: int = 300,
+        chunk_output_tokens: int = 1000,
+        safety_margin: int = 64,
+    ):
+        self.context_tokens = context_tokens
+        self.max_output_tokens = max_output_tokens
+        self.min_output_tokens = min_output_tokens
+        self.chunk_output_tokens = min(chunk_output_tokens, max_output_tokens)
+        self.safety_margin = safety_margin
+
+    def margin(self, tokenizer: Tokenizer, prompt_tokens: int) -> int:
+        """Head-room for tokenizer mismatch (larger when only estimating)"""
+        if tokenizer.exact:
+            return self.safety_margin
+        return self.safety_margin + prompt_tokens // 10
+
+    def output_budget(self, prompt_tokens: int, tokenizer: Tokenizer) -> int:
+        """max_tokens that still fits next to a prompt of prompt_tokens"""
+        available = (
+            self.context_tokens - prompt_tokens - self.margin(tokenizer, prompt_tokens)
+        )
+        if available < self.min_output_tokens:
+            print(
+                f"⚠️  Warning: prompt ({prompt_tokens} tokens) leaves only "
+                f"{max(available, 0)} of {self.context_tokens} for the answer"
+            )
+        return max(1, min(self.max_output_tokens, available))
+
+    def chunk_tokens(self, overhead_tokens: int, tokenizer: Tokenizer) -> int:
+        """
+        Document tokens per chunk, given the fixed prompt overhead (system
+        prompt + template), so that output_budget() still grants
+        chunk_output_tokens for the answer
+        """
+        prompt_room = (
+            self.context_tokens - self.chunk_output_tokens - self.safety_margin
+        )
+        if not tokenizer.exact:
+            prompt_room = prompt_room * 10 // 11  # margin() adds prompt // 10
+        return max(128, prompt_room - overhead_tokens)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "context": self.context_tokens,
+            "max_output": self.max_output_tokens,
+            "min_output": self.min_output_tokens,
+            "chunk_output": self.chunk_output_tokens,
+        }
+
+
+# prefix (lower case) → profile; longest matching prefix wins
+MODEL_PROFILES: Dict[str, ModelProfile] = {
+    # served through vLLM with max_model_len=4096
+    "meta-llama/": ModelProfile(4096, 1500),
+    # Ollama: num_ctx is sent with every request (see LLMClient._local_payload)
+    "llama3": ModelProfile(8192, 2000),
+    "qwen": ModelProfile(8192, 2000),
+    "gpt-4o": ModelProfile(128000, 4096),
+    "gpt-4.1": ModelProfile(128000, 4096),
+    "gpt-4-turbo": ModelProfile(128000, 4096),
+    "gpt-3.5-turbo": ModelProfile(16385, 4096),
+}
+DEFAULT_PROFILE = ModelProfile(4096, 1500)
+
+
+def _profile_overrides() -> Dict[str, ModelProfile]:
+    raw = os.getenv("LLM_MODEL_PROFILES")
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return {
+            prefix.lower(): ModelProfile(
+                int(cfg["context"]),
+                int(cfg.get("max_output", 1500)),
+                int(cfg.get("min_output", 300)),
+                int(cfg.get("chunk_output", 1000)),
+            )
+            for prefix, cfg in data.items()
+        }
+    except Exception as e:
+        print(f"⚠️  Ignoring invalid LLM_MODEL_PROFILES: {e}")
+        return {}
+
+
+def get_profile(model: Optional[str]) -> ModelProfile:
+    name = (model or "").lower()
+    profiles = {**MODEL_PROFILES, **_profile_overrides()}
+    matches = [p for p in profiles if name.startswith(p)]
+    profile = profiles[max(matches, key=len)] if matches else DEFAULT_PROFILE
+
+    forced = os.getenv("LLM_CONTEXT_TOKENS")
+    if forced:
+        profile = ModelProfile(
+            int(forced),
+            profile.max_output_tokens,
+            profile.min_output_tokens,
+            profile.chunk_output_tokens,
+            profile.safety_margin,
+        )
+    return profile
+
+
+# ============= Chunking =============
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_LINE_RE = re.compile(r"\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;。！？；])\s*")
+
+
+def _split_after(text: str, pattern: re.Pattern) -> List[str]:
+    """Split after each separator match, keeping the separator in the piece"""
+    pieces, start = [], 0
+    for m in pattern.finditer(text):
+        end = m.end()
+        if end > start:
+            pieces.append(text[start:end])
+            start = end
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def _units(text: str, limit: int, count: Callable[[str], int]) -> List[Tuple[str, int]]:
+    """
+    (piece, tokens) covering the text in order, each piece at most limit
+    tokens: paragraphs, else lines, else sentences, else a hard split
+    """
+    out: List[Tuple[str, int]] = []
+    stack = [(text, 0)]
+    splitters = (_PARAGRAPH_RE, _LINE_RE, _SENTENCE_RE)
+    while stack:
+        piece, depth = stack.pop()
+        tokens = count(piece)
+        if tokens <= limit:
+            out.append((piece, tokens))
+            continue
+        parts: List[str] = []
+        while depth < len(splitters) and len(parts) < 2:
+            parts = _split_after(piece, splitters[depth])
+            depth += 1
+        if len(parts) < 2:
+            # no boundary left: cut by characters
+            n = math.ceil(tokens / limit) + 1
+            size = math.ceil(len(piece) / n)
+            parts = [piece[i : i + size] for i in range(0, len(piece), size)]
+            depth = len(splitters)
+        stack.extend((p, depth) for p in reversed(parts))
+    return out
+
+
+def chunk_by_tokens(
+    text: str,
+    max_tokens: int,
+    model: Optional[str] = None,
+    overlap_tokens: int = 0,
+) -> List[str]:
+    """
+    Pack text into as few chunks as possible, each at most max_tokens,
+    breaking at paragraph / line / sentence boundaries. overlap_tokens of
+    trailing context from a chunk are repeated at the start of the next.
+    """
+    if not text.strip():
+        return [""]
+    count = get_tokenizer(model).count
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    chunks: List[str] = []
+    current: List[Tuple[str, int]] = []
+    used = 0
+    for piece, tokens in _units(text, max_tokens, count):
+        if current and used + tokens > max_tokens:
+            chunks.append("".join(p for p, _ in current).strip())
+            # carry the tail of the previous chunk as overlap
+            carry: List[Tuple[str, int]] = []
+            carried = 0
+            for prev in reversed(current):
+                if carried + prev[1] > overlap_tokens:
+                    break
+                carry.insert(0, prev)
+                carried += prev[1]
+            if carried + tokens > max_tokens:
+                carry, carried = [], 0
+            current, used = carry, carried
+        current.append((piece, tokens))
+        used += tokens
+    if current:
+        chunks.append("".join(p for p, _ in current).strip())
+    return [c for c in chunks if c] or [""]
+
+
+def chunk_sections(
+    sections: List[Dict[str, Any]],
+    max_tokens: int,
+    model: Optional[str] = None,
+    overlap_tokens: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Structure-aware variant of chunk_by_tokens for doc_analyzer.split_sections
+    output: consecutive whole sections are packed into a chunk while they
+    fit; a section larger than max_tokens gets chunks of its own, split at
+    paragraph / line / sentence boundaries (with overlap_tokens).
+
+    Returns [{"text", "section_ids", "titles"}] in document order.
+    """
+    count = get_tokenizer(model).count
+    chunks: List[Dict[str, Any]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+
+    def flush():
+        nonlocal current, used
+        if current:
+            chunks.append(
+                {
+                    "text": "".join(s["text"] for s in current).strip(),
+                    "section_ids": [s["id"] for s in current],
+                    "titles": [s["title"] for s in current if s["title"]],
+                }
+            )
+        current, used = [], 0
+
+    for sec in sections:
+        tokens = count(sec["text"])
+        if tokens > max_tokens:
+            flush()
+            for piece in chunk_by_tokens(
+                sec["text"], max_tokens, model, overlap_tokens
+            ):
+                chunks.append(
+                    {
+                        "text": piece,
+                        "section_ids": [sec["id"]],
+                        "titles": [sec["title"]] if sec["title"] else [],
+                    }
+                )
+            continue
+        if current and used + tokens > max_tokens:
+            flush()
+        current.append(sec)
+        used += tokens
+    flush()
+    return [c for c in chunks if c["text"]] or [
+        {"text": "", "section_ids": [], "titles": []}
+    ]
+
+
+__all__ = [
+    "DEFAULT_PROFILE",
+    "MODEL_PROFILES",
+    "ModelProfile",
+    "Tokenizer",
+    "chunk_by_tokens",
+    "chunk_sections",
+    "count_message_tokens",
+    "count_tokens",
+    "estimate_tokens",
+    "get_profile",
+    "get_tokenizer",
+]
@@ -7,10 +7,19 @@ from fastapi.responses import FileResponse, JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware  # 🆕 添加
 import re  # 🆕 添加
 
-from app.db import Base, engine
+from app.db import async_engine, init_db
 from app.api.materials import router as materials_router
 from app.api.frameworks import router as frameworks_router
 from app.api.users import router as users_router
+from app.services.jobs import job_queue
+from app.services.uploads import MULTIPART_OVERHEAD, RequestSizeLimitMiddleware
+from app.services.tenancy import TenantMiddleware
+from app.api.materials import MAX_BYTES as MATERIAL_MAX_BYTES
+from app.api.frameworks import MAX_BATCH_BYTES, MAX_UPLOAD_BYTES, MAX_UPLOAD_FILES
+from llm_clients import aclose_clients
+from llm_limits import LLMOverloadedError, limiter_stats
+from llm_health import health_snapshot
+from text_extraction import shutdown_pool as shutdown_extraction_pool
 
 # Load environment variables
 load_dotenv()
@@ -57,10 +66,29 @@ class CustomCORSMiddleware(BaseHTTPMiddleware):
         if origin and is_valid_origin(origin):
             response.headers['Access-Control-Allow-Origin'] = origin
             response.headers['Access-Control-Allow-Credentials'] = 'true'
+            response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
             response.headers['Vary'] = 'Origin'
         
         return response
 
+# ================= 上传大小限制（解析 multipart 之前拒绝超大请求） =================
+# 先注册 → 位于 CORS 内层，413 响应同样带 CORS 头
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        "/materials/upload-file": MATERIAL_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/api/frameworks/generate-from-file": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/api/frameworks/generate-from-files": MAX_UPLOAD_FILES * MAX_UPLOAD_BYTES
+        + MULTIPART_OVERHEAD,
+        "/api/frameworks/jobs/files": MAX_UPLOAD_FILES * MAX_UPLOAD_BYTES
+        + MULTIPART_OVERHEAD,
+        "/api/frameworks/extract-batch": MAX_BATCH_BYTES + MULTIPART_OVERHEAD,
+    },
+)
+
+# LLM 调用按租户公平排队（llm_limits）
+app.add_middleware(TenantMiddleware)
+
 app.add_middleware(CustomCORSMiddleware)
 # ================= 🆕 结束 =================
 
@@ -80,8 +108,39 @@ def health():
     return {"status": "healthy", "message": "Backend is running!", "version": "1.0.0"}
 
 
+@app.get("/health/llm")
+def llm_health():
+    """LLM 后端熔断状态 / p95 延迟 / 排队情况（缓存值，不会探测后端）"""
+    return {**health_snapshot(), "limiters": limiter_stats()}
+
+
+# ================= LLM 过载 → 503 =================
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded(request: Request, exc: LLMOverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+
+# ================= 后台任务队列 =================
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+
+# ================= 关闭时释放连接池 =================
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await job_queue.stop()
+    await aclose_clients()
+    shutdown_extraction_pool()
+    await async_engine.dispose()
+
+
 # ================= 数据库初始化 =================
-Base.metadata.create_all(bind=engine)
+init_db()
 
 # ================= 注册路由 =================
 app.include_router(materials_router)
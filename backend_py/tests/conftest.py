@@ -0,0 +1,5 @@
+import os
+import sys
+
+# make backend_py/ modules (llm_local, llm_cache, ...) importable from tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+"""
+users / materials routers on AsyncSession (aiosqlite, temporary database)
+"""
+
+import pytest
+
+for _module in ("httpx", "greenlet", "aiosqlite", "jose", "email_validator"):
+    pytest.importorskip(_module)
+pytest.importorskip("multipart")  # python-multipart, for UploadFile
+
+import sqlalchemy as sa  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api.materials import router as materials_router  # noqa: E402
+from app.api.users import router as users_router  # noqa: E402
+from app.db import Base, get_async_db  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    Base.metadata.create_all(sa.create_engine(url))
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(users_router)
+    app.include_router(materials_router)
+    app.dependency_overrides[get_async_db] = override_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_register_login_me_round_trip(client):
+    body = {"email": "ada@example.com", "username": "ada", "password": "secret1"}
+    registered = client.post("/api/users/register", json=body)
+    assert registered.status_code == 201
+    assert client.post("/api/users/register", json=body).status_code == 400
+
+    login = client.post(
+        "/api/users/login", json={"email": body["email"], "password": "secret1"}
+    )
+    assert login.status_code == 200
+    token = login.json()["access_token"]
+
+    me = client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200
+    assert me.json()["id"] == registered.json()["user"]["id"]
+    assert me.json()["username"] == "ada"
+
+    wrong = client.post(
+        "/api/users/login", json={"email": body["email"], "password": "nope"}
+    )
+    assert wrong.status_code == 401
+
+
+def test_material_upload_then_get(client):
+    uploaded = client.post(
+        "/materials/upload-file",
+        files={"file": ("notes.txt", b"governance framework notes", "text/plain")},
+    )
+    assert uploaded.status_code == 200
+    material = uploaded.json()
+    assert material["type"] == "text" and material["sizebyte"] == 26
+
+    fetched = client.get(f"/materials/{material['id']}")
+    assert fetched.status_code == 200
+    assert fetched.json()["filename"] == "notes.txt"
+    assert client.get("/materials/mat_missing").status_code == 404
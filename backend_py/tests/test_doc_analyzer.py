@@ -0,0 +1,41 @@
+from doc_analyzer import DocumentAnalyzer, analyze_text
+
+DOC = """# Annual Risk Report
+
+1. Overview of the framework
+The Board reviewed the policy with Acme
+Corporation and the Data Office.
+Policy policy review review review.
+
+RISK AND CONTROL
+Zürich café_2 notes, abcd1 tokens.
+"""
+
+
+def test_matches_one_shot_when_fed_in_chunks():
+    expected = analyze_text(DOC)
+    for size in (1, 7, 64):
+        analyzer = DocumentAnalyzer()
+        for i in range(0, len(DOC), size):
+            analyzer.feed(DOC[i : i + size])
+        assert analyzer.result() == expected
+
+    by_lines = DocumentAnalyzer().feed_lines(DOC.split("\n")).result()
+    assert by_lines == expected
+
+
+def test_title_keywords_sections_entities():
+    result = analyze_text(DOC)
+
+    assert result["title"] == "Annual Risk Report"
+    assert result["keywords"][:2] == ["policy", "review"]  # tie: first seen wins
+    assert "abcd" not in result["keywords"]  # no word boundary inside "abcd1"
+    assert [s["title"] for s in result["sections"]][:3] == [
+        "Annual Risk Report",
+        "1. Overview of the framework",
+        "The Board reviewed the policy with Acme",
+    ]
+    # capitalized phrases continue across line breaks
+    assert "Acme\nCorporation" in result["entities"]
+    assert "Data Office" in result["entities"]
+    assert result["chars"] == len(DOC)
@@ -0,0 +1,188 @@
+"""
+/ai-fill/stream framing (SSE / NDJSON) against a stubbed OpenAI stream
+"""
+
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+for _module in ("httpx", "dotenv", "greenlet", "aiosqlite", "jose", "multipart"):
+    pytest.importorskip(_module)
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import llm_local  # noqa: E402
+from app.api import frameworks  # noqa: E402
+
+ANSWER = (
+    '[{"heading": "Scope", "body": "All teams"}, {"heading": "Owners", "body": "CTO"}]'
+)
+
+
+class FakeStream:
+    def __init__(self, text, size=7):
+        self.pieces = [text[i : i + size] for i in range(0, len(text), size)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield SimpleNamespace(choices=[])  # usage-only chunk
+        for piece in self.pieces:
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    streams = []
+
+    async def create(**request):
+        assert request["stream"] is True
+        streams.append(FakeStream(ANSWER))
+        return streams[-1]
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(frameworks, "resolve_api_settings", lambda *a: ("sk-x", None))
+    monkeypatch.setattr(frameworks, "get_async_openai_client", lambda **kw: client)
+    return streams
+
+
+def post_fill(fmt):
+    app = FastAPI()
+    app.include_router(frameworks.router)
+    body = {"artefact_name": "Policy", "sections_to_fill": ["Scope", "Owners", "Risk"]}
+    with TestClient(app) as client:
+        return client.post(f"/api/frameworks/ai-fill/stream?format={fmt}", json=body)
+
+
+def check_events(events):
+    names = [name for name, _ in events]
+    assert names[-1] == "done" and "error" not in names
+    deltas = "".join(data["text"] for name, data in events if name == "delta")
+    assert deltas == ANSWER
+    items = [data for name, data in events if name == "item"]
+    assert [item["value"]["heading"] for item in items] == ["Scope", "Owners"]
+    assert [item["path"] for item in items] == [[0], [1]]
+    filled = events[-1][1]["filled_sections"]
+    assert [s["heading"] for s in filled] == ["Scope", "Owners", "Risk"]
+
+
+def test_sse_framing(fake_openai):
+    response = post_fill("sse")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-accel-buffering"] == "no"
+
+    events = []
+    for frame in response.text.split("\n\n"):
+        if not frame:
+            continue
+        lines = frame.split("\n")
+        assert lines[0].startswith("event: ")
+        data = "\n".join(line[len("data: ") :] for line in lines[1:])
+        events.append((lines[0][len("event: ") :], json.loads(data)))
+    check_events(events)
+    assert fake_openai[0].closed
+
+
+def test_ndjson_framing(fake_openai):
+    response = post_fill("ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    check_events([(record["event"], record["data"]) for record in records])
+
+
+def test_unknown_format_is_rejected(fake_openai):
+    assert post_fill("xml").status_code == 400
+
+
+def test_slot_is_released_before_the_client_reads_the_stream(fake_openai):
+    limiter = frameworks.openai_limiter(None)
+
+    async def main():
+        frames = frameworks.stream_chat_json(
+            [{"role": "user", "content": "fill"}],
+            temperature=0.4,
+            timeout=5.0,
+            patterns=frameworks.FILL_STREAM_PATTERNS,
+            finalize=lambda text: {"chars": len(text)},
+            fmt="ndjson",
+        )
+        first = await frames.__anext__()
+        for _ in range(20):  # let the upstream reader drain the fake stream
+            await asyncio.sleep(0)
+        inflight = limiter.inflight
+        rest = [frame async for frame in frames]
+        return first, inflight, rest
+
+    first, inflight, rest = asyncio.run(main())
+    assert json.loads(first)["event"] == "delta"
+    assert inflight == 0  # client has not read the rest yet
+    assert json.loads(rest[-1]) == {"event": "done", "data": {"chars": len(ANSWER)}}
+
+
+class SingleDocLLM(llm_local.LLMClient):
+    """One document per call (SEED_BATCH_DOCS_PER_CALL=1)"""
+
+    def __init__(self):
+        self.llm_type, self.host, self.model = "cloud", "fake", "meta-llama/fake"
+        self.max_inflight = 2
+        self.calls = 0
+
+    async def _agenerate_cloud(self, prompt, system=""):
+        self.calls += 1
+        title = re.search(r"Doc \d+", prompt)[0]
+        return json.dumps({"title": title, "keywords": ["batch"]})
+
+
+def test_extract_batch_reports_rejected_duplicate_and_valid_files(monkeypatch):
+    monkeypatch.setenv("SEED_BATCH_DOCS_PER_CALL", "1")
+    llm = SingleDocLLM()
+    monkeypatch.setattr(llm_local, "build_llm", lambda **kw: llm)
+    app = FastAPI()
+    app.include_router(frameworks.router)
+    app.dependency_overrides[frameworks.get_current_user_id] = lambda: "u1"
+
+    first, second = (
+        f"Doc {i}\n\nNotes about topic {i}. ".encode() * 20 for i in (1, 2)
+    )
+    files = [
+        ("files", ("setup.exe", b"MZ", "application/octet-stream")),
+        ("files", ("a.txt", first, "text/plain")),
+        ("files", ("notes.csv", b"a,b", "text/csv")),
+        ("files", ("b.md", second, "text/markdown")),
+        ("files", ("a-copy.txt", first, "text/plain")),
+    ]
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/frameworks/extract-batch?format=ndjson&use_cache=false", files=files
+        )
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    docs = {r["data"]["index"]: r["data"] for r in records if r["event"] == "document"}
+
+    # indexes are positions in the upload, including the rejected files
+    assert sorted(docs) == [0, 1, 2, 3, 4]
+    assert [docs[i]["status"] for i in (0, 2)] == ["error", "error"]
+    assert [docs[i]["name"] for i in (1, 3, 4)] == ["a.txt", "b.md", "a-copy.txt"]
+    assert docs[4]["duplicate_of"] == 1
+    assert docs[4]["doc_hash"] == docs[1]["doc_hash"] != docs[3]["doc_hash"]
+    assert docs[4]["metadata"] == docs[1]["metadata"]
+    assert docs[3]["duplicate_of"] is None
+    assert llm.calls == 2  # the copy is not sent to the LLM
+    assert records[-1] == {
+        "event": "done",
+        "data": {"success": True, "total": 5, "done": 3, "error": 2, "duplicates": 1},
+    }
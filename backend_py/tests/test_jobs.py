@@ -0,0 +1,119 @@
+"""
+app/services/jobs.py against a temporary SQLite database
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("greenlet")  # app.db builds the async engine on import
+pytest.importorskip("aiosqlite")
+
+import sqlalchemy as sa  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db import Base  # noqa: E402
+from app.models import GenerationJob  # noqa: E402
+from app.services import jobs  # noqa: E402
+from app.services.jobs import JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(jobs, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(jobs, "spool_dir", lambda job_id: tmp_path / job_id)
+
+    async def handler(params, progress):
+        progress("preprocess", {"status": "started"})
+        progress("preprocess", {"status": "done"})
+        return {"echo": params}
+
+    q = JobQueue()
+    q.register("text", handler)
+    return q
+
+
+def submit(queue, user_id="u1", kind="text"):
+    return asyncio.run(queue.submit(kind, {"text": "x"}, user_id=user_id))
+
+
+def set_heartbeat(job_id, at):
+    with jobs.SessionLocal() as db:
+        db.get(GenerationJob, job_id).heartbeat_at = at
+        db.commit()
+
+
+def test_claim_takes_oldest_queued_job_once(queue):
+    first, second = submit(queue), submit(queue, user_id="u2")
+
+    claimed = [queue._claim_next(), queue._claim_next()]
+    assert [job["id"] for job in claimed] == [first, second]
+    assert claimed[0]["attempts"] == 1 and claimed[0]["user_id"] == "u1"
+    assert queue._claim_next() is None  # running rows are not claimed again
+    assert queue.get(first)["status"] == "running"
+
+
+def test_stale_job_is_requeued_then_failed_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setenv("JOB_STALE_SECONDS", "60")
+    monkeypatch.setenv("JOB_MAX_ATTEMPTS", "2")
+    job_id = submit(queue)
+    queue._claim_next()
+
+    queue._record_events(job_id, [])  # idle heartbeat
+    queue._recover_stale(False)
+    assert queue.get(job_id)["status"] == "running"
+
+    set_heartbeat(job_id, datetime.utcnow() - timedelta(minutes=5))
+    queue._recover_stale(False)
+    assert queue.get(job_id)["status"] == "queued"
+
+    assert queue._claim_next()["attempts"] == 2
+    set_heartbeat(job_id, datetime.utcnow() - timedelta(minutes=5))
+    queue._recover_stale(False)
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "Worker lost after 2 attempts"
+    assert queue.events_since(job_id)[-1]["stage"] == "failed"
+
+
+def test_cancelled_run_hands_the_job_back(queue):
+    async def slow(params, progress):
+        await asyncio.sleep(60)
+
+    queue.register("slow", slow)
+
+    async def main():
+        job_id = await queue.submit("slow", {}, user_id="u1")
+        task = asyncio.create_task(queue._run(queue._claim_next()))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return job_id
+
+    job_id = asyncio.run(main())
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_events_resume_after_last_event_id_and_owner_only(queue):
+    async def main():
+        job_id = await queue.submit("text", {"text": "x"}, user_id="u1")
+        await queue._run(queue._claim_next())
+        events = [ev async for ev in queue.stream(job_id)]
+        resumed = [ev async for ev in queue.stream(job_id, events[1]["id"])]
+        return job_id, events, resumed
+
+    job_id, events, resumed = asyncio.run(main())
+    assert [ev["stage"] for ev in events] == [
+        "queued",
+        "preprocess",
+        "preprocess",
+        "succeeded",
+    ]
+    assert resumed == events[2:]
+
+    assert queue.get(job_id, "u1")["result"] == {"echo": {"text": "x"}}
+    assert queue.get(job_id, "u2") is None
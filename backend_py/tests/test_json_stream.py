@@ -0,0 +1,40 @@
+import json
+
+from app.services.json_stream import IncrementalJSONParser
+
+
+def feed_chars(parser, text):
+    out = []
+    for ch in text:
+        out.extend(parser.feed(ch))
+    return out
+
+
+def test_emits_items_as_they_close():
+    doc = {
+        "name": 'Merged "A" {x}',
+        "steps": [
+            {"name": "a", "subSteps": ["s1", "s]2"], "n": 1.5, "ok": True},
+            {"name": "b", "subSteps": [], "z": None},
+        ],
+    }
+    parser = IncrementalJSONParser(["name", "steps.*", "steps.*.subSteps.*"])
+    got = feed_chars(parser, "```json\n" + json.dumps(doc, indent=2) + "\n```")
+
+    assert got == [
+        (("name",), doc["name"]),
+        (("steps", 0, "subSteps", 0), "s1"),
+        (("steps", 0, "subSteps", 1), "s]2"),
+        (("steps", 0), doc["steps"][0]),
+        (("steps", 1), doc["steps"][1]),
+    ]
+    assert parser.done
+
+
+def test_top_level_array_items_across_chunks():
+    parser = IncrementalJSONParser(["*"])
+    first = parser.feed('[{"heading": "A", "body": "x"}, {"head')
+    second = parser.feed('ing": "B", "body": "y, }"}]  trailing text')
+
+    assert first == [((0,), {"heading": "A", "body": "x"})]
+    assert second == [((1,), {"heading": "B", "body": "y, }"})]
@@ -0,0 +1,53 @@
+"""
+llm_cache: persistent content-addressed cache
+"""
+
+import time
+
+from llm_cache import ResultCache, make_key
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert make_key("abc", "model", "v1") == make_key("abc", "model", "v1")
+    assert make_key("abc", "model", "v1") != make_key("model", "abc", "v1")
+    assert make_key(None, "x") == make_key("", "x")
+
+
+def test_roundtrip_and_namespaces(tmp_path):
+    path = str(tmp_path / "cache.db")
+    seed = ResultCache("seed", path=path)
+    other = ResultCache("framework", path=path)
+
+    seed.set("k1", {"title": "Doc", "keywords": ["a", "b"]})
+    assert seed.get("k1") == {"title": "Doc", "keywords": ["a", "b"]}
+    assert other.get("k1") is None
+    assert seed.get("missing") is None
+
+
+def test_lru_eviction_by_entry_count(tmp_path):
+    cache = ResultCache("seed", path=str(tmp_path / "c.db"), max_entries=2)
+    cache.set("a", {"v": 1})
+    time.sleep(0.01)
+    cache.set("b", {"v": 2})
+    time.sleep(0.01)
+    cache.get("a")  # a is now more recently used than b
+    time.sleep(0.01)
+    cache.set("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+
+
+def test_size_cap_and_ttl(tmp_path):
+    cache = ResultCache("seed", path=str(tmp_path / "c.db"), max_bytes=60)
+    cache.set("a", {"text": "x" * 40})
+    time.sleep(0.01)
+    cache.set("b", {"text": "y" * 40})
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 1
+
+    expiring = ResultCache("ttl", path=str(tmp_path / "c.db"), ttl_seconds=0.01)
+    expiring.set("k", {"v": 1})
+    time.sleep(0.05)
+    assert expiring.get("k") is None
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from llm_local import FailoverLLM  # noqa: E402
+
+
+class FakeBreaker:
+    available = True
+
+    def p95(self):
+        return 0.5
+
+
+class FakeBackend:
+    llm_type = "fake"
+    model = "fake"
+    host = None
+    max_inflight = 1
+
+    def __init__(self, key, answer=None, error=None):
+        self.backend_key = key
+        self.breaker = FakeBreaker()
+        self.answer, self.error = answer, error
+        self.calls = 0
+
+    async def agenerate(self, prompt, system=""):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def test_hedged_failover_when_primary_fails_before_the_delay():
+    primary = FakeBackend("cloud", error=ConnectionError("refused"))
+    secondary = FakeBackend("ollama", answer="{}")
+    llm = FailoverLLM([primary, secondary], hedge=True)
+
+    assert asyncio.run(llm.agenerate("prompt")) == "{}"
+    assert (primary.calls, secondary.calls) == (1, 1)
+    assert llm.degraded
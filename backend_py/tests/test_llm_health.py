@@ -0,0 +1,44 @@
+import time
+
+from llm_health import CircuitBreaker, is_backend_failure
+from llm_limits import LLMOverloadedError
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_breaker_opens_then_half_open_trial_closes_it():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow() and not breaker.available
+
+    time.sleep(0.06)
+    assert breaker.allow()  # the single half-open trial
+    assert not breaker.allow()
+    breaker.record_failure()  # trial failed: open again
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success(latency=1.0)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_p95_and_failure_classification():
+    breaker = CircuitBreaker("test", min_samples=20)
+    for i in range(19):
+        breaker.record_success(latency=float(i + 1))
+    assert breaker.p95() is None  # not enough samples yet
+    breaker.record_success(latency=20.0)
+    assert breaker.p95() == 19.0
+
+    assert is_backend_failure(FakeStatusError(503))
+    assert is_backend_failure(ConnectionError("refused"))
+    assert not is_backend_failure(FakeStatusError(400))
+    assert not is_backend_failure(LLMOverloadedError("test", 300))
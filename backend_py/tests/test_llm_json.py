@@ -0,0 +1,39 @@
+import pytest
+
+from llm_json import lenient_loads
+
+
+def test_fences_prose_trailing_commas_and_single_quotes():
+    raw = (
+        "Sure! Here is the metadata:\n```json\n"
+        "{'title': 'Audit \"plan\"', 'keywords': ['risk', 'controls',],\n"
+        " 'draft': True, 'owner': None,}\n```\nLet me know."
+    )
+    assert lenient_loads(raw) == {
+        "title": 'Audit "plan"',
+        "keywords": ["risk", "controls"],
+        "draft": True,
+        "owner": None,
+    }
+    assert lenient_loads('[{"heading": "A", "body": "x"},] trailing', list) == [
+        {"heading": "A", "body": "x"}
+    ]
+
+
+def test_truncated_answers_are_closed():
+    assert lenient_loads('{"title": "Scope", "keywords": ["a", "b') == {
+        "title": "Scope",
+        "keywords": ["a", "b"],
+    }
+    # a dangling key cannot be completed: cut back to the last full element
+    assert lenient_loads('{"title": "Scope", "facets": {"risk": [1, 2]}, "ind') == {
+        "title": "Scope",
+        "facets": {"risk": [1, 2]},
+    }
+
+
+def test_unrecoverable_answers_raise():
+    with pytest.raises(ValueError):
+        lenient_loads("I cannot help with that.")
+    with pytest.raises(ValueError):
+        lenient_loads('["not", "an", "object"]')
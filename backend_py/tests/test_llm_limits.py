@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+import pytest
+
+from llm_limits import (
+    AIMDController,
+    BackendLimiter,
+    LLMOverloadedError,
+    TokenBucket,
+    classify_error,
+    tenant_scope,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+def test_bucket_and_aimd():
+    bucket = TokenBucket(per_minute=60, burst=2)  # 1 per second
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    assert bucket.reserve(2, now=bucket.updated) == pytest.approx(2.0)
+    assert TokenBucket(0).reserve(10**6) == 0  # disabled
+
+    aimd = AIMDController(max_limit=8, target_latency=10, cooldown=5)
+    aimd.on_error(rate_limited=True, now=100)
+    assert aimd.allowed == 4
+    aimd.on_error(rate_limited=True, now=101)  # same congestion event
+    assert aimd.allowed == 4
+    aimd.on_success(latency=30, now=110)  # too slow
+    assert aimd.limit == pytest.approx(3.6)
+    for _ in range(4):
+        aimd.on_success(latency=1)
+    assert aimd.allowed == 4
+
+
+def test_classify_unwraps_and_reads_retry_after():
+    try:
+        try:
+            raise FakeStatusError(429, {"retry-after": "7"})
+        except Exception as e:
+            raise RuntimeError("Cloud LLM call failed") from e
+    except RuntimeError as wrapped:
+        assert classify_error(wrapped) == (True, 7.0)
+    assert classify_error(FakeStatusError(503)) == (False, None)
+    assert classify_error(FakeStatusError(400)) is None
+    assert classify_error(ValueError("bad json")) is None
+
+
+def test_waiting_tenants_are_served_round_robin():
+    limiter = BackendLimiter("test", max_concurrency=1)
+    order = []
+
+    async def request(tenant, label, gate):
+        with tenant_scope(tenant):
+            async with limiter.aslot():
+                order.append(label)
+                await gate.wait()
+
+    async def main():
+        gate = asyncio.Event()
+        first = asyncio.create_task(request("a", "a0", gate))
+        await asyncio.sleep(0)
+        # tenant a queues three more requests before b asks for one
+        tasks = [asyncio.create_task(request("a", f"a{i}", gate)) for i in (1, 2, 3)]
+        tasks.append(asyncio.create_task(request("b", "b0", gate)))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+
+    asyncio.run(main())
+    assert order == ["a0", "a1", "b0", "a2", "a3"]
+    assert limiter.inflight == 0
+
+
+def test_retries_429_then_times_out_when_saturated():
+    limiter = BackendLimiter("test", max_concurrency=2, retries=2)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise FakeStatusError(429, {"retry-after-ms": "10"})
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(calls) == 2
+    assert limiter.controller.limit == 2.0  # halved by the 429, +1 on success
+
+    limiter = BackendLimiter("test", max_concurrency=1, queue_timeout=0.05)
+    release = threading.Event()
+    holder = threading.Thread(target=limiter.call, args=(release.wait,))
+    holder.start()
+    while limiter.inflight == 0:
+        pass
+    with pytest.raises(LLMOverloadedError):
+        limiter.call(lambda: "never")
+    release.set()
+    holder.join()
+    assert limiter.inflight == 0
@@ -0,0 +1,51 @@
+from llm_merge import LIST_CAPS, MetadataAccumulator, MetadataMerger, merge_maps
+
+
+def test_merge_keeps_first_values_dedups_and_caps():
+    a = {
+        "title": "unknown",
+        "keywords": ["risk", "audit"],
+        "triples": [{"s": "A", "p": "owns", "o": "B"}],
+        "facets": {"scope": {"summary": "short", "items": ["X", "Y"]}},
+        "extra": {"k": 1},
+    }
+    b = {
+        "title": "Audit Plan",
+        "keywords": ["audit", "controls"],
+        "triples": [{"o": "B", "p": "owns", "s": "A"}],  # same triple
+        "facets": {"scope": {"summary": "a longer one", "items": ["Y", "Z"]}},
+        "tags": "single",
+        "extra": {"k": 2},
+    }
+    merged = merge_maps([a, None, b])
+    assert merged["title"] == "Audit Plan"
+    assert merged["keywords"] == ["risk", "audit", "controls"]
+    assert merged["triples"] == [{"s": "A", "p": "owns", "o": "B"}]
+    assert merged["tags"] == ["single"]
+    assert merged["facets"]["scope"]["summary"] == "a longer one"
+    assert [it["value"] for it in merged["facets"]["scope"]["items"]] == ["X", "Y", "Z"]
+    assert merged["extra"] == {"k": 2}
+
+    merger = MetadataMerger()
+    for i in range(3):
+        merger.add({"tags": [f"t{i}-{j}" for j in range(200)]})
+    tags = merger.result()["tags"]
+    assert len(tags) == LIST_CAPS["tags"] and tags[0] == "t0-0"
+
+
+def test_accumulator_reorders_out_of_order_chunks():
+    acc = MetadataAccumulator()
+    acc.add(2, {"title": "third", "keywords": ["c"]})
+    acc.add(1, {"title": "second", "keywords": ["b"]})
+    assert acc.merged == 0 and acc.buffered == 2
+    assert acc.snapshot()["keywords"] == []
+    acc.add(0, {"title": None, "keywords": ["a", "b"]})
+    assert acc.merged == 3 and acc.buffered == 0
+    assert acc.summary()["title"] == "second"
+    assert acc.finish()["keywords"] == ["a", "b", "c"]
+
+    # early cutoff: chunk 1 never arrives, the buffered chunk 2 still counts
+    acc = MetadataAccumulator()
+    acc.add(0, {"keywords": ["a"]})
+    acc.add(2, {"keywords": ["c"]})
+    assert acc.finish()["keywords"] == ["a", "c"]
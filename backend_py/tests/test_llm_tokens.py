@@ -0,0 +1,92 @@
+import hashlib
+
+from doc_analyzer import split_sections
+from llm_tokens import (
+    ModelProfile,
+    Tokenizer,
+    chunk_by_tokens,
+    chunk_sections,
+    estimate_tokens,
+    _tiktoken_cached,
+    get_profile,
+)
+
+# one token per character, easy to reason about
+CHARS = Tokenizer("chars", len, exact=True)
+
+
+def test_estimate_counts_cjk_per_character():
+    assert estimate_tokens("数据治理框架") == 9  # 6 chars * 1.5
+    assert estimate_tokens("governance framework") == 3 + 3
+    assert estimate_tokens("数据 governance, 2024") == 3 + 3 + 1 + 2
+
+
+def test_chunks_pack_to_budget_and_respect_boundaries(monkeypatch):
+    monkeypatch.setattr("llm_tokens.get_tokenizer", lambda model=None: CHARS)
+    text = "\n\n".join(f"para {i} " + "x" * 40 for i in range(10))
+
+    chunks = chunk_by_tokens(text, 100)
+    assert len(chunks) == 5
+    assert all(len(c) <= 100 for c in chunks)
+    assert all(c.startswith("para") for c in chunks)
+
+    overlapped = chunk_by_tokens(text, 100, overlap_tokens=50)
+    assert overlapped[1].startswith("para 1 ")  # last paragraph repeated
+
+    # no boundaries at all: hard split
+    assert all(len(c) <= 100 for c in chunk_by_tokens("y" * 1000, 100))
+
+
+def test_profiles_and_output_budget(monkeypatch):
+    assert get_profile("meta-llama/Llama-3.1-8B-Instruct").context_tokens == 4096
+    assert get_profile("gpt-4o-mini").context_tokens == 128000
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "2048")
+    assert get_profile("gpt-4o").context_tokens == 2048
+
+    profile = ModelProfile(4096, 1500, safety_margin=64)
+    assert profile.output_budget(1000, CHARS) == 1500
+    assert profile.output_budget(3000, CHARS) == 4096 - 3000 - 64
+    prompt_room = profile.chunk_tokens(200, CHARS) + 200
+    assert profile.output_budget(prompt_room, CHARS) == profile.chunk_output_tokens
+
+
+def test_section_chunks_keep_sections_whole(monkeypatch):
+    monkeypatch.setattr("llm_tokens.get_tokenizer", lambda model=None: CHARS)
+    doc = (
+        "Preface line\n"
+        "# Scope\nShort.\n"
+        "## Roles\nAlso short.\n"
+        "2. Controls\n" + "Control text. " * 10 + "\n\n" + "More text. " * 10 + "\n"
+        "RISK REGISTER\nLast.\n"
+    )
+    sections = split_sections(doc)
+    assert [(s["id"], s["title"], s["level"]) for s in sections] == [
+        ("s0", "", 0),
+        ("s1", "Scope", 1),
+        ("s2", "Roles", 2),
+        ("s3", "2. Controls", 2),
+        ("s4", "RISK REGISTER", 2),
+    ]
+    assert "".join(s["text"] for s in sections) == doc
+
+    chunks = chunk_sections(sections, 160)
+    assert [c["section_ids"] for c in chunks] == [
+        ["s0", "s1", "s2"],
+        ["s3"],
+        ["s3"],
+        ["s4"],
+    ]
+    assert chunks[0]["titles"] == ["Scope", "Roles"]
+    assert all(len(c["text"]) <= 160 for c in chunks)
+    assert chunks[2]["text"].startswith("More text.")  # split at the paragraph
+
+
+def test_tiktoken_is_used_only_when_cached(monkeypatch, tmp_path):
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+    assert not _tiktoken_cached("cl100k_base")
+
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    assert not _tiktoken_cached("cl100k_base")  # would be downloaded
+    url = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+    (tmp_path / hashlib.sha1(url.encode()).hexdigest()).write_bytes(b"")
+    assert _tiktoken_cached("cl100k_base")
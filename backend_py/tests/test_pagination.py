@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from app.services.pagination import after_cursor, decode_cursor, encode_cursor
+
+metadata = sa.MetaData()
+items = sa.Table(
+    "items",
+    metadata,
+    sa.Column("id", sa.String, primary_key=True),
+    sa.Column("created_at", sa.DateTime),
+)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    at = datetime(2025, 1, 2, 3, 4, 5, 678901)
+    assert decode_cursor(encode_cursor(at, "fw_1")) == (at, "fw_1")
+    for bad in ("", "not-a-cursor", encode_cursor(at, "x")[:-3]):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_keyset_pages_cover_every_row_once_with_timestamp_ties():
+    engine = sa.create_engine("sqlite://")
+    metadata.create_all(engine)
+    base = datetime(2025, 1, 1)
+    rows = [
+        {"id": f"fw_{i:02d}", "created_at": base + timedelta(seconds=i // 3)}
+        for i in range(20)
+    ]
+    with engine.begin() as conn:
+        conn.execute(items.insert(), rows)
+
+    seen, cursor = [], None
+    with engine.connect() as conn:
+        while True:
+            stmt = sa.select(items).order_by(
+                items.c.created_at.desc(), items.c.id.desc()
+            )
+            after = after_cursor(items.c.created_at, items.c.id, cursor)
+            if after is not None:
+                stmt = stmt.where(after)
+            page = conn.execute(stmt.limit(4)).all()
+            seen.extend(r.id for r in page)
+            if len(page) < 4:
+                break
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    expected = sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    assert seen == [r["id"] for r in expected]
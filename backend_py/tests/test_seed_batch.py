@@ -0,0 +1,118 @@
+"""
+llm_local batch seed extraction: content-hash dedup and _BatchPacker packing
+"""
+
+import asyncio
+import json
+import re
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+import llm_local  # noqa: E402
+from llm_local import LLMClient, _BatchPacker, aextract_seed_batch  # noqa: E402
+
+
+class FakeLLM(LLMClient):
+    """Answers packed prompts per <document id>, optionally leaving one out"""
+
+    def __init__(self, skip=None):
+        self.llm_type, self.host, self.model = "cloud", "fake", "meta-llama/fake"
+        self.max_inflight = 2
+        self.skip = skip
+        self.calls, self.skipped = [], []
+
+    def _answer(self, prompt):
+        blocks = re.findall(r'<document id="(d\d+)">(.*?)</document>', prompt, re.S)
+        packed = {i: re.search(r"Doc \d+", body)[0] for i, body in blocks}
+        if not packed:
+            title = re.search(r"Doc \d+", prompt)[0]
+            self.calls.append([title])
+            return json.dumps({"title": title, "keywords": ["single"]})
+        self.calls.append(list(packed.values()))
+        if self.skip in packed:
+            self.skipped.append(packed[self.skip])
+        answers = {
+            i: {"title": doc, "keywords": [i]}
+            for i, doc in packed.items()
+            if i != self.skip
+        }
+        return json.dumps({"documents": answers})
+
+    def _generate_cloud(self, prompt, system=""):
+        return self._answer(prompt)
+
+    async def _agenerate_cloud(self, prompt, system=""):
+        await asyncio.sleep(0.01)
+        return self._answer(prompt)
+
+
+def test_packer_splits_by_count_and_sends_large_documents_alone(monkeypatch):
+    monkeypatch.setenv("SEED_BATCH_DOCS_PER_CALL", "3")
+    packer = _BatchPacker(FakeLLM())
+    assert packer.max_docs == 3
+
+    small = [{"id": i, "prompt_tokens": 100} for i in range(7)]
+    large = {"id": "large", "prompt_tokens": packer.room}
+
+    packs = [pack for doc in small[:4] for pack in packer.add(doc)]
+    packs += packer.add(large)
+    packs += [pack for doc in small[4:] for pack in packer.add(doc)]
+    packs += packer.flush()
+
+    assert [[doc["id"] for doc in pack] for pack in packs] == [
+        [0, 1, 2],
+        ["large"],
+        [3, 4, 5],
+        [6],
+    ]
+    assert packer.flush() == []
+
+
+def test_packer_flushes_before_overflowing_the_context(monkeypatch):
+    monkeypatch.setenv("SEED_BATCH_DOCS_PER_CALL", "6")
+    packer = _BatchPacker(FakeLLM())
+    cost = packer.room // 2 - 16  # two fit, a third does not
+    docs = [{"id": i, "prompt_tokens": cost} for i in range(3)]
+
+    packs = [pack for doc in docs for pack in packer.add(doc)] + packer.flush()
+    assert [[doc["id"] for doc in pack] for pack in packs] == [[0, 1], [2]]
+
+
+def test_duplicates_are_processed_once_and_reported_per_upload(tmp_path, monkeypatch):
+    llm = FakeLLM(skip="d2")
+    monkeypatch.setattr(llm_local, "build_llm", lambda **kw: llm)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text(f"Doc {i}\n\nNotes about topic {i}. " * 20)
+        paths.append(str(path))
+    inputs = paths + [paths[0], {"input": paths[2], "name": "copy.txt"}]
+
+    async def main():
+        return [r async for r in aextract_seed_batch(inputs, use_cache=False)]
+
+    results = {r["index"]: r for r in asyncio.run(main())}
+
+    assert sorted(results) == list(range(6))
+    assert all(r["status"] == "done" for r in results.values())
+    assert results[4]["duplicate_of"] == 0 and results[4]["name"] == "f0.txt"
+    assert results[5]["duplicate_of"] == 2 and results[5]["name"] == "copy.txt"
+    assert results[5]["metadata"] == results[2]["metadata"]
+    assert results[5]["metadata"] is not results[2]["metadata"]
+    assert [results[i]["duplicate_of"] for i in range(4)] == [None] * 4
+
+    # one LLM call per unique document; a document left out of a packed
+    # answer is retried on its own
+    sent = Counter(doc for call in llm.calls for doc in call)
+    assert sent == {f"Doc {i}": 1 + llm.skipped.count(f"Doc {i}") for i in range(4)}
+    answered_by = {}
+    for call in llm.calls:
+        for doc in call:
+            if len(call) == 1 or doc not in llm.skipped:
+                answered_by[int(doc.split()[1])] = len(call)
+    assert {i: results[i]["packed"] for i in range(4)} == answered_by
+    assert results[4]["packed"] == answered_by[0]
@@ -0,0 +1,56 @@
+from app.services.structure import (
+    StructureExtractor,
+    default_extractor,
+    keyword_heading,
+    select_sections,
+)
+
+DOC = """Governance Playbook
+Owned by the risk office.
+
+1. Scope
+Applies to all teams.
+Reviewed yearly.
+Extra line.
+Not kept in the preview.
+
+PHASE ONE: DISCOVERY
+Interview stakeholders.
+
+## Appendix
+Glossary.
+"""
+
+
+def test_default_rules_outline():
+    sections = default_extractor.sections(DOC)
+
+    assert [(s["title"], s["level"]) for s in sections] == [
+        ("Governance Playbook", 1),
+        ("1. Scope", 2),
+        ("PHASE ONE: DISCOVERY", 2),
+        ("Appendix", 2),
+    ]
+    assert sections[1]["content"] == "1. Scope Applies to all teams. Reviewed yearly."
+
+
+def test_short_capitalized_body_line_is_not_a_boundary():
+    text = "1. Scope\nApplies to all teams\nReviewed yearly by the board\n"
+    sections = default_extractor.sections(text)
+
+    assert [s["title"] for s in sections] == ["1. Scope"]
+    assert sections[0]["content"] == (
+        "1. Scope Applies to all teams Reviewed yearly by the board"
+    )
+
+
+def test_custom_rules_and_selection():
+    extractor = StructureExtractor(rules=[keyword_heading(["appendix"], level=3)])
+    assert [s["title"] for s in extractor.sections(DOC)] == [
+        "Governance Playbook",
+        "Appendix",
+    ]
+
+    sections = [{"title": str(i), "level": 1 + (i % 2)} for i in range(40)]
+    picked = select_sections(sections, 5)
+    assert [s["title"] for s in picked] == ["0", "10", "20", "28", "38"]
@@ -0,0 +1,20 @@
+from app.services import tenancy
+from app.services.tenancy import tenant_from_scope
+
+
+def scope(client_ip, **headers):
+    return {
+        "client": (client_ip, 50000),
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+    }
+
+
+def test_tenant_header_only_from_trusted_clients(monkeypatch):
+    monkeypatch.setattr(tenancy, "TRUSTED_IPS", frozenset({"10.0.0.2"}))
+    assert tenant_from_scope(scope("203.0.113.9", **{"x-tenant-id": "acme"})) == (
+        "ip:203.0.113.9"
+    )
+    assert tenant_from_scope(scope("10.0.0.2", **{"x-tenant-id": "acme"})) == (
+        "tenant:acme"
+    )
+    assert tenant_from_scope(scope("10.0.0.2")) == "ip:10.0.0.2"
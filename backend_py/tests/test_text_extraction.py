@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+import text_extraction
+from text_extraction import extract_document, extract_text
+
+
+def make_pdf(pages: int) -> bytes:
+    """Minimal PDF with one "Page N" text line per page"""
+    font = 3 + 2 * pages
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+    ]
+    for i in range(pages):
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 300] "
+            f"/Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font} 0 R >> >> >>".encode()
+        )
+        stream = f"BT /F1 12 Tf 20 200 Td (Page {i + 1}) Tj ET".encode()
+        objs.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+def sleep_then_return(seconds: float, value: str) -> str:
+    time.sleep(seconds)
+    return value
+
+
+@pytest.fixture(autouse=True)
+def inline_extraction(monkeypatch):
+    monkeypatch.setenv("EXTRACT_POOL_ENABLED", "0")
+
+
+def test_text_decoding_and_markers():
+    assert extract_text("中文文档".encode("gbk"), "notes.txt") == "中文文档"
+    assert (
+        extract_text(b"\x00\x01\x02", "blob.bin")
+        == "[Unsupported binary file: 3 bytes]"
+    )
+    assert extract_text(b"not a pdf", "broken.pdf").startswith("[PDF parse error:")
+
+
+def test_pdf_max_pages_keeps_total_page_count():
+    result = extract_document(make_pdf(8), "doc.pdf", max_pages=2)
+
+    assert result["error"] is None
+    assert result["pages"] == 8
+    assert result["text"] == "Page 1\n\nPage 2"
+
+
+def test_pdf_page_ranges_in_pool(monkeypatch):
+    monkeypatch.setenv("EXTRACT_POOL_ENABLED", "1")
+    monkeypatch.setenv("EXTRACT_WORKERS", "2")
+    monkeypatch.setenv("EXTRACT_PDF_PARALLEL_PAGES", "3")
+    try:
+        result = extract_document(make_pdf(7), "doc.pdf")
+    finally:
+        text_extraction.shutdown_pool()
+
+    assert result["parallel_ranges"] == 2
+    assert result["text"].split("\n\n") == [f"Page {i}" for i in range(1, 8)]
+
+
+def test_iter_document_pages_parses_lazily_and_once(monkeypatch):
+    ranges, parses = [], []
+    real_extract = text_extraction._extract_pdf_file
+    real_reader = text_extraction._pdf_reader
+
+    def spy(path, page_range=None):
+        ranges.append(page_range)
+        return real_extract(path, page_range)
+
+    def counting_reader(path):
+        reader = real_reader(path)
+        if reader not in parses:
+            parses.append(reader)
+        return reader
+
+    monkeypatch.setattr(text_extraction, "_extract_pdf_file", spy)
+    monkeypatch.setattr(text_extraction, "_pdf_reader", counting_reader)
+    pages = text_extraction.iter_document_pages(make_pdf(50), "doc.pdf", batch_size=4)
+
+    assert [next(pages) for _ in range(5)] == [f"Page {i}" for i in range(1, 6)]
+    pages.close()
+    assert ranges == [(0, 4), (4, 8)]
+    assert len(parses) == 1
+    assert not text_extraction._readers  # temp file and cached reader released
+
+
+def test_hung_task_does_not_fail_a_healthy_neighbour(monkeypatch):
+    monkeypatch.setenv("EXTRACT_WORKERS", "2")
+    healthy = {}
+
+    def run_healthy():
+        healthy["value"] = text_extraction._run(
+            sleep_then_return, 1.5, "ok", timeout=10
+        )
+
+    try:
+        # warm both worker processes so spawn time is not part of the test
+        for value in ("a", "b"):
+            text_extraction._run(sleep_then_return, 0, value, timeout=30)
+        thread = threading.Thread(target=run_healthy)
+        thread.start()
+        with pytest.raises(FutureTimeout):
+            text_extraction._run(sleep_then_return, 30, "hung", timeout=0.5)
+        thread.join()
+    finally:
+        text_extraction.shutdown_pool()
+
+    assert healthy["value"] == "ok"
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+from app.services.uploads import (
+    RequestSizeLimitMiddleware,
+    UploadTooLarge,
+    spool_upload,
+)
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, filename: str = "doc.txt"):
+        self.filename = filename
+        self._buf = io.BytesIO(data)
+        self.reads = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        self.reads += 1
+        return self._buf.read(size)
+
+
+def test_spool_upload_hashes_and_writes(tmp_path):
+    data = b"x" * 1000 + b"y" * 500
+    upload = asyncio.run(
+        spool_upload(
+            FakeUpload(data),
+            4096,
+            suffix=".txt",
+            directory=str(tmp_path),
+            chunk_size=256,
+        )
+    )
+
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.path.endswith(".txt")
+    with open(upload.path, "rb") as f:
+        assert f.read() == data
+
+
+def test_spool_upload_aborts_early_and_cleans_up(tmp_path):
+    fake = FakeUpload(b"z" * 10_000)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(fake, 1000, directory=str(tmp_path), chunk_size=256))
+
+    assert fake.reads == 4  # stopped at the first chunk past the limit
+    assert os.listdir(tmp_path) == []
+
+
+def test_size_limit_middleware_rejects_before_app():
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope["path"])
+        while (await receive()).get("more_body"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = RequestSizeLimitMiddleware(app, limits={"/upload": 100})
+
+    def run(path, headers, chunks):
+        sent = []
+        messages = [
+            {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+            for i, c in enumerate(chunks)
+        ]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "path": path, "headers": headers}
+        asyncio.run(middleware(scope, receive, send))
+        return sent[0]["status"]
+
+    assert run("/upload", [(b"content-length", b"500")], [b"a" * 500]) == 413
+    assert called == []
+    # chunked body without content-length: counted while streaming
+    assert run("/upload", [], [b"a" * 60, b"a" * 60]) == 413
+    assert run("/upload", [], [b"a" * 50]) == 200
+    assert run("/other", [(b"content-length", b"500")], [b"a" * 500]) == 200
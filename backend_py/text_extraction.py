@@ -0,0 +1,543 @@
+"""
+Document text extraction engine (PDF / DOCX / HTML / text)
+
+pypdf and python-docx are CPU-bound pure Python and hold the GIL, so parsing
+a 300-page PDF on a request thread stalls every other request in the
+worker. Parsing now runs in a ProcessPoolExecutor:
+
+- per-document timeout, counted from when a worker starts the task: a stuck
+  parse is killed (only its own worker process) instead of pinning it forever
+- memory cap: RLIMIT_AS in each pool process, a pathological file raises
+  MemoryError in the child instead of taking the API process down
+- page-parallel PDFs: documents with many pages are split into page ranges
+  extracted by several processes at once
+- PDFs are spooled to a temp file once and workers get (path, page range):
+  each process parses the file at most once (cached reader) instead of
+  receiving and re-parsing the whole document for every range / page batch
+
+extract_document() is the single entry point shared by
+llm_local.extract_text_from_bytes, frameworks.read_file_content and
+app/services/metadata (pdfmeta / docxmeta). It blocks the calling thread
+only (call it via asyncio.to_thread / run_in_threadpool from async code).
+
+Environment variables:
+- EXTRACT_WORKERS: pool processes (default min(4, cpu count))
+- EXTRACT_TIMEOUT_SECONDS: per-document timeout (default 60)
+- EXTRACT_MAX_MEMORY_MB: address-space cap per pool process (default 1024, 0 = off)
+- EXTRACT_PDF_PARALLEL_PAGES: split PDFs with more pages than this (default 40)
+- EXTRACT_PAGE_BATCH: pages parsed per step by iter_document_pages (default 4)
+- EXTRACT_POOL_ENABLED: "0" to parse in-process (CLI / debugging)
+"""
+
+from __future__ import annotations
+import io
+import multiprocessing
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".log")
+FALLBACK_ENCODINGS = ["utf-8", "gbk", "gb2312", "cp1252", "latin-1"]
+
+
+def detect_kind(filename: Optional[str], mime: Optional[str]) -> str:
+    """pdf / docx / html / text / binary"""
+    name = (filename or "").lower()
+    mime = (mime or "").lower()
+    if name.endswith(TEXT_EXTENSIONS) or (
+        mime.startswith("text/") and mime != "text/html"
+    ):
+        return "text"
+    if name.endswith(".pdf") or mime == "application/pdf":
+        return "pdf"
+    if name.endswith(".docx") or "wordprocessingml.document" in mime:
+        return "docx"
+    if name.endswith((".html", ".htm")) or mime == "text/html":
+        return "html"
+    return "binary"
+
+
+# ---------- parsers (run inside pool processes) ----------
+
+
+def decode_text(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    try:
+        import chardet
+
+        guess = chardet.detect(data[:200_000])
+        # short GBK snippets are often misdetected (KOI8-R etc.) with low confidence
+        if guess.get("encoding") and (guess.get("confidence") or 0) >= 0.8:
+            return data.decode(guess["encoding"], errors="replace")
+    except Exception:
+        pass
+    for enc in FALLBACK_ENCODINGS[1:]:
+        try:
+            return data.decode(enc)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _page_texts(reader, start: int, end: int) -> List[str]:
+    texts = []
+    for i in range(start, end):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            texts.append("")  # one broken page should not lose the document
+    return texts
+
+
+# per process: (path, size, mtime) → PdfReader of a spooled PDF
+_READER_CACHE_SIZE = 2
+_readers: "OrderedDict[Tuple[str, int, int], Any]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def _pdf_reader(path: str):
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _readers_lock:
+        reader = _readers.pop(key, None)
+        if reader is None:
+            from pypdf import PdfReader
+
+            reader = PdfReader(path)  # reads the file into memory
+        _readers[key] = reader
+        while len(_readers) > _READER_CACHE_SIZE:
+            _readers.popitem(last=False)
+        return reader
+
+
+def _forget_reader(path: str):
+    with _readers_lock:
+        for key in [k for k in _readers if k[0] == path]:
+            del _readers[key]
+
+
+def _extract_pdf_file(
+    path: str, page_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Dict[str, Any]:
+    """Pages [start, end) of a spooled PDF; never raises"""
+    result: Dict[str, Any] = {"kind": "pdf", "text": "", "pages": None, "error": None}
+    try:
+        reader = _pdf_reader(path)
+        total = len(reader.pages)
+        start, end = page_range or (0, None)
+        end = total if end is None else min(end, total)
+        texts = _page_texts(reader, start, end)
+        result["text"] = "\n\n".join(texts).strip()
+        result["page_texts"] = texts
+        result["pages"] = total
+    except MemoryError:
+        result["error"] = "memory limit exceeded"
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _pdf_file_page_count(path: str) -> int:
+    """0 if unreadable (the single-task parse then reports the error)"""
+    try:
+        return len(_pdf_reader(path).pages)
+    except Exception:
+        return 0
+
+
+@contextmanager
+def _spooled_pdf(data: bytes) -> Iterator[str]:
+    """The PDF bytes as a temp file, removed (and its cached reader dropped) after"""
+    fd, path = tempfile.mkstemp(prefix="extract_", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        _forget_reader(path)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _docx_text(data: bytes) -> str:
+    import docx
+
+    doc = docx.Document(io.BytesIO(data))
+    text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+    if text.strip():
+        return text
+    # table-only documents
+    rows = []
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = " | ".join(cell.text for cell in row.cells)
+            if row_text.strip():
+                rows.append(row_text)
+    return "\n".join(rows)
+
+
+def _html_text(data: bytes) -> str:
+    try:
+        from bs4 import BeautifulSoup
+
+        return BeautifulSoup(data, "lxml").get_text("\n")
+    except Exception:
+        return re.sub(r"<[^>]+>", "", decode_text(data))
+
+
+def _extract(data: bytes, kind: str) -> Dict[str, Any]:
+    """Parse one non-PDF document (see _extract_pdf_file); never raises"""
+    result: Dict[str, Any] = {"kind": kind, "text": "", "pages": None, "error": None}
+    try:
+        if kind == "text":
+            result["text"] = decode_text(data)
+        elif kind == "docx":
+            result["text"] = _docx_text(data)
+        elif kind == "html":
+            result["text"] = _html_text(data)
+        else:
+            head = data[:8192]
+            if b"\x00" in head or head.startswith(b"PK"):
+                result["error"] = f"unsupported binary file: {len(data)} bytes"
+            else:
+                result["text"] = decode_text(data)
+    except MemoryError:
+        result["error"] = "memory limit exceeded"
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _init_worker(max_memory_mb: int):
+    if max_memory_mb <= 0:
+        return
+    try:
+        import resource
+
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # not supported on this platform
+
+
+# ---------- worker slots (API process) ----------
+#
+# EXTRACT_WORKERS single-process executors instead of one shared pool. A
+# task first takes a free slot, so its timeout starts when a process is
+# actually free to run it (time queued behind other documents does not
+# count), and a hung parse only kills its own slot's process, never the
+# extractions that other requests are running next to it.
+
+
+class _Slot:
+    def __init__(self, home: "queue.Queue[_Slot]"):
+        self.home = home  # free-slot queue this slot goes back to
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, fn, *args):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=1,
+                # spawn: never fork the threaded server process
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(int(os.getenv("EXTRACT_MAX_MEMORY_MB", "1024")),),
+            )
+        return self.executor.submit(fn, *args)
+
+    def recycle(self):
+        """Kill this slot's process (hung or broken); the next task starts a new one"""
+        executor, self.executor = self.executor, None
+        if executor is None:
+            return
+        for proc in list(getattr(executor, "_processes", {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_free: Optional["queue.Queue[_Slot]"] = None
+_slots: List[_Slot] = []
+_slots_lock = threading.Lock()
+
+
+def _workers() -> int:
+    return max(1, int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+
+def _pool_enabled() -> bool:
+    return os.getenv("EXTRACT_POOL_ENABLED", "1") != "0"
+
+
+def _acquire(block: bool = True) -> Optional[_Slot]:
+    """A free slot (waits for one unless block=False)"""
+    global _free
+    with _slots_lock:
+        if _free is None:
+            _free = queue.Queue()
+            _slots[:] = [_Slot(_free) for _ in range(_workers())]
+            for slot in _slots:
+                _free.put(slot)
+        free = _free
+    try:
+        return free.get(block=block)
+    except queue.Empty:
+        return None
+
+
+def _release(slot: _Slot):
+    slot.home.put(slot)
+
+
+def shutdown_pool():
+    global _free
+    with _slots_lock:
+        slots, _free = list(_slots), None
+        _slots.clear()
+    for slot in slots:
+        if slot.executor is not None:
+            slot.executor.shutdown(wait=False, cancel_futures=True)
+            slot.executor = None
+
+
+def _run(fn, *args, timeout: float):
+    """Run fn on a free slot; retry once if its process died under us"""
+    slot = _acquire()
+    try:
+        for attempt in range(2):
+            future = slot.submit(fn, *args)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                slot.recycle()
+                raise
+            except BrokenProcessPool:
+                slot.recycle()
+                if attempt:
+                    raise
+    finally:
+        _release(slot)
+
+
+def _extract_pdf_parallel(
+    path: str, max_pages: Optional[int], timeout: float
+) -> Optional[Dict[str, Any]]:
+    """Page-range fan-out over the free slots; None → extract as a single task"""
+    threshold = int(os.getenv("EXTRACT_PDF_PARALLEL_PAGES", "40"))
+    if _workers() < 2:
+        return None
+
+    total = _run(_pdf_file_page_count, path, timeout=timeout)
+    pages = min(total, max_pages) if max_pages else total
+    if pages <= threshold:
+        return None
+
+    # one slot is waited for, the others only taken if idle right now
+    slots = [_acquire()]
+    while len(slots) < _workers():
+        slot = _acquire(block=False)
+        if slot is None:
+            break
+        slots.append(slot)
+    try:
+        if len(slots) < 2:
+            return None
+        step = -(-pages // len(slots))  # ceil
+        ranges = [(s, min(s + step, pages)) for s in range(0, pages, step)]
+        running = [
+            (slot, slot.submit(_extract_pdf_file, path, r))
+            for slot, r in zip(slots, ranges)
+        ]
+        parts = []
+        for slot, future in running:
+            try:
+                parts.append(future.result(timeout=timeout))
+            except FutureTimeout:
+                for other, f in running:
+                    if not f.done():
+                        other.recycle()
+                raise
+            except BrokenProcessPool:
+                slot.recycle()
+                return None  # retried as a single task
+    finally:
+        for slot in slots:
+            _release(slot)
+
+    texts: List[str] = []
+    for part in parts:
+        if part["error"]:
+            return {**part, "pages": total}
+        texts.extend(part.get("page_texts") or [])
+    return {
+        "kind": "pdf",
+        "text": "\n\n".join(texts).strip(),
+        "pages": total,
+        "error": None,
+        "parallel_ranges": len(ranges),
+    }
+
+
+def _timeout(timeout: Optional[float]) -> float:
+    return timeout or float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "60"))
+
+
+def _run_pdf(
+    path: str, max_pages: Optional[int], timeout: float, parallel: bool
+) -> Dict[str, Any]:
+    result = None
+    if parallel:
+        result = _extract_pdf_parallel(path, max_pages, timeout)
+    if result is None:
+        result = _run(_extract_pdf_file, path, (0, max_pages), timeout=timeout)
+    return result
+
+
+def _run_extract(
+    data: bytes,
+    kind: str,
+    filename: Optional[str],
+    max_pages: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Parse in the pool (or inline), timeouts turned into an error result"""
+    timeout = _timeout(timeout)
+    # plain text is cheap, and the pool can be disabled for CLI use
+    if kind == "text" or not _pool_enabled():
+        if kind == "pdf":
+            with _spooled_pdf(data) as path:
+                return _extract_pdf_file(path, (0, max_pages))
+        return _extract(data, kind)
+    try:
+        if kind == "pdf":
+            with _spooled_pdf(data) as path:
+                return _run_pdf(path, max_pages, timeout, parallel=True)
+        return _run(_extract, data, kind, timeout=timeout)
+    except FutureTimeout:
+        print(f"⚠️  Text extraction timed out after {timeout:.0f}s ({filename})")
+        error = f"timed out after {timeout:.0f}s"
+    except BrokenProcessPool as e:
+        error = str(e)
+    return {"kind": kind, "text": "", "pages": None, "error": error}
+
+
+def extract_document(
+    data: bytes,
+    filename: Optional[str] = None,
+    mime: Optional[str] = None,
+    max_pages: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Extract text from a document
+
+    Args:
+        data: Raw file bytes
+        filename / mime: Used to detect the document type
+        max_pages: Only extract the first N PDF pages (page count is still reported)
+        timeout: Seconds before the parse is abandoned (EXTRACT_TIMEOUT_SECONDS)
+
+    Returns:
+        {"kind", "text", "pages" (PDF only), "error" (None on success)}
+    """
+    kind = detect_kind(filename, mime)
+    result = _run_extract(data, kind, filename, max_pages=max_pages, timeout=timeout)
+    result.pop("page_texts", None)
+    return result
+
+
+def _error_marker(kind: str, data: bytes, error: str) -> str:
+    if kind == "binary":
+        return f"[Unsupported binary file: {len(data)} bytes]"
+    return f"[{kind.upper()} parse error: {error}]"
+
+
+def iter_document_pages(
+    data: bytes,
+    filename: Optional[str] = None,
+    mime: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Lazily yield the text of a document page by page
+
+    PDFs are parsed EXTRACT_PAGE_BATCH pages at a time, and only when the
+    consumer asks for more, so a caller that stops after a few pages (see
+    llm_local.collect_document_pages) never pays for the rest of a 500-page
+    file. Other formats have no pages and are yielded as one block.
+
+    A failure on the first batch is yielded as the usual "[PDF parse
+    error: ...]" marker; a failure further in ends the stream.
+    """
+    kind = detect_kind(filename, mime)
+    if kind != "pdf":
+        yield extract_text(data, filename=filename, mime=mime)
+        return
+
+    batch_size = batch_size or int(os.getenv("EXTRACT_PAGE_BATCH", "4"))
+    timeout = _timeout(timeout)
+    pooled = _pool_enabled()
+    with _spooled_pdf(data) as path:
+        start, total = 0, None
+        while total is None or start < total:
+            page_range = (start, start + batch_size)
+            try:
+                if pooled:
+                    result = _run(_extract_pdf_file, path, page_range, timeout=timeout)
+                else:
+                    result = _extract_pdf_file(path, page_range)
+            except FutureTimeout:
+                result = {"error": f"timed out after {timeout:.0f}s"}
+            except BrokenProcessPool as e:
+                result = {"error": str(e)}
+            if result["error"]:
+                if start == 0:
+                    yield _error_marker(kind, data, result["error"])
+                else:
+                    print(
+                        f"⚠️  Stopped reading {filename} at page {start}: "
+                        f"{result['error']}"
+                    )
+                return
+            total = result["pages"] or 0
+            for text in result.get("page_texts") or []:
+                yield text
+            start += batch_size
+
+
+def extract_text(
+    data: bytes, filename: Optional[str] = None, mime: Optional[str] = None
+) -> str:
+    """
+    Text only; failures come back as a "[PDF parse error: ...]" style marker
+    (what the LLM pipeline has always received)
+    """
+    result = extract_document(data, filename=filename, mime=mime)
+    if result["error"]:
+        return _error_marker(result["kind"], data, result["error"])
+    return result["text"]
+
+
+__all__ = [
+    "decode_text",
+    "detect_kind",
+    "extract_document",
+    "extract_text",
+    "iter_document_pages",
+    "shutdown_pool",
+]
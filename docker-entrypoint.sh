@@ -10,6 +10,9 @@ echo "📋 Environment Configuration:"
 echo "  - LLM_TYPE: ${LLM_TYPE:-not set}"
 echo "  - LOCAL_LLM_URL: ${LOCAL_LLM_URL:-not set}"
 echo "  - PORT: ${PORT:-8000}"
+echo "  - WORKERS: ${WORKERS:-1}"
+DB_SCHEME="${DATABASE_URL%%:*}"  # scheme only, the URL may hold a password
+echo "  - DATABASE: ${DB_SCHEME:-sqlite}"
 
 # Test Cloud LLM connection (optional)
 if [ -n "$LOCAL_LLM_URL" ]; then